@@ -3,6 +3,7 @@ from flask_mail import Mail
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_bcrypt import Bcrypt
+from flask_socketio import SocketIO
 import os
 import dotenv
 
@@ -12,6 +13,7 @@ db = SQLAlchemy()
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 mail = Mail()
+socketio = SocketIO()
 
 login_manager.login_view = "main.login"
 
@@ -30,6 +32,9 @@ def create_app(config_class=None):
     upload_folder = os.path.join(basedir, "..", "uploads")
     os.makedirs(upload_folder, exist_ok=True)
     app.config["UPLOAD_FOLDER"] = upload_folder
+    # Limity przesyłania: cały request i pojedynczy plik
+    app.config["MAX_CONTENT_LENGTH"] = 50 * 1024 * 1024
+    app.config["MAX_UPLOAD_FILE_BYTES"] = 20 * 1024 * 1024
 
     # Mail
     app.config["MAIL_SERVER"] = "smtp.gmail.com"
@@ -38,15 +43,85 @@ def create_app(config_class=None):
     app.config["MAIL_PASSWORD"] = os.getenv("MAIL_PASSWORD")
     app.config["MAIL_USE_SSL"] = True
     app.config["MAIL_USE_TLS"] = False
+    app.config["MAIL_DEFAULT_SENDER"] = os.getenv("EMAIL")
 
     if config_class:
         app.config.from_object(config_class)
 
+    # Pliki z formularzy zapisywane strumieniowo prosto do magazynu
+    from app.attachments import UploadRequest
+    app.request_class = UploadRequest
+
     # Inicjalizacja rozszerzeń
     db.init_app(app)
     bcrypt.init_app(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    # Czat na żywo; SOCKETIO_ASYNC_MODE='eventlet' przy uruchomieniu pod eventlet
+    # Przy kilku procesach serwera zdarzenia czatu rozsyła kolejka (np. redis://), bez niej - tylko ten proces
+    socketio.init_app(app, async_mode=app.config.get("SOCKETIO_ASYNC_MODE", "threading"),
+                      message_queue=app.config.get("SOCKETIO_MESSAGE_QUEUE"))
+
+    # Cache kalendarza zajęć
+    from app.calendar_cache import CalendarCache
+    app.extensions["calendar_cache"] = CalendarCache(app.config.get("CALENDAR_CACHE_SIZE", 512))
+
+    # Cache użytkowników dla load_user (LRU z czasem życia wpisów)
+    from app.identity_cache import IdentityCache
+    app.extensions["identity_cache"] = IdentityCache(
+        app.config.get("IDENTITY_CACHE_SIZE", 1024),
+        app.config.get("IDENTITY_CACHE_TTL", 30)
+    )
+
+    # Filtr Blooma zajętych adresów e-mail dla /check_email (z limitem zapytań na klienta)
+    from app.email_filter import EmailLookup
+    app.extensions["email_lookup"] = EmailLookup(
+        capacity=app.config.get("EMAIL_FILTER_CAPACITY", 10000),
+        error_rate=app.config.get("EMAIL_FILTER_ERROR_RATE", 0.01),
+        rate=app.config.get("CHECK_EMAIL_RATE", 5.0),
+        burst=app.config.get("CHECK_EMAIL_BURST", 20),
+        refresh_interval=app.config.get("EMAIL_FILTER_REFRESH", 5.0),
+        max_age=app.config.get("EMAIL_FILTER_MAX_AGE", 300.0)
+    )
+
+    # Magazyn plików załączników: katalog lokalny albo kubełek S3 (STORAGE_BACKEND)
+    from app.storage import make_storage
+    app.extensions["storage"] = make_storage(app.config)
+
+    # Haszowanie haseł bcrypt w puli procesów; stały koszt z BCRYPT_LOG_ROUNDS
+    from app.passwords import PasswordHasher, DEFAULT_ROUNDS
+    app.extensions["password_hasher"] = PasswordHasher(
+        workers=app.config.get("PASSWORD_HASH_WORKERS", 2),
+        max_pending=app.config.get("PASSWORD_HASH_QUEUE", 64),
+        submit_timeout=app.config.get("PASSWORD_HASH_TIMEOUT", 5.0),
+        rounds=app.config.get("BCRYPT_LOG_ROUNDS", DEFAULT_ROUNDS)
+    )
+
+    # Optymalizacja obrazów z załączników w tle (pula procesów)
+    from app.image_pipeline import ImageOptimizer
+    app.extensions["image_optimizer"] = ImageOptimizer(
+        app,
+        workers=app.config.get("IMAGE_OPTIMIZER_WORKERS", 2),
+        max_pending=app.config.get("IMAGE_QUEUE_SIZE", 32),
+        submit_timeout=app.config.get("IMAGE_QUEUE_TIMEOUT", 5.0),
+        max_edge=app.config.get("IMAGE_MAX_EDGE", 2048)
+    )
+
+    # Miniatury WebP załączników (katalog z limitem rozmiaru)
+    from app.thumbnails import ThumbnailCache
+    app.extensions["thumbnail_cache"] = ThumbnailCache(app.config.get("THUMBNAIL_CACHE_BYTES", 64 * 1024 * 1024))
+
+    # Wysyłka e-maili z tabeli outbox w wątku w tle (MAIL_OUTBOX_WORKER=False wyłącza wątek)
+    from app.outbox import MailSender
+    app.extensions["mail_sender"] = MailSender(
+        app,
+        batch_size=app.config.get("MAIL_OUTBOX_BATCH", 50),
+        max_attempts=app.config.get("MAIL_OUTBOX_MAX_ATTEMPTS", 6),
+        base_delay=app.config.get("MAIL_OUTBOX_RETRY_DELAY", 30),
+        max_delay=app.config.get("MAIL_OUTBOX_MAX_DELAY", 3600)
+    )
+    if app.config.get("MAIL_OUTBOX_WORKER", True):
+        app.extensions["mail_sender"].start()
 
     # Import modeli, żeby SQLAlchemy znało tabele
     from app import models
@@ -55,4 +130,27 @@ def create_app(config_class=None):
     from app.routes import bp
     app.register_blueprint(bp)
 
+    # Przestrzeń Socket.IO czatu (pokój na parę uczeń-nauczyciel)
+    from app.chat import ChatNamespace, NAMESPACE
+    socketio.on_namespace(ChatNamespace(NAMESPACE))
+
+    # Komendy CLI (flask <komenda>)
+    from app.commands import schedule_batch_command, migrate_attachments_command, uploads_gc_command
+    from app.commands import send_outbox_command, rebuild_accounts_command, index_messages_command
+    from app.commands import add_notification_mode_command, calibrate_passwords_command
+    app.cli.add_command(schedule_batch_command)
+    app.cli.add_command(migrate_attachments_command)
+    app.cli.add_command(uploads_gc_command)
+    app.cli.add_command(send_outbox_command)
+    app.cli.add_command(rebuild_accounts_command)
+    app.cli.add_command(index_messages_command)
+    app.cli.add_command(add_notification_mode_command)
+    app.cli.add_command(calibrate_passwords_command)
+
+    # Opcjonalne okresowe sprzątanie katalogu uploads (UPLOADS_GC_INTERVAL w sekundach)
+    if app.config.get("UPLOADS_GC_INTERVAL"):
+        from app.uploads_gc import start_periodic_gc
+        start_periodic_gc(app, app.config["UPLOADS_GC_INTERVAL"],
+                          app.config.get("UPLOADS_GC_GRACE_HOURS", 24) * 3600)
+
     return app
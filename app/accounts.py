@@ -0,0 +1,78 @@
+from sqlalchemy import inspect, text
+from app import db
+from app.models import Account, ACCOUNT_ROLES
+from app.identity_cache import get_identity_cache
+
+
+def find_account(email):
+    """(rola, id użytkownika) dla adresu e-mail albo None - jedno wyszukiwanie w unikalnym indeksie."""
+    return db.session.query(Account.role, Account.user_id).filter(Account.email == email).first()
+
+
+def email_taken(email):
+    return db.session.query(Account.id).filter(Account.email == email).first() is not None
+
+
+def load_account_user(role, user_id):
+    """Użytkownik o danej roli i id (klucz główny, więc korzysta z mapy tożsamości sesji)."""
+    model = ACCOUNT_ROLES.get(role)
+    return db.session.get(model, int(user_id)) if model else None
+
+
+def cached_account_user(role, user_id):
+    """load_account_user przez cache tożsamości - trafienie nie odpytuje bazy."""
+    if role not in ACCOUNT_ROLES:
+        return None
+    cache = get_identity_cache()
+    user = cache.get(role, user_id)
+    if user is None:
+        user = load_account_user(role, user_id)
+        if user is not None:
+            cache.put(role, user)
+    return user
+
+
+def find_user(email):
+    """(użytkownik, rola) dla adresu e-mail albo (None, None)."""
+    account = find_account(email)
+    if account is None:
+        return None, None
+    return load_account_user(account.role, account.user_id), account.role
+
+
+def rebuild_accounts():
+    """Odbudowuje katalog kont z tabel użytkowników (np. dla bazy sprzed jego wprowadzenia).
+
+    Zwraca (liczba kont, lista duplikatów). Adres powtórzony w kilku
+    tabelach trafia do katalogu tylko raz - pierwsza rola w kolejności
+    ACCOUNT_ROLES, tak jak sprawdzało to dawne logowanie.
+    """
+    db.session.query(Account).delete()
+    seen, duplicates = set(), []
+    for role, model in ACCOUNT_ROLES.items():
+        for user_id, email in db.session.query(model.id, model.email).order_by(model.id):
+            if email in seen:
+                duplicates.append((role, user_id, email))
+                continue
+            seen.add(email)
+            db.session.add(Account(email=email, role=role, user_id=user_id))
+    db.session.commit()
+    return len(seen), duplicates
+
+
+def add_notification_mode():
+    """Dodaje kolumnę notification_mode do istniejących tabel użytkowników.
+
+    Konta sprzed dodania kolumny dostają tryb 'digest' (domyślny dla nowych
+    kont). Zwraca słownik tabela -> liczba uzupełnionych kont.
+    """
+    filled = {}
+    with db.engine.begin() as conn:
+        for model in ACCOUNT_ROLES.values():
+            table = model.__tablename__
+            if 'notification_mode' not in {c['name'] for c in inspect(conn).get_columns(table)}:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN notification_mode VARCHAR(10)"))
+            filled[table] = conn.execute(text(
+                f"UPDATE {table} SET notification_mode = 'digest' WHERE notification_mode IS NULL"
+            )).rowcount
+    return filled
@@ -0,0 +1,286 @@
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import tempfile
+from flask import Request, current_app, request, send_file, abort, redirect
+from sqlalchemy import inspect, text
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.utils import secure_filename
+from app import db
+from app.models import Task, TaskAttachment, Teacher, Student
+from app.storage import blob_key, get_storage
+
+CHUNK_SIZE = 64 * 1024
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+# Blob nigdy się nie zmienia, więc przeglądarka może go trzymać bez rewalidacji
+BLOB_MAX_AGE = 365 * 24 * 3600
+SHA256_RE = re.compile(r'[0-9a-f]{64}')
+
+
+def tmp_dir(root=None):
+    """Katalog tymczasowy na tym samym systemie plików co magazyn (os.replace jest atomowe)."""
+    path = os.path.join(root or current_app.config['UPLOAD_FOLDER'], 'tmp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def guess_mime(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+
+
+def is_image(filename):
+    return os.path.splitext(filename)[1].lower() in IMAGE_EXTENSIONS
+
+
+def place_blob(path, sha256, storage=None):
+    """Przenosi plik tymczasowy do magazynu pod klucz bloba; duplikat treści jest usuwany.
+
+    Odświeżony czas modyfikacji istniejącego bloba chroni go przed GC do
+    zatwierdzenia wiersza. Kopia lokalna jest usuwana dopiero po udanym
+    touch - jeśli GC zdążył usunąć blob po exists(), zapisujemy go ponownie.
+    """
+    storage = storage or get_storage()
+    if storage.exists(sha256) and storage.touch(sha256):
+        os.remove(path)
+    else:
+        storage.put_file(sha256, path)
+
+
+def ingest_file(path, storage=None):
+    """Przenosi plik do magazynu pod nazwą ze skrótu treści; zwraca (sha256, rozmiar).
+
+    Plik źródłowy jest zużywany. Jeśli identyczna treść już istnieje,
+    duplikat jest po prostu usuwany.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+    sha256 = digest.hexdigest()
+    place_blob(path, sha256, storage)
+    return sha256, size
+
+
+class HashingSpool:
+    """Plik tymczasowy w uploads/tmp liczący sha256 i rozmiar w trakcie zapisu.
+
+    Parser multipart pisze do niego kolejne kawałki części z plikiem, więc
+    w pamięci nigdy nie ma więcej niż jeden kawałek, a po zakończeniu
+    przesyłania skrót jest już znany. Przekroczenie max_size przerywa
+    odbieranie żądania błędem 413. Niezatwierdzony plik jest usuwany
+    przy close().
+    """
+
+    def __init__(self, directory, suffix='', max_size=None):
+        fd, self.path = tempfile.mkstemp(suffix=suffix, dir=directory)
+        self._file = os.fdopen(fd, 'w+b')
+        self._digest = hashlib.sha256()
+        self.size = 0
+        self.max_size = max_size
+        self.committed = False
+
+    def write(self, data):
+        self.size += len(data)
+        if self.max_size is not None and self.size > self.max_size:
+            self.close()
+            raise RequestEntityTooLarge("Plik przekracza dopuszczalny rozmiar")
+        self._digest.update(data)
+        return self._file.write(data)
+
+    def __getattr__(self, name):
+        # read/seek/tell/flush - jak zwykły plik
+        return getattr(self._file, name)
+
+    @property
+    def sha256(self):
+        return self._digest.hexdigest()
+
+    def commit(self, storage=None):
+        """Przenosi zawartość do magazynu; zwraca (sha256, rozmiar)."""
+        self._file.close()
+        place_blob(self.path, self.sha256, storage)
+        self.committed = True
+        return self.sha256, self.size
+
+    def close(self):
+        self._file.close()
+        if not self.committed and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    """Request, którego pliki z formularzy trafiają od razu do HashingSpool.
+
+    Limit na cały request to standardowe MAX_CONTENT_LENGTH, limit na
+    pojedynczy plik - MAX_UPLOAD_FILE_BYTES.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        spool = HashingSpool(tmp_dir(), os.path.splitext(filename or '')[1].lower(),
+                             current_app.config.get('MAX_UPLOAD_FILE_BYTES'))
+        self.__dict__.setdefault('_spools', []).append(spool)
+        return spool
+
+    def close(self):
+        try:
+            super().close()
+        finally:
+            # także pliki z przerwanego parsowania, których nie ma w request.files
+            for spool in self.__dict__.get('_spools', ()):
+                spool.close()
+
+
+def store_upload(file_storage):
+    """Zapisuje przesłany plik w magazynie bez zmian; zwraca (sha256, rozmiar)."""
+    stream = file_storage.stream
+    if not isinstance(stream, HashingSpool):
+        ext = os.path.splitext(file_storage.filename or '')[1].lower()
+        stream = HashingSpool(tmp_dir(), ext, current_app.config.get('MAX_UPLOAD_FILE_BYTES'))
+        try:
+            shutil.copyfileobj(file_storage.stream, stream, CHUNK_SIZE)
+        except Exception:
+            stream.close()
+            raise
+    return stream.commit()
+
+
+def save_attachments(task, side, files):
+    """Dodaje do sesji załączniki zadania dla strony 'teacher' lub 'student'.
+
+    Obrazy dostają status 'processing'; zwraca ich listę, żeby po
+    zatwierdzeniu sesji przekazać je do ImageOptimizer.enqueue.
+    """
+    processing = []
+    for file_storage in files:
+        if not file_storage:
+            continue
+        name = secure_filename(file_storage.filename) or 'plik'
+        sha256, size = store_upload(file_storage)
+        attachment = TaskAttachment(
+            task=task,
+            side=side,
+            sha256=sha256,
+            size=size,
+            mime=guess_mime(name),
+            original_name=name,
+            status='processing' if is_image(name) else 'ready'
+        )
+        db.session.add(attachment)
+        if attachment.status == 'processing':
+            processing.append(attachment)
+    return processing
+
+
+def attachment_for(sha256, user):
+    """Załącznik o skrócie sha256 z zadania, w którym user jest nauczycielem lub uczniem.
+
+    abort(404), gdy taki plik nie istnieje; abort(403), gdy istnieje,
+    ale nie należy do żadnego zadania użytkownika.
+    """
+    if not SHA256_RE.fullmatch(sha256):
+        abort(404)
+    if isinstance(user, Teacher):
+        owner = Task.teacher_id
+    elif isinstance(user, Student):
+        owner = Task.student_id
+    else:
+        owner = None
+    if owner is not None:
+        attachment = TaskAttachment.query.join(Task) \
+            .filter(TaskAttachment.sha256 == sha256, owner == user.id) \
+            .first()
+        if attachment is not None:
+            return attachment
+    if TaskAttachment.query.filter_by(sha256=sha256).first() is None:
+        abort(404)
+    abort(403)
+
+
+def send_blob(attachment):
+    """Odpowiedź z treścią załącznika: silny ETag (sha256), Range i długie cache.
+
+    Magazyn obiektowy zwraca podpisany adres, na który przeglądarka jest
+    przekierowywana. Przy magazynie lokalnym z UPLOAD_ACCEL_REDIRECT
+    (prefiks chronionej lokalizacji nginx) bajty wysyła serwer proxy przez
+    X-Accel-Redirect; USE_X_SENDFILE działa jak w send_file Flaska.
+    W tych trybach worker Pythona nie czyta pliku.
+    """
+    storage = get_storage()
+    url = storage.download_url(attachment.sha256, attachment.original_name, attachment.mime)
+    if url:
+        resp = redirect(url)
+        # adres wygasa, więc przekierowania nie wolno trzymać w cache
+        resp.cache_control.no_store = True
+        return resp
+
+    accel_prefix = current_app.config.get('UPLOAD_ACCEL_REDIRECT')
+    if accel_prefix:
+        resp = current_app.response_class(mimetype=attachment.mime)
+        resp.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{blob_key(attachment.sha256)}"
+        resp.headers.set('Content-Disposition', 'attachment', filename=attachment.original_name)
+        resp.set_etag(attachment.sha256)
+        resp.cache_control.max_age = BLOB_MAX_AGE
+        resp.make_conditional(request)
+    else:
+        resp = send_file(storage.path(attachment.sha256), mimetype=attachment.mime, as_attachment=True,
+                         download_name=attachment.original_name, etag=attachment.sha256,
+                         max_age=BLOB_MAX_AGE)
+    resp.cache_control.private = True
+    resp.cache_control.immutable = True
+    return resp
+
+
+def migrate_legacy_attachments(keep_files=False):
+    """Przenosi załączniki z kolumn JSON tasks.*_attachments do task_attachments.
+
+    Pliki z płaskiego katalogu uploads/ trafiają do magazynu adresowanego
+    treścią, a kolumny JSON są czyszczone. Zwraca (liczba przeniesionych,
+    lista brakujących plików).
+    """
+    columns = {c['name'] for c in inspect(db.engine).get_columns('tasks')}
+    legacy = [c for c in ('teacher_attachments', 'student_attachments') if c in columns]
+    if not legacy:
+        return 0, []
+
+    root = current_app.config['UPLOAD_FOLDER']
+    rows = db.session.execute(text(f"SELECT id, {', '.join(legacy)} FROM tasks")).mappings().all()
+    migrated, missing, moved = 0, [], set()
+    ingested = {}
+
+    for row in rows:
+        for column in legacy:
+            side = column.split('_')[0]
+            for name in json.loads(row[column] or '[]'):
+                src = os.path.join(root, secure_filename(name))
+                if name not in ingested:
+                    if not os.path.isfile(src):
+                        missing.append(name)
+                        continue
+                    fd, tmp = tempfile.mkstemp(dir=tmp_dir(root))
+                    os.close(fd)
+                    shutil.copyfile(src, tmp)
+                    ingested[name] = ingest_file(tmp)
+                    moved.add(src)
+                sha256, size = ingested[name]
+                db.session.add(TaskAttachment(
+                    task_id=row['id'],
+                    side=side,
+                    sha256=sha256,
+                    size=size,
+                    mime=guess_mime(name),
+                    original_name=name
+                ))
+                migrated += 1
+
+    db.session.execute(text(f"UPDATE tasks SET {', '.join(f'{c} = NULL' for c in legacy)}"))
+    db.session.commit()
+
+    if not keep_files:
+        for src in moved:
+            os.remove(src)
+    return migrated, missing
@@ -0,0 +1,219 @@
+import sys
+from collections import namedtuple
+from datetime import datetime
+from app import db
+from app.models import LessonSeries, LessonException, Student, Teacher
+from app.scheduling import DAY_START, DAY_END, dates_overlap, minute_of_day, time_of_minute, lessons_changed
+
+# Siatka planu: 15-minutowe sloty, 96 na dobę, 672 na tydzień.
+# Plan osoby to liczba całkowita używana jako bitset - bit i = slot i tygodnia.
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+PlacementRequest = namedtuple('PlacementRequest', 'student_id teacher_id duration days earliest latest')
+Placement = namedtuple('Placement', 'request day_of_week start_minute end_minute')
+
+
+def _minutes(value, default):
+    if value is None:
+        return default
+    return minute_of_day(datetime.strptime(value, "%H:%M").time())
+
+
+def parse_requests(items):
+    """Zamienia listę słowników (np. z JSON) na PlacementRequest; ValueError przy błędnych danych."""
+    requests = []
+    for n, item in enumerate(items):
+        try:
+            duration = int(item['duration'])
+            earliest = _minutes(item.get('earliest'), DAY_START)
+            latest = _minutes(item.get('latest'), DAY_END)
+            requests.append(PlacementRequest(
+                student_id=int(item['student_id']),
+                teacher_id=int(item['teacher_id']),
+                duration=duration,
+                days=tuple(sorted({int(d) for d in item.get('days', range(5))})),
+                earliest=earliest,
+                latest=latest
+            ))
+        except (KeyError, TypeError, ValueError) as e:
+            raise ValueError(f"Błędne żądanie nr {n}: {e}")
+        if duration <= 0 or duration % SLOT_MINUTES:
+            raise ValueError(f"Błędne żądanie nr {n}: czas trwania musi być wielokrotnością {SLOT_MINUTES} min")
+        if any(d < 0 or d > 6 for d in requests[-1].days):
+            raise ValueError(f"Błędne żądanie nr {n}: dzień tygodnia spoza zakresu 0-6")
+    return requests
+
+
+def slot_mask(day_of_week, start_minute, end_minute):
+    """Bitset slotów pokrywających [start_minute, end_minute) danego dnia."""
+    first = start_minute // SLOT_MINUTES
+    last = -(-end_minute // SLOT_MINUTES)
+    return ((1 << (last - first)) - 1) << (day_of_week * SLOTS_PER_DAY + first)
+
+
+def candidates(request):
+    """Wszystkie możliwe położenia (dzień, minuta startu, maska) dla żądania."""
+    length = request.duration // SLOT_MINUTES
+    first = -(-request.earliest // SLOT_MINUTES)
+    last = (request.latest - request.duration) // SLOT_MINUTES
+    out = []
+    for day in request.days:
+        base = day * SLOTS_PER_DAY
+        for slot in range(first, last + 1):
+            out.append((day, slot * SLOT_MINUTES, ((1 << length) - 1) << (base + slot)))
+    return out
+
+
+def solve(requests, busy=None, max_backtracks=20000):
+    """Rozmieszcza żądania bez kolizji.
+
+    busy to słownik {('teacher'|'student', id): bitset} z istniejącym planem.
+    Najpierw przeszukiwanie z nawrotami (najbardziej ograniczone żądania
+    pierwsze) z limitem nawrotów; gdy limit się wyczerpie lub rozwiązanie
+    nie istnieje - zachłanne rozmieszczenie tego, co się da.
+    Zwraca (lista Placement, lista indeksów nierozmieszczonych żądań).
+    """
+    busy = dict(busy or {})
+    cands = [candidates(r) for r in requests]
+    owners = [(('teacher', r.teacher_id), ('student', r.student_id)) for r in requests]
+
+    def free(i, mask):
+        t, s = owners[i]
+        return not mask & (busy.get(t, 0) | busy.get(s, 0))
+
+    def take(i, mask):
+        t, s = owners[i]
+        busy[t] = busy.get(t, 0) ^ mask
+        busy[s] = busy.get(s, 0) ^ mask
+
+    order = sorted(
+        (i for i in range(len(requests)) if any(free(i, m) for _, _, m in cands[i])),
+        key=lambda i: len(cands[i])
+    )
+    unplaced = sorted(set(range(len(requests))) - set(order))
+    chosen = {}
+    budget = max_backtracks
+
+    def place(pos):
+        nonlocal budget
+        if pos == len(order):
+            return True
+        i = order[pos]
+        for day, start, mask in cands[i]:
+            if not free(i, mask):
+                continue
+            take(i, mask)
+            chosen[i] = (day, start)
+            if place(pos + 1):
+                return True
+            take(i, mask)
+            del chosen[i]
+            budget -= 1
+            if budget <= 0:
+                return False
+        return False
+
+    limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(limit, len(order) + 100))
+    try:
+        solved = place(0)
+    finally:
+        sys.setrecursionlimit(limit)
+
+    if not solved:
+        chosen = {}
+        for i in order:
+            for day, start, mask in cands[i]:
+                if free(i, mask):
+                    take(i, mask)
+                    chosen[i] = (day, start)
+                    break
+            else:
+                unplaced.append(i)
+        unplaced.sort()
+
+    placements = [
+        Placement(requests[i], day, start, start + requests[i].duration)
+        for i, (day, start) in sorted(chosen.items())
+    ]
+    return placements, unplaced
+
+
+def load_busy(requests, start_date, end_date):
+    """Bitsety istniejącego planu wszystkich osób z żądań (jedno zapytanie)."""
+    teacher_ids = {r.teacher_id for r in requests}
+    student_ids = {r.student_id for r in requests}
+    series_list = LessonSeries.query.filter(db.or_(
+        LessonSeries.teacher_id.in_(teacher_ids),
+        LessonSeries.student_id.in_(student_ids)
+    )).all()
+
+    busy = {}
+
+    def occupy(series, day_of_week, start_time, end_time):
+        mask = slot_mask(day_of_week, minute_of_day(start_time), minute_of_day(end_time))
+        for owner in (('teacher', series.teacher_id), ('student', series.student_id)):
+            busy[owner] = busy.get(owner, 0) | mask
+
+    for s in series_list:
+        if dates_overlap(s.start_date, s.end_date, start_date, end_date):
+            occupy(s, s.day_of_week, s.start_time, s.end_time)
+
+    # Wystąpienia przeniesione do okresu nowych serii zajmują swój nowy termin
+    series_by_id = {s.id: s for s in series_list}
+    moved = LessonException.query.filter(
+        LessonException.series_id.in_(series_by_id),
+        LessonException.cancelled.is_(False)
+    ).all() if series_by_id else []
+    for e in moved:
+        day = e.moved_date or e.date
+        if (e.moved_date or e.moved_start_time or e.moved_end_time) and start_date <= day <= end_date:
+            s = series_by_id[e.series_id]
+            occupy(s, day.weekday(), e.moved_start_time or s.start_time, e.moved_end_time or s.end_time)
+    return busy
+
+
+def schedule_batch(requests, start_date, end_date, commit=True):
+    """Rozmieszcza żądania i zapisuje wszystkie serie w jednej transakcji.
+
+    Zwraca (lista Placement, lista indeksów nierozmieszczonych żądań).
+    """
+    teacher_ids = {r.teacher_id for r in requests}
+    student_ids = {r.student_id for r in requests}
+    known_teachers = {t.id for t in Teacher.query.filter(Teacher.id.in_(teacher_ids))}
+    known_students = {s.id for s in Student.query.filter(Student.id.in_(student_ids))}
+    if teacher_ids - known_teachers or student_ids - known_students:
+        raise ValueError("Nieznany nauczyciel lub uczeń w żądaniach")
+
+    placements, unplaced = solve(requests, load_busy(requests, start_date, end_date))
+    if not commit:
+        return placements, unplaced
+
+    db.session.add_all([
+        LessonSeries(
+            teacher_id=p.request.teacher_id,
+            student_id=p.request.student_id,
+            day_of_week=p.day_of_week,
+            start_time=time_of_minute(p.start_minute),
+            end_time=time_of_minute(p.end_minute),
+            start_date=start_date,
+            end_date=end_date
+        )
+        for p in placements
+    ])
+    db.session.commit()
+
+    for teacher_id, student_id in {(p.request.teacher_id, p.request.student_id) for p in placements}:
+        lessons_changed(teacher_id, student_id)
+    return placements, unplaced
+
+
+def placement_to_dict(p):
+    return {
+        "student_id": p.request.student_id,
+        "teacher_id": p.request.teacher_id,
+        "day_of_week": p.day_of_week,
+        "start_time": time_of_minute(p.start_minute).strftime("%H:%M"),
+        "end_time": time_of_minute(p.end_minute).strftime("%H:%M")
+    }
@@ -0,0 +1,92 @@
+import json
+import threading
+from collections import OrderedDict
+from flask import current_app, request
+from app.lesson_calendar import schedule_fingerprint
+
+
+class CalendarEntry:
+    __slots__ = ('fingerprint', 'body')
+
+    def __init__(self, fingerprint, body):
+        self.fingerprint = fingerprint
+        self.body = body
+
+
+class CalendarCache:
+    """Pamięć podręczna odpowiedzi JSON kalendarza zajęć.
+
+    Klucz to (rola, id właściciela, początek, koniec zakresu). Wpis pamięta
+    schedule_fingerprint właściciela z chwili budowy i jest ważny tylko
+    przy zgodnym skrócie, więc zmiana planu zapisana przez dowolny proces
+    serwera unieważnia go bez żadnych liczników w pamięci. invalidate()
+    tylko wcześniej zwalnia wpisy zmienionego właściciela.
+    """
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, *owners):
+        """Usuwa wpisy wskazanych właścicieli, np. ('teacher', 1)."""
+        owners = set(owners)
+        with self._lock:
+            for key in [key for key in self._entries if key[0] in owners]:
+                del self._entries[key]
+
+    def get(self, owner, start, end, fingerprint, build):
+        """Zwraca wpis dla (owner, start, end) zgodny z fingerprint, budując go przez build() przy braku."""
+        key = (owner, start, end)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.fingerprint == fingerprint:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            self.misses += 1
+
+        body = json.dumps(build(), separators=(',', ':')).encode('utf-8')
+        entry = CalendarEntry(fingerprint, body)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+            }
+
+
+def get_calendar_cache():
+    return current_app.extensions['calendar_cache']
+
+
+def calendar_response(owner, start, end, build):
+    """Odpowiedź JSON z ETag; 304 gdy przeglądarka ma aktualną wersję.
+
+    ETag to schedule_fingerprint właściciela (jak w ics_response), wspólny
+    dla wszystkich procesów serwera. Zapytanie warunkowe z aktualnym ETagiem
+    kończy się na tym jednym lekkim zapytaniu.
+    """
+    fingerprint = schedule_fingerprint(owner)
+    resp = current_app.response_class(mimetype='application/json')
+    resp.set_etag(fingerprint)
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.make_conditional(request)
+    if resp.status_code != 200:
+        return resp
+    resp.set_data(get_calendar_cache().get(owner, start, end, fingerprint, build).body)
+    return resp
@@ -0,0 +1,125 @@
+from flask import session
+from flask_login import current_user
+from flask_socketio import Namespace, join_room
+from sqlalchemy import bindparam, inspect, select, text
+from app import db, socketio
+from app.models import Message, Student, Teacher, student_teacher, conversation_key
+
+NAMESPACE = '/chat'
+MAX_MESSAGE_LENGTH = 500
+
+
+def chat_room(student_id, teacher_id):
+    """Pokój Socket.IO jednej pary uczeń-nauczyciel."""
+    return f"chat-{conversation_key(student_id, teacher_id)}"
+
+
+def chat_role(user, student_id, teacher_id):
+    """Rola użytkownika w rozmowie pary ('student' / 'teacher') albo None, gdy nie jest jej uczestnikiem."""
+    if isinstance(user, Student) and user.id == student_id:
+        role = 'student'
+    elif isinstance(user, Teacher) and user.id == teacher_id:
+        role = 'teacher'
+    else:
+        return None
+    assigned = db.session.query(student_teacher).filter_by(student_id=student_id, teacher_id=teacher_id).first()
+    return role if assigned is not None else None
+
+
+def conversation_page(student_id, teacher_id, before=None, limit=50):
+    """Najnowsze limit wiadomości pary (starsze niż wiadomość before), od najstarszej.
+
+    Zwraca (wiadomości, kursor): kursor to id najstarszej zwróconej
+    wiadomości, do przekazania jako before po starszą stronę, albo None,
+    gdy starszych wiadomości już nie ma. Zapytanie idzie po indeksie
+    (conversation_id, id), więc koszt strony nie zależy od długości historii.
+    """
+    query = Message.query.filter(Message.conversation_id == conversation_key(student_id, teacher_id))
+    if before is not None:
+        query = query.filter(Message.id < before)
+    messages = query.order_by(Message.id.desc()).limit(limit + 1).all()
+    cursor = messages[limit - 1].id if len(messages) > limit else None
+    return messages[:limit][::-1], cursor
+
+
+def index_conversations(batch_size=1000):
+    """Uzupełnia conversation_id wiadomości zapisanych przed dodaniem kolumny."""
+    table = Message.__table__
+    with db.engine.begin() as conn:
+        if 'conversation_id' not in {c['name'] for c in inspect(conn).get_columns('messages')}:
+            conn.execute(text("ALTER TABLE messages ADD COLUMN conversation_id VARCHAR(32)"))
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+    updated = 0
+    while True:
+        rows = db.session.execute(
+            select(table.c.id, table.c.sender_id, table.c.receiver_id, table.c.sender_role)
+            .where(table.c.conversation_id.is_(None)).limit(batch_size)
+        ).all()
+        if not rows:
+            return updated
+        keys = []
+        for row in rows:
+            pair = (row.sender_id, row.receiver_id) if row.sender_role == 'student' else (row.receiver_id, row.sender_id)
+            keys.append({'message_id': row.id, 'conversation_id': conversation_key(*pair)})
+        db.session.execute(table.update().where(table.c.id == bindparam('message_id')), keys)
+        db.session.commit()
+        updated += len(rows)
+
+
+def message_to_dict(message):
+    return {
+        'id': message.id,
+        'sender_role': message.sender_role,
+        'content': message.content,
+        'timestamp': message.timestamp.isoformat(),
+    }
+
+
+def post_message(student_id, teacher_id, role, content):
+    """Zapisuje wiadomość i wysyła ją do uczestników połączonych z pokojem pary."""
+    student_sends = role == 'student'
+    message = Message(
+        sender_id=student_id if student_sends else teacher_id,
+        receiver_id=teacher_id if student_sends else student_id,
+        sender_role='student' if student_sends else 'teacher',
+        receiver_role='teacher' if student_sends else 'student',
+        content=content
+    )
+    db.session.add(message)
+    db.session.commit()
+    payload = message_to_dict(message)
+    socketio.emit('new_message', payload, to=chat_room(student_id, teacher_id), namespace=NAMESPACE)
+    return payload
+
+
+class ChatNamespace(Namespace):
+    """Czat na żywo: klient łączy się z auth={'student_id', 'teacher_id'}.
+
+    Przy połączeniu sprawdzamy, że zalogowany użytkownik jest uczniem albo
+    nauczycielem tej pary, i dołączamy go do pokoju pary. Zdarzenie 'send'
+    zapisuje wiadomość, a do pokoju trafia tylko ona (zdarzenie 'new_message'),
+    więc wysłanie nie wymaga ponownego pobierania historii.
+    """
+
+    def on_connect(self, auth=None):
+        if not current_user.is_authenticated:
+            return False
+        try:
+            student_id, teacher_id = int(auth['student_id']), int(auth['teacher_id'])
+        except (TypeError, KeyError, ValueError):
+            return False
+        role = chat_role(current_user, student_id, teacher_id)
+        if role is None:
+            return False
+        session['chat'] = (student_id, teacher_id, role)
+        join_room(chat_room(student_id, teacher_id))
+
+    def on_send(self, data):
+        content = (data or {}).get('content', '').strip() if isinstance(data, dict) else ''
+        if not 1 <= len(content) <= MAX_MESSAGE_LENGTH:
+            return {'error': f"Wiadomość musi mieć od 1 do {MAX_MESSAGE_LENGTH} znaków."}
+        student_id, teacher_id, role = session['chat']
+        return {'id': post_message(student_id, teacher_id, role, content)['id']}
+
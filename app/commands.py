@@ -0,0 +1,118 @@
+import json
+import click
+from datetime import datetime
+from flask import current_app
+from flask.cli import with_appcontext
+from app.auto_scheduler import parse_requests, schedule_batch, placement_to_dict
+from app.attachments import migrate_legacy_attachments
+from app.uploads_gc import collect_garbage
+from app.outbox import get_mail_sender, add_digest_key
+from app.accounts import rebuild_accounts, add_notification_mode
+from app.passwords import calibrate_rounds, get_password_hasher
+from app.chat import index_conversations
+
+
+@click.command('schedule-batch')
+@click.argument('requests_file', type=click.File('r'))
+@click.option('--start-date', required=True, help='Początek serii (YYYY-MM-DD)')
+@click.option('--end-date', required=True, help='Koniec serii (YYYY-MM-DD)')
+@click.option('--dry-run', is_flag=True, help='Tylko pokaż wynik, bez zapisu do bazy')
+@with_appcontext
+def schedule_batch_command(requests_file, start_date, end_date, dry_run):
+    """Rozmieszcza wiele serii zajęć naraz na podstawie pliku JSON z żądaniami."""
+    try:
+        requests = parse_requests(json.load(requests_file))
+        placements, unplaced = schedule_batch(
+            requests,
+            datetime.strptime(start_date, "%Y-%m-%d").date(),
+            datetime.strptime(end_date, "%Y-%m-%d").date(),
+            commit=not dry_run
+        )
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    for p in placements:
+        d = placement_to_dict(p)
+        click.echo(f"uczeń {d['student_id']} / nauczyciel {d['teacher_id']}: "
+                   f"dzień {d['day_of_week']} {d['start_time']}-{d['end_time']}")
+    click.echo(f"Rozmieszczono: {len(placements)}, nierozmieszczone: {len(unplaced)}")
+    for i in unplaced:
+        click.echo(f"  nie udało się rozmieścić żądania nr {i}", err=True)
+
+
+@click.command('migrate-attachments')
+@click.option('--keep-files', is_flag=True, help='Nie usuwaj plików z płaskiego katalogu uploads/')
+@with_appcontext
+def migrate_attachments_command(keep_files):
+    """Przenosi załączniki z kolumn JSON zadań do tabeli task_attachments."""
+    migrated, missing = migrate_legacy_attachments(keep_files)
+    click.echo(f"Przeniesiono załączników: {migrated}")
+    for name in missing:
+        click.echo(f"  brak pliku: {name}", err=True)
+
+
+@click.command('uploads-gc')
+@click.option('--grace-hours', type=float, default=None,
+              help='Nie usuwaj plików młodszych niż tyle godzin (domyślnie UPLOADS_GC_GRACE_HOURS lub 24)')
+@click.option('--dry-run', is_flag=True, help='Tylko policz, nic nie usuwaj')
+@with_appcontext
+def uploads_gc_command(grace_hours, dry_run):
+    """Usuwa z katalogu uploads pliki, na które nie wskazuje żaden załącznik."""
+    if grace_hours is None:
+        grace_hours = current_app.config.get('UPLOADS_GC_GRACE_HOURS', 24)
+    stats = collect_garbage(grace_hours * 3600, dry_run)
+    verb = 'Do usunięcia' if dry_run else 'Usunięto'
+    click.echo(f"Bloby w użyciu: {stats['marked']}, przejrzane: {stats['scanned']}")
+    click.echo(f"{verb} plików: {stats['removed']}, odzyskane bajty: {stats['reclaimed_bytes']}")
+    click.echo(f"Pominięte (młodsze niż {grace_hours:g} h): {stats['kept_recent']}")
+
+
+@click.command('outbox-send')
+@with_appcontext
+def send_outbox_command():
+    """Wysyła od razu wszystkie zaległe e-maile z outboxu."""
+    sender = get_mail_sender()
+    handled = sender.drain()
+    sender.close()
+    stats = sender.stats()
+    click.echo(f"Obsłużone wiadomości: {handled}, wysłane: {stats['sent']}, "
+               f"do ponowienia: {stats['retried']}, nieudane: {stats['failed']}")
+
+
+@click.command('rebuild-accounts')
+@with_appcontext
+def rebuild_accounts_command():
+    """Odbudowuje katalog kont (accounts) z tabel uczniów, nauczycieli i administratorów."""
+    count, duplicates = rebuild_accounts()
+    click.echo(f"Konta w katalogu: {count}")
+    for role, user_id, email in duplicates:
+        click.echo(f"  pominięty duplikat adresu {email}: {role} {user_id}", err=True)
+
+
+@click.command('index-messages')
+@with_appcontext
+def index_messages_command():
+    """Dodaje kolumnę i indeks conversation_id do istniejącej tabeli messages i uzupełnia je."""
+    click.echo(f"Uzupełniono wiadomości: {index_conversations()}")
+
+
+@click.command('add-notification-mode')
+@with_appcontext
+def add_notification_mode_command():
+    """Dodaje kolumnę notification_mode do tabel użytkowników (z uzupełnieniem) i digest_key do outboxu."""
+    for table, count in add_notification_mode().items():
+        click.echo(f"{table}: uzupełniono kont: {count}")
+    if add_digest_key():
+        click.echo("outbox: dodano kolumnę digest_key")
+
+
+@click.command('calibrate-passwords')
+@click.option('--target-ms', type=float, default=250, help='Docelowy czas jednego skrótu (ms)')
+@with_appcontext
+def calibrate_passwords_command(target_ms):
+    """Podpowiada koszt bcrypt dla tej maszyny do ustawienia w BCRYPT_LOG_ROUNDS."""
+    rounds = calibrate_rounds(target_ms)
+    current = get_password_hasher().rounds
+    click.echo(f"Koszt dla {target_ms:g} ms na tej maszynie: {rounds} (bieżący BCRYPT_LOG_ROUNDS: {current})")
+    if rounds < current:
+        click.echo("  niższy koszt osłabiłby istniejące skróty - zostaw bieżącą wartość", err=True)
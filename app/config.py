@@ -6,5 +6,10 @@ load_dotenv()
 
 class TestConfig():
     TESTING = True
+    SECRET_KEY = 'test-secret-key'
     WTF_CSRF_ENABLED = False
-    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
\ No newline at end of file
+    SQLALCHEMY_DATABASE_URI = 'sqlite:///test.db'
+    IMAGE_OPTIMIZER_WORKERS = 0
+    MAIL_OUTBOX_WORKER = False
+    PASSWORD_HASH_WORKERS = 0
+    BCRYPT_LOG_ROUNDS = 4
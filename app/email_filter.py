@@ -0,0 +1,247 @@
+import hashlib
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event, func, inspect
+from app import db
+from app.models import Account, ACCOUNT_ROLES
+from app.accounts import email_taken
+
+
+class BloomFilter:
+    """Filtr Blooma na bajtach: brak w filtrze = na pewno brak w zbiorze.
+
+    Rozmiar (m bitów) i liczba funkcji skrótu (k) dobierane są dla
+    oczekiwanej liczby elementów capacity i docelowego odsetka fałszywych
+    trafień error_rate. k pozycji wyznacza podwójne haszowanie z jednego
+    skrótu blake2b.
+    """
+
+    def __init__(self, capacity=10000, error_rate=0.01):
+        capacity = max(capacity, 1)
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item):
+        for pos in self._positions(item):
+            self._bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self._bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+
+class TokenBucket:
+    """Limit zapytań na klienta: rate żetonów na sekundę, najwyżej burst naraz.
+
+    Pamięta najwyżej max_clients ostatnio widzianych klientów (LRU), żeby
+    duża liczba adresów nie rozrosła słownika bez końca.
+    """
+
+    def __init__(self, rate=5.0, burst=20, max_clients=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+
+    def take(self, client):
+        """Zużywa żeton klienta; zwraca 0 albo liczbę sekund do następnego żetonu."""
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._clients.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - last) * self.rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / self.rate
+            self._clients[client] = (tokens, now)
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            return wait
+
+
+class _Lookup:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class EmailLookup:
+    """Sprawdzanie, czy adres e-mail jest zajęty, dla /check_email.
+
+    Filtr Blooma z adresami z katalogu kont odpowiada na większość zapytań
+    (adres wolny) bez bazy; trafienie w filtrze potwierdza dokładne
+    zapytanie do tabeli accounts. Jednoczesne zapytania o ten sam adres
+    czekają na wynik jednego zapytania do bazy zamiast wysyłać własne.
+    Filtr budowany jest przy pierwszym użyciu i uzupełniany przy dodaniu
+    użytkownika; usunięcie nie usuwa bitów (dają tylko fałszywe trafienia
+    sprawdzane w bazie), więc po rebuild_after_stale usunięciach albo
+    przepełnieniu filtr jest budowany od nowa. limiter ogranicza liczbę
+    zapytań z jednego adresu IP.
+
+    Filtr żyje w pamięci procesu, a zdarzenia ORM widzi tylko proces, który
+    zapisał konto. Dlatego najwyżej co refresh_interval sekund jedno
+    zapytanie o największe id w tabeli accounts sprawdza, czy inne procesy
+    dodały konta, i dopisuje je do filtra. Zmiany adresu i usunięcia w innym
+    procesie tak widoczne nie są, więc filtr starszy niż max_age sekund jest
+    budowany od nowa.
+    """
+
+    def __init__(self, capacity=10000, error_rate=0.01, rebuild_after_stale=1000, rate=5.0, burst=20,
+                 refresh_interval=5.0, max_age=300.0):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.rebuild_after_stale = rebuild_after_stale
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self.limiter = TokenBucket(rate, burst)
+        self._lock = threading.Lock()
+        self._filter = None
+        self._max_id = 0  # największe id konta widziane przy ostatniej synchronizacji z bazą
+        self._built = self._checked = 0.0
+        self._stale = 0
+        self._added = set()
+        self._inflight = {}
+        self._counters = {'negative': 0, 'db_lookups': 0, 'coalesced': 0, 'false_positives': 0, 'rebuilds': 0,
+                          'synced': 0}
+
+    def _build(self):
+        rows = db.session.query(Account.id, Account.email).all()
+        emails = [email for _, email in rows]
+        bloom = BloomFilter(max(self.capacity, 2 * len(emails)), self.error_rate)
+        # Adresy dodane od poprzedniej budowy mogą należeć do transakcji
+        # jeszcze niewidocznych dla tego zapytania - dopisujemy je jawnie
+        for email in [*emails, *self._added]:
+            bloom.add(email)
+        self._added.clear()
+        self._stale = 0
+        self._max_id = max((account_id for account_id, _ in rows), default=0)
+        self._built = self._checked = time.monotonic()
+        self._counters['rebuilds'] += 1
+        return bloom
+
+    def _sync(self):
+        """Dopisuje konta dodane przez inne procesy od ostatniej synchronizacji."""
+        max_id = db.session.query(func.max(Account.id)).scalar() or 0
+        if max_id > self._max_id:
+            for (email,) in db.session.query(Account.email).filter(Account.id > self._max_id):
+                self._filter.add(email)
+                self._counters['synced'] += 1
+            self._max_id = max_id
+        self._checked = time.monotonic()
+
+    def _current(self):
+        with self._lock:
+            now = time.monotonic()
+            if (self._filter is None or self._stale >= self.rebuild_after_stale
+                    or self._filter.count > self._filter.capacity or now - self._built >= self.max_age):
+                self._filter = self._build()
+            elif now - self._checked >= self.refresh_interval:
+                self._sync()
+            return self._filter
+
+    def add(self, email):
+        with self._lock:
+            self._added.add(email)
+            if self._filter is not None:
+                self._filter.add(email)
+
+    def removed(self):
+        """Odnotowuje usunięty (albo zmieniony) adres - jego bity zostają w filtrze."""
+        with self._lock:
+            self._stale += 1
+
+    def exists(self, email):
+        if not email or email not in self._current():
+            self._counters['negative'] += 1
+            return False
+
+        with self._lock:
+            pending = self._inflight.get(email)
+            leader = pending is None
+            if leader:
+                pending = self._inflight[email] = _Lookup()
+            else:
+                self._counters['coalesced'] += 1
+
+        if not leader:
+            pending.done.wait()
+            if pending.error is not None:
+                raise pending.error
+            return pending.result
+
+        try:
+            self._counters['db_lookups'] += 1
+            pending.result = email_taken(email)
+            if not pending.result:
+                self._counters['false_positives'] += 1
+            return pending.result
+        except Exception as e:
+            pending.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[email]
+            pending.done.set()
+
+    def stats(self):
+        with self._lock:
+            bloom = self._filter
+            return {
+                **self._counters,
+                'entries': bloom.count if bloom else 0,
+                'bits': bloom.size if bloom else 0,
+                'stale': self._stale,
+            }
+
+
+def get_email_lookup():
+    return current_app.extensions['email_lookup']
+
+
+def _lookup():
+    if has_app_context():
+        return current_app.extensions.get('email_lookup')
+    return None
+
+
+def _register_filter_sync(model):
+    @event.listens_for(model, 'after_insert')
+    def filter_insert(mapper, connection, target):
+        lookup = _lookup()
+        if lookup is not None:
+            lookup.add(target.email)
+
+    @event.listens_for(model, 'after_update')
+    def filter_update(mapper, connection, target):
+        lookup = _lookup()
+        history = inspect(target).attrs.email.history
+        if lookup is not None and history.has_changes():
+            lookup.add(target.email)
+            lookup.removed()
+
+    @event.listens_for(model, 'after_delete')
+    def filter_delete(mapper, connection, target):
+        lookup = _lookup()
+        if lookup is not None:
+            lookup.removed()
+
+
+for _model in ACCOUNT_ROLES.values():
+    _register_filter_sync(_model)
@@ -3,7 +3,7 @@ from wtforms import StringField, PasswordField, SubmitField, RadioField, SelectF
 from wtforms.validators import InputRequired, Email, Length, ValidationError
 from wtforms.validators import NumberRange
 from flask_wtf.file import FileField, FileAllowed
-from app.models import Student
+from app.accounts import email_taken
 
 class RegisterForm(FlaskForm):
     role = RadioField(
@@ -26,7 +26,7 @@ class RegisterForm(FlaskForm):
     )
 
     def validate_email(self, email):
-        if Student.query.filter_by(email=email.data).first():
+        if email_taken(email.data):
             raise ValidationError('Email already exists.')
 
 class LoginForm(FlaskForm):
@@ -71,4 +71,11 @@ class AssignStudentForm(FlaskForm):
 
 class WriteMessageForm(FlaskForm):
     message = TextAreaField('Wiadomość', validators=[InputRequired(), Length(min=1, max=500)])
-    submit = SubmitField('Wyślij')
\ No newline at end of file
+    submit = SubmitField('Wyślij')
+
+class NotificationPreferenceForm(FlaskForm):
+    mode = SelectField(
+        'Powiadomienia e-mail',
+        choices=[('digest', 'Zbiorczo (jeden e-mail za kilka zdarzeń)'), ('immediate', 'Od razu po każdym zdarzeniu')]
+    )
+    submit = SubmitField('Zapisz')
\ No newline at end of file
@@ -0,0 +1,122 @@
+from datetime import date, datetime, timezone
+from flask import current_app, request
+from app.models import LessonException
+from app.lesson_calendar import schedule_fingerprint
+from app.recurrence import first_weekday_on_or_after
+
+BYDAY = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+# Seria bez daty początku zaczyna się w kalendarzu od tego dnia
+OPEN_START = date(2020, 1, 1)
+
+
+def escape_text(value):
+    return value.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def fold(line):
+    """Zawija linię do 75 oktetów (RFC 5545, 3.1) i dodaje CRLF."""
+    raw = line.encode('utf-8')
+    if len(raw) <= 75:
+        return line + '\r\n'
+    parts = []
+    while len(raw) > 75:
+        cut = 75 if not parts else 74
+        # nie przecinamy wielobajtowego znaku UTF-8
+        while cut > 0 and (raw[cut] & 0xC0) == 0x80:
+            cut -= 1
+        parts.append(raw[:cut].decode('utf-8'))
+        raw = raw[cut:]
+    parts.append(raw.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def format_dt(d, t):
+    return datetime.combine(d, t).strftime('%Y%m%dT%H%M%S')
+
+
+def series_events(series, exceptions, title, uid_domain, stamp):
+    """Linie VEVENT dla jednej serii: reguła RRULE + nadpisania przeniesionych wystąpień."""
+    first = first_weekday_on_or_after(series.start_date or OPEN_START, series.day_of_week)
+    uid = f"series-{series.id}@{uid_domain}"
+    summary = escape_text(title)
+
+    rrule = f"RRULE:FREQ=WEEKLY;BYDAY={BYDAY[series.day_of_week]}"
+    if series.end_date is not None:
+        rrule += f";UNTIL={series.end_date.strftime('%Y%m%d')}T235959"
+
+    yield 'BEGIN:VEVENT'
+    yield f'UID:{uid}'
+    yield f'DTSTAMP:{stamp}'
+    yield f'SUMMARY:{summary}'
+    yield f'DTSTART:{format_dt(first, series.start_time)}'
+    yield f'DTEND:{format_dt(first, series.end_time)}'
+    yield rrule
+    cancelled = [e for e in exceptions if e.cancelled]
+    if cancelled:
+        yield 'EXDATE:' + ','.join(format_dt(e.date, series.start_time) for e in cancelled)
+    yield 'END:VEVENT'
+
+    for e in exceptions:
+        if e.cancelled:
+            continue
+        day = e.moved_date or e.date
+        yield 'BEGIN:VEVENT'
+        yield f'UID:{uid}'
+        yield f'DTSTAMP:{stamp}'
+        yield f'RECURRENCE-ID:{format_dt(e.date, series.start_time)}'
+        yield f'SUMMARY:{summary}'
+        yield f'DTSTART:{format_dt(day, e.moved_start_time or series.start_time)}'
+        yield f'DTEND:{format_dt(day, e.moved_end_time or series.end_time)}'
+        yield 'END:VEVENT'
+
+
+def load_exceptions(series_list):
+    """Wszystkie wyjątki podanych serii, {id serii: [LessonException, ...]} - jedno zapytanie."""
+    exceptions = {}
+    if series_list:
+        rows = LessonException.query \
+            .filter(LessonException.series_id.in_([s.id for s in series_list])) \
+            .order_by(LessonException.series_id, LessonException.date)
+        for e in rows:
+            exceptions.setdefault(e.series_id, []).append(e)
+    return exceptions
+
+
+def calendar_lines(series_list, exceptions, title_for, name, uid_domain):
+    """Cały VCALENDAR jako generator linii - jedno VEVENT na serię, nie na wystąpienie."""
+    stamp = datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+    yield fold('BEGIN:VCALENDAR')
+    yield fold('VERSION:2.0')
+    yield fold('PRODID:-//Akademia Korepetycji//Plan zajec//PL')
+    yield fold('CALSCALE:GREGORIAN')
+    yield fold(f'X-WR-CALNAME:{escape_text(name)}')
+    for s in series_list:
+        for line in series_events(s, exceptions.get(s.id, ()), title_for(s), uid_domain, stamp):
+            yield fold(line)
+    yield fold('END:VCALENDAR')
+
+
+def ics_response(owner, name, load_series, title_for):
+    """Strumieniowana odpowiedź text/calendar z ETag.
+
+    ETag to skrót stanu planu właściciela w bazie (schedule_fingerprint),
+    więc jest taki sam w każdym procesie serwera. Zapytanie warunkowe z
+    aktualnym ETagiem dostaje 304 po jednym lekkim zapytaniu. W przeciwnym
+    razie serie i wyjątki są ładowane dwoma zapytaniami, a sam tekst
+    kalendarza generowany jest w trakcie wysyłania.
+    """
+    resp = current_app.response_class(mimetype='text/calendar')
+    resp.set_etag(schedule_fingerprint(owner))
+    resp.cache_control.private = True
+    resp.cache_control.no_cache = True
+    resp.headers['Content-Disposition'] = 'inline; filename="lessons.ics"'
+    resp.make_conditional(request)
+    if resp.status_code != 200:
+        return resp
+
+    series_list = load_series()
+    exceptions = load_exceptions(series_list)
+    resp.headers.pop('Content-Length', None)
+    resp.response = calendar_lines(series_list, exceptions, title_for, name, request.host.split(':')[0])
+    return resp
@@ -0,0 +1,89 @@
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.orm import make_transient_to_detached
+from app import db
+
+
+class IdentityCache:
+    """Pamięć podręczna użytkowników dla load_user, klucz (rola, id).
+
+    Przechowuje migawkę kolumn użytkownika, a nie obiekt ORM - obiekt jest
+    związany z sesją żądania, w którym go wczytano. Przy trafieniu migawka
+    jest odtwarzana i wpinana do bieżącej sesji przez merge(load=False), bez
+    zapytania do bazy; relacje (np. student.teachers) nadal ładują się z
+    bazy przy pierwszym użyciu. Wpisy żyją ttl sekund, najdawniej używane
+    wypadają po przekroczeniu max_entries. Cache jest osobny w każdym
+    procesie: invalidate() usuwa wpis tylko w bieżącym workerze, w
+    pozostałych zmiana jest widoczna najpóźniej po ttl sekundach.
+    """
+
+    def __init__(self, max_entries=1024, ttl=30.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, role, user_id):
+        """Użytkownik z cache wpięty do bieżącej sesji albo None."""
+        key = (role, int(user_id))
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= now:
+                del self._entries[key]
+                self.expired += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            _, model, columns = entry
+
+        user = model()
+        for name, value in columns.items():
+            setattr(user, name, value)
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    def put(self, role, user):
+        """Zapamiętuje migawkę kolumn wczytanego użytkownika."""
+        columns = {attr.key: getattr(user, attr.key) for attr in inspect(type(user)).column_attrs}
+        with self._lock:
+            key = (role, user.id)
+            self._entries[key] = (time.monotonic() + self.ttl, type(user), columns)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, role, user_id):
+        """Usuwa wpis użytkownika, np. po zatwierdzeniu, usunięciu albo zmianie przypisania."""
+        with self._lock:
+            if self._entries.pop((role, int(user_id)), None) is not None:
+                self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'expired': self.expired,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+def get_identity_cache():
+    return current_app.extensions['identity_cache']
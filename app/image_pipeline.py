@@ -0,0 +1,175 @@
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from app import db
+from app.models import TaskAttachment
+from app.attachments import ingest_file
+from app.storage import copy_to_file, get_storage
+from app.utils import compress_file, DEFAULT_MAX_EDGE
+
+
+def optimize_blob(storage, sha256, ext, max_edge=DEFAULT_MAX_EDGE):
+    """Kompresuje kopię bloba i wstawia wynik do magazynu; zwraca (sha256, rozmiar).
+
+    Działa w procesie roboczym - nie korzysta z kontekstu aplikacji ani bazy.
+    Oryginalny blob nie jest modyfikowany; gdy optymalizacja nic nie daje,
+    zwracany jest jego własny skrót.
+    """
+    fd, tmp = tempfile.mkstemp(suffix=ext, dir=storage.scratch_dir())
+    os.close(fd)
+    try:
+        copy_to_file(storage, sha256, tmp)
+        if not compress_file(tmp, max_edge):
+            size = os.path.getsize(tmp)
+            os.remove(tmp)
+            return sha256, size
+        return ingest_file(tmp, storage)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _timed_optimize(storage, sha256, ext, max_edge):
+    started = time.perf_counter()
+    result = optimize_blob(storage, sha256, ext, max_edge)
+    return result, (time.perf_counter() - started) * 1000
+
+
+class ImageOptimizer:
+    """Optymalizacja obrazów z załączników w puli procesów.
+
+    Żądanie HTTP zapisuje oryginał i od razu zatwierdza zadanie; załącznik
+    ma status 'processing', dopóki proces roboczy nie wstawi do magazynu
+    skompresowanej wersji - wtedy wiersz jest przepinany na nowy skrót
+    (jedna aktualizacja, więc pobierający widzi stary albo nowy plik, nigdy
+    niepełny). Kolejka jest ograniczona do max_pending zleceń: przy pełnej
+    kolejce zgłaszający czeka do submit_timeout sekund, a potem plik zostaje
+    bez kompresji. workers=0 oznacza przetwarzanie w bieżącym wątku.
+    """
+
+    def __init__(self, app, workers=2, max_pending=32, submit_timeout=5.0, max_edge=DEFAULT_MAX_EDGE):
+        self.app = app
+        self.workers = workers
+        self.max_edge = max_edge
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._executor = None
+        self.pending = 0
+        self.max_depth = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.total_ms = 0.0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def enqueue(self, attachments):
+        """Zleca optymalizację zapisanych w bazie załączników o statusie 'processing'."""
+        storage = get_storage().for_worker()
+        for attachment in attachments:
+            job = (attachment.id, attachment.sha256, os.path.splitext(attachment.original_name)[1].lower())
+            if self.workers <= 0:
+                self._run_inline(storage, job)
+                continue
+            if not self._slots.acquire(timeout=self.submit_timeout):
+                with self._lock:
+                    self.rejected += 1
+                self._finish(job, None)
+                continue
+            with self._lock:
+                self.pending += 1
+                self.submitted += 1
+                self.max_depth = max(self.max_depth, self.pending)
+            try:
+                future = self._pool().submit(_timed_optimize, storage, job[1], job[2], self.max_edge)
+            except Exception:
+                self._done(job, None)
+                raise
+            future.add_done_callback(lambda f, job=job: self._done(job, f))
+
+    def _run_inline(self, storage, job):
+        with self._lock:
+            self.submitted += 1
+        try:
+            result, elapsed = _timed_optimize(storage, job[1], job[2], self.max_edge)
+        except Exception:
+            result, elapsed = None, None
+        self._record(result, elapsed)
+        self._finish(job, result)
+
+    def _done(self, job, future):
+        result, elapsed = None, None
+        if future is not None:
+            try:
+                result, elapsed = future.result()
+            except Exception:
+                pass
+        try:
+            self._finish(job, result)
+        finally:
+            self._record(result, elapsed)
+            self._slots.release()
+            with self._lock:
+                self.pending -= 1
+                self._idle.notify_all()
+
+    def _record(self, result, elapsed):
+        with self._lock:
+            if result is None:
+                self.failed += 1
+            else:
+                self.completed += 1
+                self.total_ms += elapsed
+
+    def _finish(self, job, result):
+        """Przepina załącznik na zoptymalizowany blob i oznacza go jako gotowy."""
+        attachment_id, sha256, _ = job
+        with self.app.app_context():
+            attachment = db.session.get(TaskAttachment, attachment_id)
+            # załącznik usunięty lub zastąpiony w międzyczasie
+            if attachment is None or attachment.sha256 != sha256:
+                return
+            if result is not None:
+                attachment.sha256, attachment.size = result
+            attachment.status = 'ready'
+            db.session.commit()
+
+    def wait(self, timeout=None):
+        """Czeka, aż kolejka się opróżni; zwraca False po upływie timeout."""
+        with self._idle:
+            return self._idle.wait_for(lambda: self.pending == 0, timeout)
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'queue_depth': self.pending,
+                'max_depth': self.max_depth,
+                'max_pending': self.max_pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_ms': round(self.total_ms / self.completed, 1) if self.completed else 0.0
+            }
+
+
+def get_image_optimizer():
+    return current_app.extensions['image_optimizer']
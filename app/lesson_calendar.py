@@ -0,0 +1,128 @@
+import hashlib
+from datetime import date
+from sqlalchemy.orm import joinedload
+from app import db
+from app.models import LessonSeries, LessonException
+from app.recurrence import occurrences
+
+
+def teacher_series(teacher_id):
+    """Serie nauczyciela razem z uczniami - jedno zapytanie z JOIN."""
+    return LessonSeries.query \
+        .options(joinedload(LessonSeries.student)) \
+        .filter_by(teacher_id=teacher_id) \
+        .all()
+
+
+def student_series(student_id):
+    """Serie ucznia razem z nauczycielami - jedno zapytanie z JOIN."""
+    return LessonSeries.query \
+        .options(joinedload(LessonSeries.teacher)) \
+        .filter_by(student_id=student_id) \
+        .all()
+
+
+def exceptions_in_range(series_list, start, end):
+    """Wyjątki serii dotyczące zakresu [start, end] - jedno zapytanie.
+
+    Zwraca {id serii: {data pierwotna: LessonException}}. Uwzględnia też
+    wystąpienia przeniesione do zakresu z dat spoza niego.
+    """
+    if not series_list:
+        return {}
+    rows = LessonException.query.filter(
+        LessonException.series_id.in_([s.id for s in series_list]),
+        db.or_(
+            LessonException.date.between(start, end),
+            LessonException.moved_date.between(start, end)
+        )
+    ).all()
+    grouped = {}
+    for e in rows:
+        grouped.setdefault(e.series_id, {})[e.date] = e
+    return grouped
+
+
+def schedule_fingerprint(owner):
+    """Skrót stanu planu właściciela w bazie (serie i ich wyjątki) - jedno zapytanie.
+
+    Zmienia się przy każdej zmianie serii lub wyjątku, niezależnie od tego,
+    który proces serwera ją zapisał.
+    """
+    role, owner_id = owner
+    column = LessonSeries.teacher_id if role == 'teacher' else LessonSeries.student_id
+    rows = db.session.query(
+        LessonSeries.id, LessonSeries.day_of_week, LessonSeries.start_time, LessonSeries.end_time,
+        LessonSeries.start_date, LessonSeries.end_date,
+        LessonException.date, LessonException.cancelled, LessonException.moved_date,
+        LessonException.moved_start_time, LessonException.moved_end_time
+    ).outerjoin(LessonException, LessonException.series_id == LessonSeries.id) \
+        .filter(column == owner_id) \
+        .order_by(LessonSeries.id, LessonException.date) \
+        .all()
+    return hashlib.sha1(repr([tuple(r) for r in rows]).encode('utf-8')).hexdigest()
+
+
+def parse_occurrence_id(occurrence_id):
+    """'series-<id>-<YYYY-MM-DD>' -> (id, data); 'series-<id>' -> (id, None).
+
+    ValueError przy niepoprawnym identyfikatorze.
+    """
+    prefix, _, rest = occurrence_id.partition('-')
+    series_id, _, day = rest.partition('-')
+    if prefix != 'series':
+        raise ValueError(occurrence_id)
+    return int(series_id), date.fromisoformat(day) if day else None
+
+
+def occurrence_exception(series, day):
+    """Istniejący lub nowy (dodany do sesji) wyjątek dla wystąpienia serii w dniu day."""
+    exception = LessonException.query.filter_by(series_id=series.id, date=day).first()
+    if exception is None:
+        exception = LessonException(series_id=series.id, date=day)
+        db.session.add(exception)
+    return exception
+
+
+def teacher_event_title(series):
+    return f"{series.student.name} {series.student.surname}"
+
+
+def student_event_title(series):
+    return f" {series.teacher.subject}"
+
+
+def build_events(series_list, start, end, title_for, exceptions=None):
+    """Zdarzenia FullCalendar dla wszystkich wystąpień serii w zakresie [start, end].
+
+    Tytuł i godziny liczone są raz na serię; dla każdego wystąpienia
+    doklejana jest tylko data. Identyfikator zdarzenia zawsze wskazuje
+    pierwotną datę wystąpienia, także gdy zostało ono przeniesione.
+    """
+    exceptions = exceptions or {}
+    events = []
+    for s in series_list:
+        title = title_for(s)
+        id_prefix = f"series-{s.id}-"
+        times = {s.start_time: s.start_time.isoformat(), s.end_time: s.end_time.isoformat()}
+        for original, d, t_start, t_end in occurrences(s, start, end, exceptions.get(s.id)):
+            day = d.isoformat()
+            events.append({
+                "id": id_prefix + original.isoformat(),
+                "title": title,
+                "start": f"{day}T{times.get(t_start) or t_start.isoformat()}",
+                "end": f"{day}T{times.get(t_end) or t_end.isoformat()}"
+            })
+    return events
+
+
+def teacher_events(teacher_id, start, end):
+    series_list = teacher_series(teacher_id)
+    return build_events(series_list, start, end, teacher_event_title,
+                        exceptions_in_range(series_list, start, end))
+
+
+def student_events(student_id, start, end):
+    series_list = student_series(student_id)
+    return build_events(series_list, start, end, student_event_title,
+                        exceptions_in_range(series_list, start, end))
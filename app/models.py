@@ -1,7 +1,7 @@
 from app import db
 from flask_login import UserMixin
-from sqlalchemy import Text
 from datetime import datetime, timezone
+from sqlalchemy import event, inspect
 
 class UserBase(db.Model):
     __abstract__ = True
@@ -10,6 +10,7 @@ class UserBase(db.Model):
     surname = db.Column(db.String(15), nullable=False)
     email = db.Column(db.String(30), unique=True, nullable=False)
     password = db.Column(db.String(128), nullable=False)
+    notification_mode = db.Column(db.String(10), nullable=False, default='digest')  # 'immediate' albo 'digest'
 
 student_teacher = db.Table(
     'student_teacher',
@@ -50,20 +51,90 @@ class Task(db.Model):
     student = db.relationship('Student', backref='tasks', lazy=True)
     teacher = db.relationship('Teacher', backref='assigned_tasks', lazy=True)
     student_answer = db.Column(db.Text, nullable=True)
-    teacher_attachments = db.Column(Text, nullable=True)
-    student_attachments = db.Column(Text, nullable=True)
     submitted = db.Column(db.Boolean, default=False)
 
+    @property
+    def teacher_files(self):
+        return [a for a in self.attachments if a.side == 'teacher']
+
+    @property
+    def student_files(self):
+        return [a for a in self.attachments if a.side == 'student']
+
+class TaskAttachment(db.Model):
+    """Załącznik zadania; treść pliku leży w magazynie adresowanym skrótem sha256."""
+    __tablename__ = 'task_attachments'
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, db.ForeignKey('tasks.id'), nullable=False, index=True)
+    side = db.Column(db.String(10), nullable=False)  # 'teacher' albo 'student'
+    sha256 = db.Column(db.String(64), nullable=False, index=True)
+    size = db.Column(db.Integer, nullable=False)
+    mime = db.Column(db.String(100), nullable=False)
+    original_name = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='ready')  # 'processing' do czasu optymalizacji obrazu
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    task = db.relationship(
+        'Task',
+        backref=db.backref('attachments', cascade='all, delete-orphan', order_by='TaskAttachment.id')
+    )
+
 class Administrator(UserBase, UserMixin):
     __tablename__ = 'administrators'
 
+class Account(db.Model):
+    """Wspólny katalog kont: e-mail -> (rola, id) dla uczniów, nauczycieli i administratorów."""
+    __tablename__ = 'accounts'
+    __table_args__ = (db.UniqueConstraint('role', 'user_id'),)
+    id = db.Column(db.Integer, primary_key=True)
+    email = db.Column(db.String(30), unique=True, nullable=False)
+    role = db.Column(db.String(20), nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)
+
+# Rola zapisywana w katalogu kont dla każdej tabeli użytkowników
+ACCOUNT_ROLES = {'student': Student, 'teacher': Teacher, 'administrator': Administrator}
+
+def _register_account_sync(model, role):
+    """Utrzymuje wiersz accounts w tym samym flushu co zmiana użytkownika."""
+    accounts = Account.__table__
+
+    @event.listens_for(model, 'after_insert')
+    def account_insert(mapper, connection, target):
+        connection.execute(accounts.insert().values(email=target.email, role=role, user_id=target.id))
+
+    @event.listens_for(model, 'after_update')
+    def account_update(mapper, connection, target):
+        if inspect(target).attrs.email.history.has_changes():
+            connection.execute(accounts.update()
+                               .where(accounts.c.role == role, accounts.c.user_id == target.id)
+                               .values(email=target.email))
+
+    @event.listens_for(model, 'after_delete')
+    def account_delete(mapper, connection, target):
+        connection.execute(accounts.delete().where(accounts.c.role == role, accounts.c.user_id == target.id))
+
+for _role, _model in ACCOUNT_ROLES.items():
+    _register_account_sync(_model, _role)
+
+def conversation_key(student_id, teacher_id):
+    """Klucz rozmowy pary uczeń-nauczyciel (kolumna messages.conversation_id)."""
+    return f"{student_id}-{teacher_id}"
+
+def _message_conversation(context):
+    params = context.get_current_parameters()
+    if params['sender_role'] == 'student':
+        return conversation_key(params['sender_id'], params['receiver_id'])
+    return conversation_key(params['receiver_id'], params['sender_id'])
+
 class Message(db.Model):
     __tablename__ = 'messages'
+    # Historia rozmowy czytana od końca stronami: WHERE conversation_id = ? AND id < ? ORDER BY id DESC
+    __table_args__ = (db.Index('ix_messages_conversation', 'conversation_id', 'id'),)
     id = db.Column(db.Integer, primary_key=True)
     sender_id = db.Column(db.Integer, nullable=False)
     receiver_id = db.Column(db.Integer, nullable=False)
     sender_role = db.Column(db.String(20), nullable=False)
     receiver_role = db.Column(db.String(20), nullable=False)
+    conversation_id = db.Column(db.String(32), nullable=False, default=_message_conversation)
     content = db.Column(db.Text, nullable=False)
     timestamp = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
     
@@ -83,4 +154,40 @@ class LessonSeries(db.Model):
 
     teacher = db.relationship('Teacher', backref='lesson_series')
     student = db.relationship('Student', backref='lesson_series')
-    
\ No newline at end of file
+
+class LessonException(db.Model):
+    """Wyjątek od serii dla jednego wystąpienia: odwołanie albo przeniesienie."""
+    __tablename__ = 'lesson_exceptions'
+    __table_args__ = (db.UniqueConstraint('series_id', 'date'),)
+    id = db.Column(db.Integer, primary_key=True)
+
+    series_id = db.Column(db.Integer, db.ForeignKey('lesson_series.id'), nullable=False, index=True)
+    date = db.Column(db.Date, nullable=False)
+
+    cancelled = db.Column(db.Boolean, nullable=False, default=False)
+    moved_date = db.Column(db.Date, nullable=True)
+    moved_start_time = db.Column(db.Time, nullable=True)
+    moved_end_time = db.Column(db.Time, nullable=True)
+
+    series = db.relationship(
+        'LessonSeries',
+        backref=db.backref('exceptions', cascade='all, delete-orphan')
+    )
+
+class OutboxMessage(db.Model):
+    """E-mail do wysłania; zapisywany w tej samej transakcji co zmiana zadania, wysyłany w tle."""
+    __tablename__ = 'outbox'
+    __table_args__ = (db.Index('ix_outbox_due', 'status', 'next_attempt_at'),)
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    purpose = db.Column(db.String(20), nullable=True)
+    items = db.Column(db.JSON(none_as_null=True), nullable=True)  # tytuły zadań zebrane w zbiorczym e-mailu
+    digest_key = db.Column(db.String(160), unique=True, nullable=True)  # 'cel:odbiorca' otwartego zbiorczego e-maila
+    status = db.Column(db.String(10), nullable=False, default='pending')  # 'pending', 'sending', 'sent', 'failed'
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
+    last_error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
+    sent_at = db.Column(db.DateTime, nullable=True)
@@ -0,0 +1,374 @@
+import smtplib
+import threading
+from datetime import datetime, timedelta, timezone
+from email.message import EmailMessage
+from flask import current_app
+from sqlalchemy import func, inspect, text
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models import OutboxMessage
+
+# Treść powiadomień o zadaniach: cel -> (temat, treść)
+MAIL_TEMPLATES = {
+    'assign_task': ("Nowe zadanie do wykonania",
+                    "Zostało Ci przydzielone nowe zadanie. Proszę sprawdzić swoje zadania na stronie."),
+    'submit_task': ("Zadanie zostało oddane",
+                    "Zadanie zostało oddane. Proszę ocenić zadanie."),
+    'grade_task': ("Zadanie zostało ocenione",
+                   "Twoje zadanie zostało ocenione. Proszę sprawdzić swoje zadania na stronie."),
+}
+
+# Zbiorcze powiadomienia: cel -> (temat, wstęp do listy zadań)
+DIGEST_TEMPLATES = {
+    'assign_task': ("Nowe zadania do wykonania", "Zostały Ci przydzielone nowe zadania:"),
+    'submit_task': ("Oddane zadania", "Uczniowie oddali zadania do oceny:"),
+    'grade_task': ("Ocenione zadania", "Twoje zadania zostały ocenione:"),
+}
+
+
+def _utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def queue_mail(recipient, purpose, task_title=None):
+    """Dodaje e-mail do outboxu w bieżącej sesji - zapisze się razem z commitem zmiany zadania."""
+    subject, body = MAIL_TEMPLATES[purpose]
+    if task_title:
+        body = f"{body}\n\nZadanie: {task_title}"
+    message = OutboxMessage(recipient=recipient, subject=subject, body=body, purpose=purpose,
+                            next_attempt_at=_utcnow())
+    db.session.add(message)
+    return message
+
+
+def _digest_text(purpose, titles):
+    subject, intro = DIGEST_TEMPLATES[purpose]
+    lines = "\n".join(f"- {title}" for title in titles)
+    return (f"{subject} ({len(titles)})",
+            f"{intro}\n{lines}\n\nProszę sprawdzić swoje zadania na stronie.")
+
+
+def _digest_key(recipient, purpose):
+    return f"{purpose}:{recipient}"
+
+
+def _open_digest(key):
+    """(id, temat, tytuły, termin) otwartego zbiorczego e-maila o kluczu key albo None."""
+    return db.session.query(OutboxMessage.id, OutboxMessage.subject, OutboxMessage.items,
+                            OutboxMessage.next_attempt_at) \
+        .filter(OutboxMessage.digest_key == key).first()
+
+
+def queue_digest(recipient, purpose, task_title, window):
+    """Dopisuje zdarzenie do otwartego zbiorczego e-maila odbiorcy albo otwiera nowy.
+
+    Zbiorczy e-mail czeka w outboxie window sekund od pierwszego zdarzenia
+    (next_attempt_at), a kolejne zdarzenia z tym samym celem tylko dopisują
+    tytuł zadania. Otwarty e-mail ma unikalny digest_key, zwalniany przy
+    pobraniu do wysyłki albo po upływie okna. Dopisanie to warunkowy UPDATE
+    (wiersz wciąż otwarty i oczekujący, temat z liczbą tytułów bez zmian od
+    odczytu), a dwa równoległe pierwsze zdarzenia nie otworzą dwóch wierszy,
+    bo drugi INSERT narusza unikalność klucza. Przegrany wyścig ponawiamy -
+    oznacza, że inny proces zdążył zapisać swoje zdarzenie.
+    """
+    key = _digest_key(recipient, purpose)
+    while True:
+        now = _utcnow()
+        current = _open_digest(key)
+        if current is not None and current.next_attempt_at <= now:
+            # okno minęło - zamykamy e-mail, kolejne zdarzenia trafią do nowego
+            db.session.query(OutboxMessage) \
+                .filter(OutboxMessage.id == current.id, OutboxMessage.digest_key == key) \
+                .update({'digest_key': None}, synchronize_session=False)
+            current = None
+
+        if current is None:
+            message = OutboxMessage(recipient=recipient, purpose=purpose, items=[task_title], digest_key=key,
+                                    next_attempt_at=now + timedelta(seconds=window))
+            message.subject, message.body = _digest_text(purpose, message.items)
+            try:
+                with db.session.begin_nested():
+                    db.session.add(message)
+            except IntegrityError:
+                continue  # równoległe zdarzenie otworzyło już e-mail
+            return message
+
+        items = [*current.items, task_title]
+        subject, body = _digest_text(purpose, items)
+        updated = db.session.query(OutboxMessage) \
+            .filter(OutboxMessage.id == current.id, OutboxMessage.digest_key == key,
+                    OutboxMessage.status == 'pending', OutboxMessage.next_attempt_at > now,
+                    OutboxMessage.subject == current.subject) \
+            .update({'items': items, 'subject': subject, 'body': body}, synchronize_session=False)
+        if updated:
+            return db.session.get(OutboxMessage, current.id, populate_existing=True)
+
+
+def notify(user, purpose, task_title):
+    """Powiadomienie o zadaniu zgodnie z preferencją użytkownika: od razu albo w zbiorczym e-mailu."""
+    window = current_app.config.get("NOTIFICATION_DIGEST_WINDOW", 600)
+    if user.notification_mode == 'digest' and window > 0:
+        return queue_digest(user.email, purpose, task_title, window)
+    return queue_mail(user.email, purpose, task_title)
+
+
+class ConnectionFailed(Exception):
+    """Nie udało się połączyć z serwerem SMTP albo zalogować - błąd serwera, nie wiadomości."""
+
+
+def add_digest_key():
+    """Dodaje kolumnę digest_key z unikalnym indeksem do istniejącej tabeli outbox; True, gdy jej brakowało."""
+    with db.engine.begin() as conn:
+        if 'digest_key' in {c['name'] for c in inspect(conn).get_columns('outbox')}:
+            return False
+        conn.execute(text("ALTER TABLE outbox ADD COLUMN digest_key VARCHAR(160)"))
+        conn.execute(text("CREATE UNIQUE INDEX uq_outbox_digest_key ON outbox (digest_key)"))
+    return True
+
+
+def _is_permanent(error):
+    """Odpowiedź 5xx serwera SMTP (np. nieistniejący adres) - ponawianie nic nie da."""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    code = getattr(error, 'smtp_code', None)
+    return isinstance(code, int) and code >= 500
+
+
+class MailSender:
+    """Wysyłka e-maili z outboxu w wątku w tle.
+
+    Żądanie HTTP tylko zapisuje wiersz outbox i wraca; wątek budzony przez
+    wake() (albo co poll_interval sekund) pobiera zaległe wiadomości
+    partiami po batch_size i wysyła je jednym, utrzymywanym połączeniem
+    SMTP, zamykanym po idle_timeout sekundach bez pracy. Nieudana wysyłka
+    wraca do kolejki z wykładniczo rosnącym opóźnieniem (base_delay * 2^n,
+    najwyżej max_delay); po max_attempts próbach albo błędzie 5xx wiadomość
+    dostaje status 'failed'. Błąd połączenia lub logowania odkłada całą
+    partię (opóźnienie rośnie z kolejnymi nieudanymi połączeniami), ale
+    nie jest liczony jako próba wysyłki wiadomości. Pobrane wiersze mają status 'sending' z
+    dzierżawą na lease_seconds, więc kilka procesów nie wyśle tej samej
+    wiadomości, a wiersze porzucone przez zatrzymany proces wracają do kolejki.
+    """
+
+    def __init__(self, app, batch_size=50, max_attempts=6, base_delay=30, max_delay=3600,
+                 poll_interval=30, idle_timeout=60, lease_seconds=300, timeout=30):
+        self.app = app
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.poll_interval = poll_interval
+        self.idle_timeout = idle_timeout
+        self.lease_seconds = lease_seconds
+        self.timeout = timeout
+        self._smtp = None
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = False
+        self._thread = None
+        self._connect_failures = 0
+        self._stats = {'sent': 0, 'retried': 0, 'failed': 0, 'deferred': 0, 'connections': 0, 'batches': 0}
+
+    # --- połączenie SMTP ---
+
+    def _connect(self):
+        """Otwiera połączenie i loguje się; każdy błąd zgłasza jako ConnectionFailed."""
+        config = self.app.config
+        host, port = config.get('MAIL_SERVER', 'localhost'), config.get('MAIL_PORT', 25)
+        smtp = None
+        try:
+            if config.get('MAIL_USE_SSL'):
+                smtp = smtplib.SMTP_SSL(host, port, timeout=self.timeout)
+            else:
+                smtp = smtplib.SMTP(host, port, timeout=self.timeout)
+                if config.get('MAIL_USE_TLS'):
+                    smtp.starttls()
+            if config.get('MAIL_USERNAME'):
+                smtp.login(config['MAIL_USERNAME'], config.get('MAIL_PASSWORD') or '')
+        except (smtplib.SMTPException, OSError) as e:
+            if smtp is not None:
+                smtp.close()
+            raise ConnectionFailed(f"{type(e).__name__}: {e}") from e
+        self._stats['connections'] += 1
+        return smtp
+
+    def _disconnect(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                self._smtp.close()
+            self._smtp = None
+
+    def _deliver(self, message):
+        """Wysyła jedną wiadomość; zerwane połączenie z puli jest raz odnawiane."""
+        email = EmailMessage()
+        email['Subject'] = message.subject
+        email['From'] = self.app.config.get('MAIL_DEFAULT_SENDER') or self.app.config.get('MAIL_USERNAME')
+        email['To'] = message.recipient
+        email.set_content(message.body)
+
+        reused = self._smtp is not None
+        if not reused:
+            self._smtp = self._connect()
+        try:
+            self._smtp.send_message(email)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._smtp = None
+            if not reused:
+                raise
+            self._smtp = self._connect()
+            self._smtp.send_message(email)
+
+    # --- kolejka ---
+
+    def _claim(self):
+        """Rezerwuje partię zaległych wiadomości (status 'sending' + dzierżawa)."""
+        now = _utcnow()
+        candidates = db.session.query(OutboxMessage.id) \
+            .filter(OutboxMessage.status.in_(('pending', 'sending')),
+                    OutboxMessage.next_attempt_at <= now) \
+            .order_by(OutboxMessage.next_attempt_at, OutboxMessage.id) \
+            .limit(self.batch_size).all()
+        claimed = []
+        for (message_id,) in candidates:
+            updated = db.session.query(OutboxMessage) \
+                .filter(OutboxMessage.id == message_id,
+                        OutboxMessage.status.in_(('pending', 'sending')),
+                        OutboxMessage.next_attempt_at <= now) \
+                .update({'status': 'sending', 'digest_key': None,
+                         'next_attempt_at': now + timedelta(seconds=self.lease_seconds)},
+                        synchronize_session=False)
+            if updated:
+                claimed.append(message_id)
+        db.session.commit()
+        if not claimed:
+            return []
+        return db.session.query(OutboxMessage).filter(OutboxMessage.id.in_(claimed)) \
+            .order_by(OutboxMessage.id).all()
+
+    def backoff(self, attempts):
+        """Opóźnienie przed kolejną próbą po attempts nieudanych."""
+        return min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def _failed(self, message, error):
+        message.attempts += 1
+        message.last_error = f"{type(error).__name__}: {error}"[:1000]
+        if _is_permanent(error) or message.attempts >= self.max_attempts:
+            message.status = 'failed'
+            self._stats['failed'] += 1
+            self.app.logger.warning("outbox: e-mail %s do %s nie został wysłany: %s",
+                                    message.id, message.recipient, message.last_error)
+        else:
+            message.status = 'pending'
+            message.next_attempt_at = _utcnow() + timedelta(seconds=self.backoff(message.attempts))
+            self._stats['retried'] += 1
+
+    def _defer(self, messages, error):
+        """Odkłada wiadomości po błędzie połączenia, nie zwiększając ich licznika prób."""
+        self._connect_failures += 1
+        next_attempt_at = _utcnow() + timedelta(seconds=self.backoff(self._connect_failures))
+        for message in messages:
+            message.status = 'pending'
+            message.next_attempt_at = next_attempt_at
+            message.last_error = f"{type(error).__name__}: {error}"[:1000]
+        self._stats['deferred'] += len(messages)
+        self.app.logger.warning("outbox: brak połączenia z serwerem SMTP, %d wiadomości odłożonych: %s",
+                                len(messages), error)
+
+    def _send_batch(self, batch):
+        """Wysyła partię; błąd połączenia odkłada resztę partii bez kolejnych prób łączenia."""
+        try:
+            if self._smtp is None:
+                self._smtp = self._connect()
+        except ConnectionFailed as e:
+            self._defer(batch, e)
+            db.session.commit()
+            self._stats['batches'] += 1
+            return
+        self._connect_failures = 0
+        for index, message in enumerate(batch):
+            try:
+                self._deliver(message)
+            except ConnectionFailed as e:
+                # ponowne połączenie po zerwaniu nie powiodło się
+                self._defer(batch[index:], e)
+                break
+            except smtplib.SMTPResponseException as e:
+                self._failed(message, e)
+            except (smtplib.SMTPException, OSError) as e:
+                self._failed(message, e)
+                if not isinstance(e, smtplib.SMTPRecipientsRefused):
+                    # zerwane połączenie - liczy się tylko próba tej wiadomości, niewysłane czekają
+                    self._disconnect()
+                    if batch[index + 1:]:
+                        self._defer(batch[index + 1:], e)
+                    break
+            else:
+                message.status = 'sent'
+                message.sent_at = _utcnow()
+                message.last_error = None
+                self._stats['sent'] += 1
+        db.session.commit()
+        self._stats['batches'] += 1
+
+    def drain(self):
+        """Wysyła wszystkie zaległe wiadomości (w kontekście aplikacji); zwraca liczbę obsłużonych."""
+        handled = 0
+        with self._lock:
+            while True:
+                batch = self._claim()
+                if not batch:
+                    return handled
+                self._send_batch(batch)
+                handled += len(batch)
+
+    # --- wątek w tle ---
+
+    def wake(self):
+        """Budzi wątek wysyłki (wołane po commicie, który dodał wiadomości)."""
+        self._wakeup.set()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='mail-sender', daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def _run(self):
+        while not self._stopping:
+            woken = self._wakeup.wait(self.poll_interval if self._smtp is None else self.idle_timeout)
+            self._wakeup.clear()
+            try:
+                with self.app.app_context():
+                    handled = self.drain()
+                    db.session.remove()
+            except Exception:
+                self.app.logger.exception("outbox: wysyłka nie powiodła się")
+                handled = 0
+            if not handled and not woken:
+                # Bez pracy przez cały okres oczekiwania - zwalniamy połączenie SMTP
+                self.close()
+
+    def stop(self):
+        self._stopping = True
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.close()
+
+    def close(self):
+        """Zamyka utrzymywane połączenie SMTP."""
+        with self._lock:
+            self._disconnect()
+
+    def stats(self):
+        """Liczniki wysyłki oraz liczba wiadomości w outboxie według statusu."""
+        counts = dict(db.session.query(OutboxMessage.status, func.count()).group_by(OutboxMessage.status).all())
+        overdue = db.session.query(func.count()).select_from(OutboxMessage) \
+            .filter(OutboxMessage.status.in_(('pending', 'sending')),
+                    OutboxMessage.next_attempt_at <= _utcnow()).scalar()
+        return {**self._stats, 'queued': counts, 'due': overdue}
+
+
+def get_mail_sender():
+    return current_app.extensions["mail_sender"]
@@ -0,0 +1,149 @@
+import threading
+import time
+import bcrypt as _bcrypt
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+# Koszt nowych skrótów, gdy BCRYPT_LOG_ROUNDS nie jest ustawione
+DEFAULT_ROUNDS = 12
+
+
+class HashingBusy(Exception):
+    """Kolejka haszowania pełna dłużej niż submit_timeout."""
+
+
+def hash_password(password, rounds):
+    return _bcrypt.hashpw(password.encode('utf-8'), _bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def check_password(pw_hash, password):
+    if isinstance(pw_hash, str):
+        pw_hash = pw_hash.encode('utf-8')
+    try:
+        return _bcrypt.checkpw(password.encode('utf-8'), pw_hash)
+    except ValueError:
+        # uszkodzony albo nie-bcryptowy skrót w bazie
+        return False
+
+
+def rounds_of(pw_hash):
+    """Koszt zapisany w skrócie bcrypt ('$2b$12$...' -> 12) albo None."""
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode('utf-8', 'replace')
+    parts = pw_hash.split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def calibrate_rounds(target_ms=250, min_rounds=MIN_ROUNDS, max_rounds=MAX_ROUNDS):
+    """Największy koszt bcrypt, którego haszowanie na tej maszynie mieści się w target_ms.
+
+    Mierzy jeden skrót przy min_rounds; każdy kolejny poziom kosztu
+    podwaja czas, więc dalsze poziomy są wyliczane, a nie mierzone.
+    Nigdy nie schodzi poniżej min_rounds. Wynik jest podpowiedzią dla
+    BCRYPT_LOG_ROUNDS (komenda calibrate-passwords) - aplikacja nie
+    kalibruje się sama, bo każdy proces i serwer wyznaczyłby inny koszt.
+    """
+    started = time.perf_counter()
+    hash_password('kalibracja', min_rounds)
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    rounds = min_rounds
+    while rounds < max_rounds and elapsed_ms * 2 <= target_ms:
+        rounds += 1
+        elapsed_ms *= 2
+    return rounds
+
+
+class PasswordHasher:
+    """Haszowanie i sprawdzanie haseł bcrypt w osobnej puli procesów.
+
+    Wątek żądania tylko czeka na wynik, więc fala logowań nie zajmuje
+    procesów serwera obliczeniami. Liczba zleceń w kolejce jest ograniczona
+    do max_pending: przy pełnej kolejce zgłaszający czeka do submit_timeout
+    sekund, a potem dostaje HashingBusy (odpowiedź 503 zamiast rosnącej
+    kolejki). Nowe skróty mają stały koszt rounds, wspólny dla wszystkich
+    procesów. workers=0 oznacza haszowanie w bieżącym wątku.
+    """
+
+    def __init__(self, workers=2, max_pending=64, submit_timeout=5.0, rounds=DEFAULT_ROUNDS):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.submit_timeout = submit_timeout
+        self.rounds = rounds
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self.pending = 0
+        self.max_depth = 0
+        self.completed = 0
+        self.rejected = 0
+        self.rehashed = 0
+        self.total_ms = 0.0
+
+    def _pool(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.submit_timeout):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+        with self._lock:
+            self.pending += 1
+            self.max_depth = max(self.max_depth, self.pending)
+        started = time.perf_counter()
+        try:
+            if self.workers <= 0:
+                return fn(*args)
+            return self._pool().submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.pending -= 1
+                self.completed += 1
+                self.total_ms += (time.perf_counter() - started) * 1000
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        return self._run(check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """Czy skrót ma niższy koszt niż bieżący - skrótów z wyższym kosztem nie osłabiamy."""
+        return (rounds_of(pw_hash) or 0) < self.rounds
+
+    def rehash(self, user, password):
+        """Zapisuje skrót hasła z bieżącym kosztem (po udanym logowaniu, gdy koszt był niższy)."""
+        user.password = self.hash(password)
+        with self._lock:
+            self.rehashed += 1
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rounds': self.rounds,
+                'queue_depth': self.pending,
+                'max_depth': self.max_depth,
+                'max_pending': self.max_pending,
+                'completed': self.completed,
+                'rejected': self.rejected,
+                'rehashed': self.rehashed,
+                'avg_ms': round(self.total_ms / self.completed, 1) if self.completed else 0.0
+            }
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
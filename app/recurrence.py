@@ -0,0 +1,62 @@
+from datetime import timedelta
+
+WEEK = timedelta(days=7)
+
+
+def first_weekday_on_or_after(d, day_of_week):
+    """Pierwsza data >= d przypadająca na dany dzień tygodnia (0 = poniedziałek)."""
+    return d + timedelta(days=(day_of_week - d.weekday()) % 7)
+
+
+def clamp_range(series, start, end):
+    """Zawęża zakres [start, end] do okresu trwania serii (NULL = brak ograniczenia)."""
+    lo = start if series.start_date is None else max(start, series.start_date)
+    hi = end if series.end_date is None else min(end, series.end_date)
+    return lo, hi
+
+
+def is_occurrence(series, d):
+    """Czy w dniu d przypada wystąpienie serii."""
+    lo, hi = clamp_range(series, d, d)
+    return lo <= hi and d.weekday() == series.day_of_week
+
+
+def occurrence_dates(series, start, end):
+    """Daty wszystkich wystąpień serii w zakresie [start, end] (włącznie).
+
+    Zamiast sprawdzać każdy dzień, skacze od razu do pierwszego pasującego
+    dnia tygodnia i dalej przesuwa się o pełne tygodnie.
+    """
+    lo, hi = clamp_range(series, start, end)
+    d = first_weekday_on_or_after(lo, series.day_of_week)
+    while d <= hi:
+        yield d
+        d += WEEK
+
+
+def expand_series(series_list, start, end):
+    """Rozwija wszystkie serie w jednym przebiegu, zwraca pary (seria, data)."""
+    for s in series_list:
+        for d in occurrence_dates(s, start, end):
+            yield s, d
+
+
+def occurrences(series, start, end, exceptions=None):
+    """Wystąpienia serii w [start, end] z naniesionymi wyjątkami.
+
+    exceptions to słownik {data pierwotna: LessonException} tej serii.
+    Zwraca krotki (data pierwotna, data, godzina początku, godzina końca);
+    odwołane wystąpienia są pomijane, przeniesione - zwracane w nowym terminie.
+    Koszt jest liniowy względem liczby wystąpień i wyjątków.
+    """
+    exceptions = exceptions or {}
+    for d in occurrence_dates(series, start, end):
+        if d not in exceptions:
+            yield d, d, series.start_time, series.end_time
+    for e in exceptions.values():
+        target = e.moved_date or e.date
+        if e.cancelled or not start <= target <= end:
+            continue
+        yield (e.date, target,
+               e.moved_start_time or series.start_time,
+               e.moved_end_time or series.end_time)
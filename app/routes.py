@@ -1,33 +1,51 @@
-from flask import render_template, redirect, url_for, session, flash, send_from_directory, request, jsonify, Blueprint, current_app
+from flask import render_template, redirect, url_for, session, flash, send_file, request, jsonify, Blueprint, current_app, abort
 from flask_login import login_user, logout_user, login_required, current_user
-from flask_mail import Message as MailMessage
-from app import db, bcrypt, login_manager, mail
-from app.forms import LoginForm, RegisterForm, AssignTaskForm, TaskSubmissionForm, GradeTaskForm, WriteMessageForm
-from app.models import Student, Teacher, Task, Administrator, Message, LessonSeries
+from app import db, login_manager
+from app.forms import LoginForm, RegisterForm, AssignTaskForm, TaskSubmissionForm, GradeTaskForm, WriteMessageForm, NotificationPreferenceForm
+from app.models import Student, Teacher, Task, Administrator, LessonSeries, student_teacher
 from sqlalchemy import and_, not_
-from werkzeug.utils import secure_filename
+from sqlalchemy.orm import joinedload
 from datetime import datetime
-from app.utils import compress_file
+from app.attachments import save_attachments, is_image, attachment_for, send_blob
+from app.image_pipeline import get_image_optimizer
+from app.thumbnails import get_thumbnail_cache, THUMB_SIZES
+from PIL import Image, UnidentifiedImageError
+from app.submission_zip import submission_entries, zip_stream
+from app.storage import get_storage
+from app.outbox import notify, get_mail_sender
+from app.accounts import find_user, cached_account_user
+from app.email_filter import get_email_lookup
+from app.passwords import get_password_hasher, HashingBusy
+from app.identity_cache import get_identity_cache
+from app.chat import chat_role, conversation_page, message_to_dict, post_message
 from datetime import date, timezone, timedelta
 from app.utils import get_or_404
-import os
-import json
+from app.lesson_calendar import teacher_events, student_events, parse_occurrence_id, occurrence_exception
+from app.lesson_calendar import teacher_series, student_series, teacher_event_title, student_event_title
+from app.ical import ics_response
+from app.calendar_cache import calendar_response, get_calendar_cache
+from app.scheduling import ScheduleIndex, lessons_changed, time_of_minute, DAY_START, DAY_END
+from app.auto_scheduler import parse_requests, schedule_batch, placement_to_dict
+from app.recurrence import is_occurrence
+import math
 
 # Tworzymy blueprint
 bp = Blueprint('main', __name__)
 
 
+@bp.app_errorhandler(413)
+def upload_too_large(e):
+    return "Przesłane pliki są za duże", 413
+
+
+@bp.app_errorhandler(HashingBusy)
+def hashing_busy(e):
+    return "Serwer jest chwilowo przeciążony, spróbuj ponownie za chwilę.", 503, {'Retry-After': '1'}
+
+
 @login_manager.user_loader
 def load_user(user_id):
-    role = session.get('role')
-    match role:
-        case 'student':
-            return Student.query.get(int(user_id))
-        case 'teacher':
-            return Teacher.query.get(int(user_id))
-        case 'administrator':
-            return Administrator.query.get(int(user_id))
-    return None
+    return cached_account_user(session.get('role'), user_id)
 
 @bp.route('/')
 def home():
@@ -35,37 +53,29 @@ def home():
 
 @bp.route("/check_email", methods=["GET"])
 def check_email():
-    email = request.args.get("email")
-    
-    exists = False
-    if Student.query.filter_by(email=email).first():
-        exists = True
-    elif Teacher.query.filter_by(email=email).first():
-        exists = True
-    elif Administrator.query.filter_by(email=email).first():
-        exists = True
-
-    return jsonify({"exists": exists})
+    lookup = get_email_lookup()
+    wait = lookup.limiter.take(request.remote_addr)
+    if wait:
+        resp = jsonify({"error": "Zbyt wiele zapytań, spróbuj za chwilę."})
+        resp.headers['Retry-After'] = str(math.ceil(wait))
+        return resp, 429
+    return jsonify({"exists": lookup.exists(request.args.get("email"))})
 
 @bp.route('/login', methods=['GET', 'POST'])
 def login():
     form = LoginForm()
     if form.validate_on_submit():
-        user = Student.query.filter_by(email=form.email.data).first()
-        role = 'student'
+        user, role = find_user(form.email.data)
+        hasher = get_password_hasher()
 
-        if not user:
-            user = Teacher.query.filter_by(email=form.email.data).first()
-            role = 'teacher'
-
-        if not user:
-            user = Administrator.query.filter_by(email=form.email.data).first()
-            role = 'administrator'
-
-        if user and bcrypt.check_password_hash(user.password, form.password.data):
+        if user and hasher.check(user.password, form.password.data):
             if hasattr(user, 'approved') and not user.approved:
                 flash('Twoje konto oczekuje na zatwierdzenie przez administratora.', 'warning')
                 return redirect(url_for('main.login'))
+            if hasher.needs_rehash(user.password):
+                hasher.rehash(user, form.password.data)
+                db.session.commit()
+                get_identity_cache().invalidate(role, user.id)
             login_user(user)
             session['role'] = role
             return redirect(url_for('main.dashboard'))
@@ -75,7 +85,7 @@ def login():
 def register():
     form = RegisterForm()
     if form.validate_on_submit():
-        hashed_pw = bcrypt.generate_password_hash(form.password.data).decode('utf-8')
+        hashed_pw = get_password_hasher().hash(form.password.data)
 
         if form.role.data == 'student':
             user = Student(
@@ -104,34 +114,59 @@ def register():
 @login_required
 def dashboard():
     if isinstance(current_user, Teacher):
-        students = current_user.students
-
-        for student in students:
-            student_tasks = [t for t in student.tasks if t.teacher_id == current_user.id]
-            for t in student_tasks:
-                t.attachment_list  = json.loads(t.teacher_attachments  or '[]')
-                t.submission_list  = json.loads(t.student_attachments or '[]')
+        # Dwa zapytania niezależnie od liczby uczniów i zadań:
+        # uczniowie nauczyciela oraz wyłącznie jego zadania dla nich
+        students = Student.query \
+            .join(student_teacher, student_teacher.c.student_id == Student.id) \
+            .filter(student_teacher.c.teacher_id == current_user.id) \
+            .order_by(Student.id) \
+            .all()
+        tasks = Task.query \
+            .options(joinedload(Task.attachments)) \
+            .filter(Task.teacher_id == current_user.id,
+                    Task.student_id.in_([s.id for s in students])) \
+            .order_by(Task.id) \
+            .all() if students else []
+
+        tasks_by_student = {}
+        for t in tasks:
+            tasks_by_student.setdefault(t.student_id, []).append(t)
 
         return render_template('teacher_dashboard.html',
                                teacher=current_user,
-                               students=students)
+                               students=students,
+                               tasks_by_student=tasks_by_student,
+                               task_titles=sorted({t.title for t in tasks}),
+                               notification_form=NotificationPreferenceForm(mode=current_user.notification_mode))
 
     elif isinstance(current_user, Student):
-        tasks = Task.query.filter_by(student_id=current_user.id).all()
+        tasks = Task.query \
+            .options(joinedload(Task.teacher), joinedload(Task.attachments)) \
+            .filter_by(student_id=current_user.id) \
+            .all()
         teachers = current_user.teachers
-        for t in tasks:
-            t.attachment_list = json.loads(t.teacher_attachments  or '[]')
-            t.submission_list = json.loads(t.student_attachments or '[]')
         return render_template('student_dashboard.html',
                                student=current_user,
                                tasks=tasks,
-                               teachers=teachers)
+                               teachers=teachers,
+                               notification_form=NotificationPreferenceForm(mode=current_user.notification_mode))
 
     elif isinstance(current_user, Administrator):
         return redirect(url_for('main.admin_dashboard'))
 
     return "Nieznany typ użytkownika", 400
 
+@bp.post('/notifications/preference')
+@login_required
+def notification_preference():
+    form = NotificationPreferenceForm()
+    if form.validate_on_submit():
+        current_user.notification_mode = form.mode.data
+        db.session.commit()
+        get_identity_cache().invalidate(session.get('role'), current_user.id)
+        flash("Zapisano ustawienia powiadomień.", "success")
+    return redirect(url_for('main.dashboard'))
+
 @bp.route('/assign-task/<int:student_id>', methods=['GET', 'POST'])
 @login_required
 def assign_task(student_id):
@@ -142,14 +177,6 @@ def assign_task(student_id):
     form = AssignTaskForm()
 
     if form.validate_on_submit():
-        filenames = []
-        for file_storage in form.attachments.data:
-            if file_storage:
-                filename = secure_filename(file_storage.filename)
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                file_storage.save(filepath)
-                compress_file(filepath)
-                filenames.append(filename)
         task = Task(
             title=form.title.data,
             description=form.description.data,
@@ -157,13 +184,16 @@ def assign_task(student_id):
             max_points=form.max_points.data,
             student_id=student.id,
             teacher_id=current_user.id,
-            issued_at=datetime.now(timezone.utc),
-            teacher_attachments=json.dumps(filenames)
+            issued_at=datetime.now(timezone.utc)
         )
         db.session.add(task)
+        processing = save_attachments(task, 'teacher', form.attachments.data)
+        notify(student, 'assign_task', task.title)
         db.session.commit()
-        
-        return redirect(url_for('main.send_email', email=student.email, purpose='assign_task'))
+        get_image_optimizer().enqueue(processing)
+        get_mail_sender().wake()
+
+        return redirect(url_for('main.dashboard'))
     
     today_iso = date.today().isoformat()
     return render_template('assign_task.html', form=form, student=student, min_date=today_iso)
@@ -177,22 +207,20 @@ def submit_task(task_id):
     form = TaskSubmissionForm()
 
     if form.validate_on_submit():
-        filenames = []
-        for file_storage in form.attachments.data:
-            if file_storage:
-                fname = secure_filename(file_storage.filename)
-                filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], fname)
-                file_storage.save(filepath)
-                compress_file(filepath)
-                filenames.append(fname)
-        
+        # Ponowne oddanie zastępuje poprzednie załączniki ucznia
+        for attachment in task.student_files:
+            task.attachments.remove(attachment)
+        processing = save_attachments(task, 'student', form.attachments.data)
+
         task.student_answer = form.answer.data
-        task.student_attachments = json.dumps(filenames)
         task.earned_points = None
         task.submitted = True
+        notify(task.teacher, 'submit_task', f"{task.title} ({current_user.name} {current_user.surname})")
         db.session.commit()
+        get_image_optimizer().enqueue(processing)
+        get_mail_sender().wake()
 
-        return redirect(url_for('main.send_email', email=task.teacher.email, purpose='submit_task'))
+        return redirect(url_for('main.dashboard'))
         
     return render_template('submit_task.html', form=form, task=task)
 
@@ -214,40 +242,57 @@ def grade_task(task_id):
             flash(f"Nie możesz przyznać więcej niż {task.max_points} punktów.", "warning")
         else:
             task.earned_points = form.earned_points.data
+            notify(task.student, 'grade_task', task.title)
             db.session.commit()
-            
-            return redirect(url_for('main.send_email', email=task.student.email, purpose='grade_task'))
+            get_mail_sender().wake()
 
-    return render_template('grade_task.html', form=form, task=task)
+            return redirect(url_for('main.dashboard'))
 
-@bp.route('/send-email/<string:email>/<string:purpose>', methods=['GET', 'POST'])
-def send_email(email, purpose):    
-    match purpose:
-        case 'assign_task':
-            subject = "Nowe zadanie do wykonania"
-            body = "Zostało Ci przydzielone nowe zadanie. Proszę sprawdzić swoje zadania na stronie."
-        case 'submit_task':
-            subject = "Zadanie zostało oddane"
-            body = "Zadanie zostało oddane. Proszę ocenić zadanie."
-        case 'grade_task':
-            subject = "Zadanie zostało ocenione"
-            body = "Twoje zadanie zostało ocenione. Proszę sprawdzić swoje zadania na stronie."
-    
-    msg = MailMessage(subject, sender = os.getenv('EMAIL'), recipients = [email])
-    msg.body = body
-    
-    try:
-        mail.send(msg)
-    except Exception as e:
-        flash(f"Wystąpił błąd podczas wysyłania emaila: {str(e)}", "danger")
-    
-    return redirect(url_for('main.dashboard'))
+    return render_template('grade_task.html', form=form, task=task)
 
 @bp.route('/uploads/<filename>')
 @login_required
 def download_file(filename):
-    uploads_dir = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..', 'uploads')
-    return send_from_directory(uploads_dir, filename, as_attachment=True)
+    return send_blob(attachment_for(filename, current_user))
+
+@bp.get('/teacher/submissions.zip')
+@login_required
+def download_submissions():
+    if not isinstance(current_user, Teacher):
+        return "Brak dostępu", 403
+
+    try:
+        due = date.fromisoformat(request.args['due']) if request.args.get('due') else None
+    except ValueError:
+        return "Niepoprawna data", 400
+    entries = submission_entries(current_user.id, request.args.get('title'), due)
+    if not entries:
+        return "Brak przesłanych plików dla wybranych zadań", 404
+
+    # archiwum generowane w trakcie wysyłania - długość nie jest znana z góry
+    resp = current_app.response_class(zip_stream(entries, get_storage().for_worker()), mimetype='application/zip')
+    resp.headers.set('Content-Disposition', 'attachment', filename='prace_uczniow.zip')
+    return resp
+
+@bp.route('/uploads/<filename>/thumb/<int:size>')
+@login_required
+def download_thumbnail(filename, size):
+    if size not in THUMB_SIZES:
+        abort(404)
+    attachment = attachment_for(filename, current_user)
+    if not is_image(attachment.original_name):
+        abort(404)
+    try:
+        path = get_thumbnail_cache().get(attachment.sha256, size)
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return "Nieobsługiwany obraz", 415
+    except OSError:
+        abort(404)  # brak bloba albo uszkodzony plik
+    # treść bloba o danym skrócie się nie zmienia - miniaturę można trzymać długo
+    resp = send_file(path, mimetype='image/webp', max_age=365 * 24 * 3600)
+    resp.cache_control.private = True
+    resp.cache_control.immutable = True
+    return resp
 
 @bp.route('/admin/dashboard', methods=['GET','POST'])
 @login_required
@@ -275,6 +320,7 @@ def admin_dashboard():
             student = get_or_404(Student, sid)
             student.approved = True
             db.session.commit()
+            get_identity_cache().invalidate('student', student.id)
             flash(f"Studenta {student.name} zatwierdzono.", "success")
 
         elif action == 'approve_teacher':
@@ -282,6 +328,7 @@ def admin_dashboard():
             teacher = get_or_404(Teacher, tid)
             teacher.approved = True
             db.session.commit()
+            get_identity_cache().invalidate('teacher', teacher.id)
             flash(f"Nauczyciela {teacher.name} zatwierdzono.", "success")
 
         elif action == 'assign_student':
@@ -290,6 +337,7 @@ def admin_dashboard():
             s = get_or_404(Student, sid)
             s.teachers = Teacher.query.filter(Teacher.id.in_(tid_list)).all()
             db.session.commit()
+            get_identity_cache().invalidate('student', s.id)
             flash(f"Studenta {s.name} przypisano do wybranych nauczycieli.", "success")
 
         elif action == 'delete_student':
@@ -297,6 +345,7 @@ def admin_dashboard():
             student = get_or_404(Student, sid)
             db.session.delete(student)
             db.session.commit()
+            get_identity_cache().invalidate('student', sid)
             flash(f"Studenta {student.name} usunięto z systemu.", "warning")
 
         elif action == 'delete_teacher':
@@ -306,6 +355,7 @@ def admin_dashboard():
                 s.teacher_id = None
             db.session.delete(teacher)
             db.session.commit()
+            get_identity_cache().invalidate('teacher', tid)
             flash(f"Nauczyciela {teacher.name} usunięto z systemu.", "warning")
 
         elif action == 'unassign_student':
@@ -317,6 +367,7 @@ def admin_dashboard():
             if teacher in student.teachers:
                 student.teachers.remove(teacher)
                 db.session.commit()
+                get_identity_cache().invalidate('student', sid)
                 flash(f"Ucznia {student.name} odłączono od nauczyciela {teacher.name}.", "warning")
             else:
                 flash("Ten uczeń nie był przypisany do tego nauczyciela.", "info")
@@ -327,6 +378,7 @@ def admin_dashboard():
             student = get_or_404(Student, sid)
             student.teachers = Teacher.query.filter(Teacher.id.in_(tid_list)).all()
             db.session.commit()
+            get_identity_cache().invalidate('student', sid)
             flash(f"Przypisania nauczycieli zaktualizowano dla {student.name}.", "success")
 
         return redirect(url_for('main.admin_dashboard'))
@@ -338,6 +390,22 @@ def admin_dashboard():
                            assigned_students=assigned_students,
                            approved_teachers=approved_teachers)
 
+@bp.get('/admin/stats')
+@login_required
+def admin_stats():
+    if not isinstance(current_user, Administrator):
+        return "Brak dostępu", 403
+
+    return jsonify({
+        'calendar_cache': get_calendar_cache().stats(),
+        'email_lookup': get_email_lookup().stats(),
+        'identity_cache': get_identity_cache().stats(),
+        'image_optimizer': get_image_optimizer().stats(),
+        'password_hasher': get_password_hasher().stats(),
+        'outbox': get_mail_sender().stats(),
+        'thumbnails': get_thumbnail_cache().stats()
+    })
+
 @bp.route('/admin/approve/<string:user_type>/<int:user_id>')
 @login_required
 def approve_user(user_type, user_id):
@@ -348,96 +416,65 @@ def approve_user(user_type, user_id):
     user = model.query.get_or_404(user_id)
     user.approved = True
     db.session.commit()
+    get_identity_cache().invalidate('student' if model is Student else 'teacher', user.id)
     flash("Użytkownik zatwierdzony!", "success")
     return redirect(url_for('main.admin_dashboard'))
 
 @bp.route('/chat/<int:student_id>/<int:teacher_id>/<string:role>', methods=['GET', 'POST'])
 @login_required
 def chat(student_id, teacher_id, role):
-    print('Chat route accessed')
-    sender_role = 'teacher'
-    receiver_role = 'student'
-    if role == 'student':
-        sender_role = 'student'
-        receiver_role = 'teacher'
-    messages = Message.query.filter(
-        db.or_(
-            db.and_(
-                Message.sender_id == student_id,
-                Message.sender_role == 'student',
-                Message.receiver_id == teacher_id,
-                Message.receiver_role == 'teacher'
-            ),
-            db.and_(
-                Message.sender_id == teacher_id,
-                Message.sender_role == 'teacher',
-                Message.receiver_id == student_id,
-                Message.receiver_role == 'student'
-            )
-        )
-    ).order_by(Message.timestamp.asc()).all()
+    if chat_role(current_user, student_id, teacher_id) != role:
+        return "Brak dostępu", 403
     form = WriteMessageForm()
     if form.validate_on_submit():
-        message = Message(
-            sender_id=student_id if role == 'student' else teacher_id,
-            receiver_id=teacher_id if role == 'student' else student_id,
-            sender_role=sender_role,
-            receiver_role=receiver_role,
-            content=form.message.data
-        )
-        db.session.add(message)
-        db.session.commit()
+        # Formularz bez JavaScriptu; klient Socket.IO wysyła przez zdarzenie 'send'
+        post_message(student_id, teacher_id, role, form.message.data)
         return redirect(url_for('main.chat', student_id=student_id, teacher_id=teacher_id, role=role))
-    return render_template('chat.html', form=form, messages=messages)
+    messages, before = conversation_page(student_id, teacher_id, limit=current_app.config.get("CHAT_PAGE_SIZE", 50))
+    return render_template('chat.html', form=form, messages=messages, before=before,
+                           student_id=student_id, teacher_id=teacher_id, role=role)
+
+@bp.get('/chat/<int:student_id>/<int:teacher_id>/messages')
+@login_required
+def chat_messages(student_id, teacher_id):
+    """Starsza strona historii czatu: ?before=<id wiadomości>&limit=N."""
+    if chat_role(current_user, student_id, teacher_id) is None:
+        return "Brak dostępu", 403
+    before = request.args.get("before", type=int)
+    page_size = current_app.config.get("CHAT_PAGE_SIZE", 50)
+    limit = min(max(request.args.get("limit", page_size, type=int), 1), 100)
+    messages, cursor = conversation_page(student_id, teacher_id, before=before, limit=limit)
+    return jsonify({"messages": [message_to_dict(m) for m in messages], "before": cursor})
 
 @bp.get("/teacher/<int:teacher_id>/lessons")
 def teacher_lessons(teacher_id):
     start = datetime.fromisoformat(request.args["start"]).date()
     end = datetime.fromisoformat(request.args["end"]).date()
 
-    series_list = LessonSeries.query.filter_by(teacher_id=teacher_id).all()
-    events = []
-
-    for s in series_list:
-        d = max(start, s.start_date)
-        while d <= min(end, s.end_date):
-            if d.weekday() == s.day_of_week:
-                start_dt = datetime.combine(d, s.start_time)
-                end_dt = datetime.combine(d, s.end_time)
-                events.append({
-                    "id": f"series-{s.id}-{d}",
-                    "title": f"{s.student.name} {s.student.surname}",
-                    "start": start_dt.isoformat(),
-                    "end": end_dt.isoformat()
-                })
-            d += timedelta(days=1)
-
-    return jsonify(events)
+    return calendar_response(
+        ('teacher', teacher_id), start, end,
+        lambda: teacher_events(teacher_id, start, end)
+    )
 
 @bp.get("/student/<int:student_id>/lessons")
 def student_lessons(student_id):
     start = datetime.fromisoformat(request.args["start"]).date()
     end = datetime.fromisoformat(request.args["end"]).date()
 
-    series_list = LessonSeries.query.filter_by(student_id=student_id).all()
-    events = []
-
-    for s in series_list:
-        d = max(start, s.start_date)
-        while d <= min(end, s.end_date):
-            if d.weekday() == s.day_of_week:
-                start_dt = datetime.combine(d, s.start_time)
-                end_dt = datetime.combine(d, s.end_time)
-                teacher = Teacher.query.get_or_404(s.teacher_id)
-                events.append({
-                    "id": f"series-{s.id}-{d}",
-                    "title": f" {teacher.subject}",
-                    "start": start_dt.isoformat(),
-                    "end": end_dt.isoformat()
-                })
-            d += timedelta(days=1)
-
-    return jsonify(events)
+    return calendar_response(
+        ('student', student_id), start, end,
+        lambda: student_events(student_id, start, end)
+    )
+
+@bp.get("/teacher/<int:teacher_id>/lessons.ics")
+def teacher_lessons_ics(teacher_id):
+    return ics_response(('teacher', teacher_id), "Plan zajęć - nauczyciel",
+                        lambda: teacher_series(teacher_id), teacher_event_title)
+
+@bp.get("/student/<int:student_id>/lessons.ics")
+def student_lessons_ics(student_id):
+    return ics_response(('student', student_id), "Plan zajęć - uczeń",
+                        lambda: student_series(student_id), student_event_title)
 
 @bp.route('/lesson/assign/<int:student_id>/<int:teacher_id>', methods=['GET', 'POST'])
 def assign_lesson(student_id, teacher_id):
@@ -451,18 +488,16 @@ def assign_lesson(student_id, teacher_id):
         start_date = datetime.strptime(request.form['start_date'], "%Y-%m-%d").date()
         end_date = datetime.strptime(request.form['end_date'], "%Y-%m-%d").date()
 
-        conflicts = LessonSeries.query.filter(
-            LessonSeries.teacher_id == teacher.id,
-            LessonSeries.day_of_week == day_of_week,
-            LessonSeries.start_date <= end_date,   
-            LessonSeries.end_date >= start_date,   
-            LessonSeries.start_time < end_time,     
-            LessonSeries.end_time > start_time      
-        ).all()
+        conflicts = ScheduleIndex(teacher.id, student.id).conflicts(
+            day_of_week, start_time, end_time, start_date, end_date
+        )
 
-        if conflicts:
+        if conflicts['teacher']:
             flash("⚠️ Konflikt! Nauczyciel ma już zajęcia w tym czasie.", "danger")
             return render_template('assign_lesson.html', student=student, teacher=teacher)
+        if conflicts['student']:
+            flash("⚠️ Konflikt! Uczeń ma już zajęcia w tym czasie.", "danger")
+            return render_template('assign_lesson.html', student=student, teacher=teacher)
 
         series = LessonSeries(
             teacher_id=teacher.id,
@@ -475,24 +510,131 @@ def assign_lesson(student_id, teacher_id):
         )
         db.session.add(series)
         db.session.commit()
+        lessons_changed(teacher.id, student.id)
         flash("Seria zajęć została dodana!", "success")
         return redirect(url_for('main.dashboard'))
 
     return render_template('assign_lesson.html', student=student, teacher=teacher)
 
+@bp.get('/lesson/free-slots/<int:student_id>/<int:teacher_id>')
+def lesson_free_slots(student_id, teacher_id):
+    day = request.args.get('week')
+    try:
+        day = date.fromisoformat(day) if day else date.today()
+    except ValueError:
+        return jsonify({"error": "Nieprawidłowa data tygodnia (YYYY-MM-DD)"}), 400
+    week_start = day - timedelta(days=day.weekday())
+    duration = request.args.get('duration', 0, type=int)
+
+    slots = ScheduleIndex(teacher_id, student_id).free_slots(
+        week_start,
+        current_app.config.get('SCHEDULE_DAY_START', DAY_START),
+        current_app.config.get('SCHEDULE_DAY_END', DAY_END),
+        duration
+    )
+    return jsonify([{
+        "day_of_week": d.weekday(),
+        "date": d.isoformat(),
+        "start": time_of_minute(start).strftime("%H:%M"),
+        "end": time_of_minute(end).strftime("%H:%M")
+    } for d, start, end in slots])
+
+@bp.post('/lesson/auto-schedule')
+@login_required
+def auto_schedule_lessons():
+    if not isinstance(current_user, Administrator):
+        return "Brak dostępu", 403
+
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "Oczekiwano obiektu JSON"}), 400
+    try:
+        requests = parse_requests(data.get('requests', []))
+        start_date = datetime.strptime(data['start_date'], "%Y-%m-%d").date()
+        end_date = datetime.strptime(data['end_date'], "%Y-%m-%d").date()
+        placements, unplaced = schedule_batch(requests, start_date, end_date, commit=not data.get('dry_run'))
+    except (KeyError, TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "placed": [placement_to_dict(p) for p in placements],
+        "unplaced": unplaced
+    })
+
+def owns_series(user, series):
+    """Czy użytkownik jest nauczycielem albo uczniem serii zajęć."""
+    return ((isinstance(user, Teacher) and user.id == series.teacher_id)
+            or (isinstance(user, Student) and user.id == series.student_id))
+
 @bp.route('/lesson/delete/<lesson_id>', methods=['DELETE'])
+@login_required
 def delete_lesson(lesson_id):
+    """Odwołuje jedno wystąpienie ('series-<id>-<data>'); nauczyciel albo uczeń serii.
+
+    Cała seria jest usuwana dla identyfikatora 'series-<id>' lub z ?scope=series.
+    """
     try:
-        real_id = int(lesson_id.split("-")[1])
+        real_id, day = parse_occurrence_id(lesson_id)
     except Exception:
         return '', 400
-    
-    lesson = LessonSeries.query.get(real_id)
+
+    lesson = db.session.get(LessonSeries, real_id)
     if not lesson:
         return '', 404
+    if not owns_series(current_user, lesson):
+        return "Brak dostępu", 403
+
+    teacher_id, student_id = lesson.teacher_id, lesson.student_id
+    if day is None or request.args.get('scope') == 'series':
+        db.session.delete(lesson)
+    elif not is_occurrence(lesson, day):
+        return '', 400
+    else:
+        exception = occurrence_exception(lesson, day)
+        exception.cancelled = True
+        exception.moved_date = exception.moved_start_time = exception.moved_end_time = None
+    db.session.commit()
+    lessons_changed(teacher_id, student_id)
+    return '', 204
+
+@bp.route('/lesson/move/<lesson_id>', methods=['POST'])
+@login_required
+def move_lesson(lesson_id):
+    """Przenosi jedno wystąpienie serii na inny dzień i/lub godzinę (nauczyciel albo uczeń serii)."""
+    data = request.get_json(silent=True) or request.form
+    try:
+        real_id, day = parse_occurrence_id(lesson_id)
+        moved_date = datetime.strptime(data['date'], "%Y-%m-%d").date()
+        moved_start = datetime.strptime(data['start_time'], "%H:%M").time() if data.get('start_time') else None
+        moved_end = datetime.strptime(data['end_time'], "%H:%M").time() if data.get('end_time') else None
+    except Exception:
+        return '', 400
+    if day is None:
+        return '', 400
+
+    lesson = db.session.get(LessonSeries, real_id)
+    if not lesson:
+        return '', 404
+    if not owns_series(current_user, lesson):
+        return "Brak dostępu", 403
+    if not is_occurrence(lesson, day):
+        return '', 400
+    if (moved_start or lesson.start_time) >= (moved_end or lesson.end_time):
+        return '', 400
 
-    db.session.delete(lesson)
+    conflicts = ScheduleIndex(lesson.teacher_id, lesson.student_id).occurrence_conflicts(
+        moved_date, moved_start or lesson.start_time, moved_end or lesson.end_time, skip=(lesson.id, day)
+    )
+    if conflicts['teacher'] or conflicts['student']:
+        return jsonify({"error": "Termin koliduje z innymi zajęciami", "conflicts": conflicts}), 409
+
+    exception = occurrence_exception(lesson, day)
+    exception.cancelled = False
+    exception.moved_date = moved_date
+    exception.moved_start_time = moved_start
+    exception.moved_end_time = moved_end
     db.session.commit()
+    lessons_changed(lesson.teacher_id, lesson.student_id)
     return '', 204
 
 @bp.route('/logout')
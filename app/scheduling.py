@@ -0,0 +1,198 @@
+from bisect import bisect_left, bisect_right
+from datetime import time, timedelta
+from flask import current_app
+from app import db
+from app.models import LessonSeries, LessonException
+
+MINUTES_PER_DAY = 24 * 60
+
+# Domyślne godziny, w których można planować zajęcia (jak w formularzu)
+DAY_START = 7 * 60
+DAY_END = 22 * 60
+
+
+def minute_of_day(t):
+    return t.hour * 60 + t.minute
+
+
+def time_of_minute(minute):
+    return time(minute // 60, minute % 60)
+
+
+def dates_overlap(a_start, a_end, b_start, b_end):
+    """Czy okresy [a_start, a_end] i [b_start, b_end] się przecinają (None = bez ograniczenia)."""
+    if a_end is not None and b_start is not None and a_end < b_start:
+        return False
+    if b_end is not None and a_start is not None and b_end < a_start:
+        return False
+    return True
+
+
+class WeeklyIntervalIndex:
+    """Posortowane przedziały tygodniowe jednej osoby.
+
+    Przedział to (minuta tygodnia początku, minuta końca, seria). Ponieważ
+    długość żadnego przedziału nie przekracza max_length, kandydatów do
+    kolizji z [start, end) wyznacza wyszukiwanie binarne w zakresie
+    [start - max_length, end) - zapytanie kosztuje O(log n + k).
+    """
+
+    def __init__(self, series_list=()):
+        self._starts = []
+        self._items = []
+        self.max_length = 0
+        for s in series_list:
+            self.add(s)
+
+    def __len__(self):
+        return len(self._items)
+
+    @staticmethod
+    def _bounds(day_of_week, start_time, end_time):
+        base = day_of_week * MINUTES_PER_DAY
+        return base + minute_of_day(start_time), base + minute_of_day(end_time)
+
+    def add(self, series):
+        start, end = self._bounds(series.day_of_week, series.start_time, series.end_time)
+        item = (start, end, series.id, series.start_date, series.end_date)
+        pos = bisect_right(self._starts, start)
+        self._starts.insert(pos, start)
+        self._items.insert(pos, item)
+        self.max_length = max(self.max_length, end - start)
+
+    def overlapping(self, day_of_week, start_time, end_time, start_date=None, end_date=None):
+        """Id serii kolidujących z podanym cyklicznym terminem."""
+        start, end = self._bounds(day_of_week, start_time, end_time)
+        lo = bisect_left(self._starts, start - self.max_length)
+        hi = bisect_left(self._starts, end)
+        return [
+            series_id
+            for s_start, s_end, series_id, s_from, s_to in self._items[lo:hi]
+            if s_end > start and dates_overlap(s_from, s_to, start_date, end_date)
+        ]
+
+    def busy_on(self, d):
+        """Zajęte przedziały w konkretnym dniu d: (minuta początku, minuta końca, id serii)."""
+        base = d.weekday() * MINUTES_PER_DAY
+        lo = bisect_left(self._starts, base - self.max_length)
+        hi = bisect_left(self._starts, base + MINUTES_PER_DAY)
+        busy = []
+        for s_start, s_end, series_id, s_from, s_to in self._items[lo:hi]:
+            if s_end > base and dates_overlap(s_from, s_to, d, d):
+                busy.append((max(s_start - base, 0), min(s_end - base, MINUTES_PER_DAY), series_id))
+        return busy
+
+
+class ScheduleIndex:
+    """Indeksy przedziałów nauczyciela i ucznia zbudowane jednym zapytaniem z LessonSeries.
+
+    Indeks tworzony jest od nowa w każdym żądaniu, a nie trzymany w pamięci
+    procesu - seria zapisana przez inny proces serwera jest więc zawsze
+    brana pod uwagę przy sprawdzaniu kolizji. Uwzględnia wyjątki serii:
+    odwołane i przeniesione wystąpienia zwalniają swój dzień, a przeniesione
+    zajmują nowy termin.
+    """
+
+    def __init__(self, teacher_id, student_id):
+        self.teacher_id = teacher_id
+        self.student_id = student_id
+        series_list = LessonSeries.query.filter(db.or_(
+            LessonSeries.teacher_id == teacher_id,
+            LessonSeries.student_id == student_id
+        )).all()
+        self.teacher = WeeklyIntervalIndex(s for s in series_list if s.teacher_id == teacher_id)
+        self.student = WeeklyIntervalIndex(s for s in series_list if s.student_id == student_id)
+
+        series_by_id = {s.id: s for s in series_list}
+        exceptions = LessonException.query.filter(
+            LessonException.series_id.in_(series_by_id)
+        ).all() if series_by_id else []
+        # (id serii, pierwotna data) wystąpień odwołanych albo przeniesionych
+        self._removed = set()
+        # (data, minuta początku, minuta końca, seria, pierwotna data) przeniesionych wystąpień
+        self._moved = []
+        for e in exceptions:
+            if not e.cancelled and e.moved_date is None and e.moved_start_time is None and e.moved_end_time is None:
+                continue
+            self._removed.add((e.series_id, e.date))
+            if not e.cancelled:
+                series = series_by_id[e.series_id]
+                self._moved.append((
+                    e.moved_date or e.date,
+                    minute_of_day(e.moved_start_time or series.start_time),
+                    minute_of_day(e.moved_end_time or series.end_time),
+                    series,
+                    e.date
+                ))
+
+    def _owns(self, role, series):
+        if role == 'teacher':
+            return series.teacher_id == self.teacher_id
+        return series.student_id == self.student_id
+
+    def busy_on(self, role, d, skip=None):
+        """Zajęte przedziały nauczyciela albo ucznia w dniu d: (minuta początku, minuta końca, id serii).
+
+        skip=(id serii, pierwotna data) pomija jedno wystąpienie, np. właśnie przenoszone.
+        """
+        index = self.teacher if role == 'teacher' else self.student
+        busy = [b for b in index.busy_on(d) if (b[2], d) not in self._removed and (b[2], d) != skip]
+        busy += [
+            (start, end, series.id)
+            for moved_date, start, end, series, original in self._moved
+            if moved_date == d and self._owns(role, series) and (series.id, original) != skip
+        ]
+        return busy
+
+    def conflicts(self, day_of_week, start_time, end_time, start_date=None, end_date=None):
+        """Kolizje nowej serii z planem nauczyciela i ucznia: {'teacher': [...], 'student': [...]}.
+
+        Odwołanie pojedynczego wystąpienia nie zwalnia terminu dla całej
+        serii, ale wystąpienie przeniesione w jej termin jest kolizją.
+        """
+        args = (day_of_week, start_time, end_time, start_date, end_date)
+        start, end = minute_of_day(start_time), minute_of_day(end_time)
+        result = {'teacher': self.teacher.overlapping(*args), 'student': self.student.overlapping(*args)}
+        for moved_date, m_start, m_end, series, _ in self._moved:
+            if (moved_date.weekday() != day_of_week or m_start >= end or m_end <= start
+                    or not dates_overlap(start_date, end_date, moved_date, moved_date)):
+                continue
+            for role, ids in result.items():
+                if self._owns(role, series) and series.id not in ids:
+                    ids.append(series.id)
+        return result
+
+    def occurrence_conflicts(self, d, start_time, end_time, skip=None):
+        """Kolizje jednorazowego terminu w dniu d (np. przeniesionego wystąpienia)."""
+        start, end = minute_of_day(start_time), minute_of_day(end_time)
+        return {
+            role: [series_id for b_start, b_end, series_id in self.busy_on(role, d, skip)
+                   if b_start < end and b_end > start]
+            for role in ('teacher', 'student')
+        }
+
+    def free_slots(self, week_start, day_start, day_end, min_length=0):
+        """Wspólne wolne okna nauczyciela i ucznia w tygodniu od week_start.
+
+        Zwraca listę (data, minuta początku, minuta końca) w godzinach
+        [day_start, day_end), pomijając okna krótsze niż min_length minut.
+        """
+        slots = []
+        for offset in range(7):
+            d = week_start + timedelta(days=offset)
+            busy = sorted(b for role in ('teacher', 'student') for b in self.busy_on(role, d))
+            cursor = day_start
+            for b_start, b_end, _ in busy:
+                if b_start > cursor and min(b_start, day_end) - cursor >= max(min_length, 1):
+                    slots.append((d, cursor, min(b_start, day_end)))
+                cursor = max(cursor, b_end)
+                if cursor >= day_end:
+                    break
+            if day_end - cursor >= max(min_length, 1):
+                slots.append((d, cursor, day_end))
+        return slots
+
+
+def lessons_changed(teacher_id, student_id):
+    """Unieważnia wszystko, co zależy od planu zajęć nauczyciela i ucznia."""
+    current_app.extensions['calendar_cache'].invalidate(('teacher', teacher_id), ('student', student_id))
@@ -0,0 +1,294 @@
+import errno
+import os
+import shutil
+import tempfile
+from flask import current_app
+
+CHUNK_SIZE = 64 * 1024
+# Obiekt S3 większy od progu jest wysyłany w częściach (multipart upload)
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+# Pobrany z S3 obiekt trzymany jest w pamięci do tego rozmiaru, większy - na dysku
+SPOOL_MAX_MEMORY = 1024 * 1024
+
+
+def blob_key(sha256):
+    """Ścieżka względna bloba: dwa poziomy katalogów z prefiksu skrótu."""
+    return f"{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def blob_path(sha256, root=None):
+    root = root or current_app.config['UPLOAD_FOLDER']
+    return os.path.join(root, sha256[:2], sha256[2:4], sha256)
+
+
+class LocalStorage:
+    """Bloby w lokalnym katalogu (domyślnie UPLOAD_FOLDER) pod ścieżkami ab/cd/<sha256>."""
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        return self._root or current_app.config['UPLOAD_FOLDER']
+
+    def for_worker(self):
+        """Kopia niezależna od kontekstu aplikacji - do przekazania do procesu roboczego."""
+        return LocalStorage(self.root)
+
+    def path(self, sha256):
+        return blob_path(sha256, self.root)
+
+    def scratch_dir(self):
+        """Katalog na pliki tymczasowe - ten sam system plików, więc put_file jest atomowe."""
+        path = os.path.join(self.root, 'tmp')
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put_file(self, sha256, path):
+        """Atomowo przenosi plik tymczasowy (zużywając go) pod klucz bloba.
+
+        Plik z innego systemu plików (np. STORAGE_ROOT na osobnym wolumenie
+        niż UPLOAD_FOLDER/tmp) jest najpierw kopiowany do scratch_dir()
+        magazynu, żeby podmiana pod docelową nazwą pozostała atomowa.
+        """
+        dest = self.path(sha256)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.replace(path, dest)
+            return
+        except OSError as e:
+            if e.errno != errno.EXDEV:
+                raise
+        fd, staged = tempfile.mkstemp(dir=self.scratch_dir())
+        try:
+            with os.fdopen(fd, 'wb') as out, open(path, 'rb') as src:
+                shutil.copyfileobj(src, out, CHUNK_SIZE)
+            os.replace(staged, dest)
+        except BaseException:
+            os.remove(staged)
+            raise
+        os.remove(path)
+
+    def touch(self, sha256):
+        """Odświeża czas modyfikacji bloba; False, gdy bloba już nie ma."""
+        try:
+            os.utime(self.path(sha256))
+        except FileNotFoundError:
+            return False
+        return True
+
+    def open(self, sha256):
+        return open(self.path(sha256), 'rb')
+
+    def stream(self, sha256, chunk_size=CHUNK_SIZE):
+        with self.open(sha256) as f:
+            yield from iter(lambda: f.read(chunk_size), b'')
+
+    def size(self, sha256):
+        return os.path.getsize(self.path(sha256))
+
+    def mtime(self, sha256):
+        """Bieżący czas modyfikacji bloba albo None, gdy go nie ma."""
+        try:
+            return os.stat(self.path(sha256)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def delete(self, sha256):
+        try:
+            os.remove(self.path(sha256))
+        except FileNotFoundError:
+            pass
+
+    def iter_blobs(self):
+        """(sha256, rozmiar, mtime) wszystkich blobów - przegląd katalogów przez scandir."""
+        root = self.root
+        if not os.path.isdir(root):
+            return
+        for shard in os.scandir(root):
+            if not (shard.is_dir() and _is_hex(shard.name, 2)):
+                continue
+            for sub in os.scandir(shard.path):
+                if not (sub.is_dir() and _is_hex(sub.name, 2)):
+                    continue
+                for blob in os.scandir(sub.path):
+                    if _is_hex(blob.name, 64):
+                        try:
+                            st = blob.stat()
+                        except FileNotFoundError:
+                            continue
+                        yield blob.name, st.st_size, st.st_mtime
+
+    def download_url(self, sha256, filename, mimetype):
+        """Lokalne bloby wysyła aplikacja (lub proxy przez X-Accel-Redirect)."""
+        return None
+
+
+class S3Storage:
+    """Bloby w kubełku zgodnym z S3 (AWS, MinIO, Ceph...) pod kluczami prefix + ab/cd/<sha256>.
+
+    Wymaga pakietu boto3. Duże pliki wysyłane są przez multipart upload,
+    a pobierania przekierowywane na podpisane, krótko ważne adresy URL,
+    więc bajty nie przechodzą przez workery aplikacji.
+    """
+
+    def __init__(self, bucket, endpoint_url=None, region=None, access_key=None, secret_key=None,
+                 prefix='', presign_ttl=300, multipart_threshold=MULTIPART_THRESHOLD):
+        self.bucket = bucket
+        self.endpoint_url = endpoint_url
+        self.region = region
+        self.access_key = access_key
+        self.secret_key = secret_key
+        self.prefix = prefix
+        self.presign_ttl = presign_ttl
+        self.multipart_threshold = multipart_threshold
+        self._client = None
+
+    def __getstate__(self):
+        # klient boto3 nie przechodzi przez pickle - proces roboczy tworzy własny
+        state = self.__dict__.copy()
+        state['_client'] = None
+        return state
+
+    def for_worker(self):
+        return self
+
+    @property
+    def client(self):
+        if self._client is None:
+            try:
+                import boto3
+            except ImportError:
+                raise RuntimeError("STORAGE_BACKEND = 's3' wymaga pakietu boto3")
+            self._client = boto3.client(
+                's3',
+                endpoint_url=self.endpoint_url,
+                region_name=self.region,
+                aws_access_key_id=self.access_key,
+                aws_secret_access_key=self.secret_key
+            )
+        return self._client
+
+    def key(self, sha256):
+        return self.prefix + blob_key(sha256)
+
+    def scratch_dir(self):
+        return None  # systemowy katalog tymczasowy
+
+    def exists(self, sha256):
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(sha256))
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def put_file(self, sha256, path):
+        """Wysyła plik (multipart powyżej progu) i usuwa kopię lokalną."""
+        from boto3.s3.transfer import TransferConfig
+        config = TransferConfig(multipart_threshold=self.multipart_threshold,
+                                multipart_chunksize=self.multipart_threshold)
+        self.client.upload_file(path, self.bucket, self.key(sha256), Config=config)
+        os.remove(path)
+
+    def touch(self, sha256):
+        # kopia obiektu na siebie odświeża LastModified (okres karencji GC)
+        from botocore.exceptions import ClientError
+        key = self.key(sha256)
+        try:
+            self.client.copy_object(Bucket=self.bucket, Key=key, CopySource={'Bucket': self.bucket, 'Key': key},
+                                    MetadataDirective='REPLACE')
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+        return True
+
+    def open(self, sha256):
+        """Plik z możliwością seek (np. dla PIL): mały w pamięci, duży w pliku tymczasowym."""
+        spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+        for chunk in self.stream(sha256):
+            spool.write(chunk)
+        spool.seek(0)
+        return spool
+
+    def stream(self, sha256, chunk_size=CHUNK_SIZE):
+        body = self.client.get_object(Bucket=self.bucket, Key=self.key(sha256))['Body']
+        try:
+            yield from body.iter_chunks(chunk_size)
+        finally:
+            body.close()
+
+    def size(self, sha256):
+        return self.client.head_object(Bucket=self.bucket, Key=self.key(sha256))['ContentLength']
+
+    def mtime(self, sha256):
+        from botocore.exceptions import ClientError
+        try:
+            head = self.client.head_object(Bucket=self.bucket, Key=self.key(sha256))
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head['LastModified'].timestamp()
+
+    def delete(self, sha256):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(sha256))
+
+    def iter_blobs(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for obj in page.get('Contents', ()):
+                name = obj['Key'].rsplit('/', 1)[-1]
+                if _is_hex(name, 64):
+                    yield name, obj['Size'], obj['LastModified'].timestamp()
+
+    def download_url(self, sha256, filename, mimetype):
+        return self.client.generate_presigned_url(
+            'get_object',
+            Params={
+                'Bucket': self.bucket,
+                'Key': self.key(sha256),
+                'ResponseContentType': mimetype,
+                'ResponseContentDisposition': f'attachment; filename="{filename}"'
+            },
+            ExpiresIn=self.presign_ttl
+        )
+
+
+def _is_hex(name, length):
+    return len(name) == length and all(c in '0123456789abcdef' for c in name)
+
+
+def copy_to_file(storage, sha256, path):
+    """Zapisuje treść bloba do lokalnego pliku path (kawałkami)."""
+    with open(path, 'wb') as out:
+        for chunk in storage.stream(sha256):
+            out.write(chunk)
+
+
+def make_storage(config):
+    """Backend wybrany przez STORAGE_BACKEND: 'local' (domyślnie) albo 's3'."""
+    backend = config.get('STORAGE_BACKEND', 'local')
+    if backend == 'local':
+        return LocalStorage(config.get('STORAGE_ROOT'))
+    if backend == 's3':
+        return S3Storage(
+            bucket=config['S3_BUCKET'],
+            endpoint_url=config.get('S3_ENDPOINT_URL'),
+            region=config.get('S3_REGION'),
+            access_key=config.get('S3_ACCESS_KEY'),
+            secret_key=config.get('S3_SECRET_KEY'),
+            prefix=config.get('S3_PREFIX', ''),
+            presign_ttl=config.get('S3_PRESIGN_TTL', 300)
+        )
+    raise ValueError(f"Nieznany STORAGE_BACKEND: {backend}")
+
+
+def get_storage():
+    return current_app.extensions['storage']
@@ -0,0 +1,105 @@
+import os
+import zipfile
+from datetime import datetime, time, timedelta
+from app import db
+from app.models import Task, TaskAttachment, Student
+from app.storage import CHUNK_SIZE
+
+# Typy, których ponowna kompresja nic nie daje - zapisywane bez deflate
+STORED_MIME_PREFIXES = ('image/', 'video/', 'audio/', 'application/pdf', 'application/zip')
+
+
+class _ChunkBuffer:
+    """Wyjście ZipFile bez seek: zbiera zapisane bajty do odebrania przez generator."""
+
+    def __init__(self):
+        self._chunks = []
+        self._offset = 0
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def zip_stream(entries, storage):
+    """Generator bajtów archiwum ZIP z blobów entries = [(nazwa w archiwum, sha256, rozmiar, data, bez kompresji?)].
+
+    Bloby czytane są z magazynu kawałkami po CHUNK_SIZE i każdy kawałek od
+    razu wychodzi do klienta, więc zużycie pamięci nie zależy od rozmiaru
+    archiwum. Wyjście nie obsługuje seek, dlatego zipfile zapisuje sumy
+    kontrolne w deskryptorach danych za treścią pliku.
+    """
+    buf = _ChunkBuffer()
+    with zipfile.ZipFile(buf, 'w') as zf:
+        for arcname, sha256, size, modified, stored in entries:
+            info = zipfile.ZipInfo(arcname, date_time=modified.timetuple()[:6])
+            info.file_size = size
+            info.compress_type = zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED
+            with zf.open(info, 'w') as dst:
+                for chunk in storage.stream(sha256, CHUNK_SIZE):
+                    dst.write(chunk)
+                    data = buf.take()
+                    if data:
+                        yield data
+            data = buf.take()
+            if data:
+                yield data
+    yield buf.take()
+
+
+def _safe_part(value):
+    return value.replace('/', '_').replace('\\', '_').strip(' .') or '_'
+
+
+def _unique(name, used):
+    """Dokleja ' (2)', ' (3)'... przed rozszerzeniem, gdy nazwa jest już zajęta."""
+    base, ext = os.path.splitext(name)
+    candidate, n = name, 1
+    while candidate in used:
+        n += 1
+        candidate = f"{base} ({n}){ext}"
+    used.add(candidate)
+    return candidate
+
+
+def submission_entries(teacher_id, title=None, due=None):
+    """Pliki uczniów z zadań nauczyciela (opcjonalnie o danym tytule / terminie) - jedno zapytanie.
+
+    Zwraca listę dla zip_stream; każdy uczeń ma własny katalog
+    'Nazwisko Imię', a w nim katalog z tytułem zadania.
+    """
+    query = db.session.query(TaskAttachment, Task.title, Student.id, Student.name, Student.surname) \
+        .join(Task, TaskAttachment.task_id == Task.id) \
+        .join(Student, Task.student_id == Student.id) \
+        .filter(Task.teacher_id == teacher_id, TaskAttachment.side == 'student')
+    if title:
+        query = query.filter(Task.title == title)
+    if due:
+        day = datetime.combine(due, time.min)
+        query = query.filter(Task.due_date >= day, Task.due_date < day + timedelta(days=1))
+    rows = query.order_by(Student.surname, Student.name, Student.id, Task.title, TaskAttachment.id).all()
+
+    folders, used_folders, used_names = {}, set(), set()
+    entries = []
+    for attachment, task_title, student_id, name, surname in rows:
+        if student_id not in folders:
+            folders[student_id] = _unique(_safe_part(f"{surname} {name}"), used_folders)
+        arcname = _unique(
+            f"{folders[student_id]}/{_safe_part(task_title)}/{_safe_part(attachment.original_name)}",
+            used_names
+        )
+        entries.append((arcname, attachment.sha256, attachment.size, attachment.created_at or datetime.now(),
+                        attachment.mime.startswith(STORED_MIME_PREFIXES)))
+    return entries
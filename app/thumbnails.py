@@ -0,0 +1,122 @@
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from PIL import Image, ImageOps
+from flask import current_app
+from app.storage import get_storage
+
+# Dozwolone rozmiary miniatur (px, dłuższa krawędź)
+THUMB_SIZES = (160, 320, 640)
+WEBP_QUALITY = 75
+
+
+def render_thumbnail(source, dest, size):
+    """Zapisuje miniaturę WebP obrazu source (ścieżka lub plik); plik dest pojawia się atomowo."""
+    with Image.open(source) as img:
+        if img.format == 'JPEG':
+            img.draft('RGB', (size, size))
+        img = ImageOps.exif_transpose(img)
+    img.thumbnail((size, size), Image.Resampling.LANCZOS)
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+    fd, tmp = tempfile.mkstemp(suffix='.webp', dir=os.path.dirname(dest))
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            img.save(out, 'WEBP', quality=WEBP_QUALITY, method=4)
+        os.replace(tmp, dest)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+class ThumbnailCache:
+    """Katalog miniatur WebP ograniczony do max_bytes, usuwanie od najdawniej używanych.
+
+    Miniatury generowane są przy pierwszym żądaniu. Kolejność LRU trzymana
+    jest w pamięci, a po restarcie odtwarzana z czasów modyfikacji plików
+    (aktualizowanych przy każdym trafieniu). Indeks i licznik bajtów są
+    osobne w każdym procesie serwera, więc przy N workerach katalog może
+    zająć do N * max_bytes.
+    Blob jest niezmienny (nazwa = skrót treści), więc miniatura nigdy się
+    nie dezaktualizuje.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._root = None
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _load(self, root):
+        """Odtwarza indeks z zawartości katalogu (przy pierwszym użyciu lub zmianie katalogu)."""
+        os.makedirs(root, exist_ok=True)
+        files = []
+        for name in os.listdir(root):
+            if name.endswith('.webp'):
+                st = os.stat(os.path.join(root, name))
+                files.append((st.st_mtime, name, st.st_size))
+        self._root = root
+        self._entries = OrderedDict((name, size) for _, name, size in sorted(files))
+        self._bytes = sum(self._entries.values())
+
+    def get(self, sha256, size, root=None):
+        """Ścieżka miniatury bloba sha256 o rozmiarze size, generowanej w razie braku."""
+        root = root or os.path.join(current_app.config['UPLOAD_FOLDER'], 'thumbs')
+        name = f"{sha256}-{size}.webp"
+        path = os.path.join(root, name)
+        with self._lock:
+            if self._root != root:
+                self._load(root)
+            hit = name in self._entries and os.path.exists(path)
+            if hit:
+                self._entries.move_to_end(name)
+                self.hits += 1
+            else:
+                self.misses += 1
+        if hit:
+            try:
+                # czas modyfikacji odzwierciedla ostatnie użycie po restarcie
+                os.utime(path)
+                return path
+            except FileNotFoundError:
+                pass  # usunięta w międzyczasie przez inny wątek - generujemy ponownie
+
+        with get_storage().open(sha256) as source:
+            render_thumbnail(source, path, size)
+        thumb_size = os.path.getsize(path)
+
+        with self._lock:
+            self._bytes += thumb_size - self._entries.pop(name, 0)
+            self._entries[name] = thumb_size
+            while self._bytes > self.max_bytes and len(self._entries) > 1:
+                old, old_size = self._entries.popitem(last=False)
+                self._bytes -= old_size
+                self.evictions += 1
+                try:
+                    os.remove(os.path.join(root, old))
+                except FileNotFoundError:
+                    pass
+        return path
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'evictions': self.evictions
+            }
+
+
+def get_thumbnail_cache():
+    return current_app.extensions['thumbnail_cache']
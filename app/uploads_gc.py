@@ -0,0 +1,108 @@
+import os
+import re
+import threading
+import time
+from flask import current_app
+from app import db
+from app.models import TaskAttachment
+from app.storage import get_storage
+
+THUMB_RE = re.compile(r'([0-9a-f]{64})-\d+\.webp')
+
+
+def referenced_blobs(batch_size=1000):
+    """Zbiór skrótów wskazywanych przez wiersze task_attachments (odczyt partiami)."""
+    query = db.session.query(TaskAttachment.sha256).execution_options(yield_per=batch_size)
+    return {sha256 for (sha256,) in query}
+
+
+def _sweep_file(path, stats, cutoff, dry_run):
+    """Usuwa lokalny plik starszy niż cutoff; młodsze pomija (mogą należeć do trwającego uploadu)."""
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return
+    if st.st_mtime > cutoff:
+        stats['kept_recent'] += 1
+        return
+    if not dry_run:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            return
+    stats['removed'] += 1
+    stats['reclaimed_bytes'] += st.st_size
+
+
+def collect_garbage(grace_seconds=24 * 3600, dry_run=False, root=None):
+    """Mark-and-sweep magazynu załączników.
+
+    Mark: skróty ze wszystkich wierszy task_attachments. Sweep: bloby
+    spoza tego zbioru (w magazynie z get_storage), ich miniatury i porzucone
+    pliki w lokalnym katalogu tmp/, o ile są starsze niż grace_seconds. Nowy blob trafia do magazynu przed
+    zatwierdzeniem wiersza, który go wskazuje - okres karencji chroni
+    takie pliki, więc GC można uruchamiać w trakcie przesyłania plików.
+    Czas modyfikacji bloba jest sprawdzany ponownie tuż przed usunięciem,
+    bo przegląd magazynu trwa, a w tym czasie upload duplikatu mógł
+    odświeżyć blob (place_blob).
+    Zwraca słownik z licznikami.
+    """
+    root = root or current_app.config['UPLOAD_FOLDER']
+    storage = get_storage()
+    marked = referenced_blobs()
+    cutoff = time.time() - grace_seconds
+    stats = {'marked': len(marked), 'scanned': 0, 'removed': 0, 'kept_recent': 0, 'reclaimed_bytes': 0}
+
+    for sha256, size, mtime in storage.iter_blobs():
+        stats['scanned'] += 1
+        if sha256 in marked:
+            continue
+        if mtime > cutoff:
+            stats['kept_recent'] += 1
+            continue
+        if not dry_run:
+            current = storage.mtime(sha256)
+            if current is None:
+                continue
+            if current > cutoff:
+                stats['kept_recent'] += 1
+                continue
+            storage.delete(sha256)
+        stats['removed'] += 1
+        stats['reclaimed_bytes'] += size
+
+    thumbs = os.path.join(root, 'thumbs')
+    if os.path.isdir(thumbs):
+        for thumb in os.scandir(thumbs):
+            match = THUMB_RE.fullmatch(thumb.name)
+            if match and match.group(1) not in marked:
+                _sweep_file(thumb.path, stats, cutoff, dry_run)
+
+    tmp = os.path.join(root, 'tmp')
+    if os.path.isdir(tmp):
+        for leftover in os.scandir(tmp):
+            if leftover.is_file():
+                _sweep_file(leftover.path, stats, cutoff, dry_run)
+
+    return stats
+
+
+def start_periodic_gc(app, interval, grace_seconds):
+    """Uruchamia GC co interval sekund w wątku w tle.
+
+    Każdy proces serwera uruchamia własny wątek; równoległe przebiegi są
+    bezpieczne, bo usuwanie nieistniejącego pliku jest pomijane.
+    """
+    def loop():
+        while True:
+            time.sleep(interval)
+            try:
+                with app.app_context():
+                    stats = collect_garbage(grace_seconds)
+                app.logger.info("uploads-gc: %s", stats)
+            except Exception:
+                app.logger.exception("uploads-gc nie powiódł się")
+
+    thread = threading.Thread(target=loop, name='uploads-gc', daemon=True)
+    thread.start()
+    return thread
@@ -1,18 +1,62 @@
+import logging
 import os
-from PIL import Image
+import tempfile
+from PIL import Image, ImageOps
 from flask import abort
 from app import db
 
-def compress_file(filepath):
+logger = logging.getLogger(__name__)
+
+# Dłuższa krawędź obrazu po optymalizacji (px)
+DEFAULT_MAX_EDGE = 2048
+JPEG_QUALITY = 80
+# PNG większe od tego progu (bajty) są redukowane do palety 256 kolorów
+PNG_QUANTIZE_MIN = 256 * 1024
+
+def compress_file(filepath, max_edge=DEFAULT_MAX_EDGE):
+    """Optymalizuje obraz JPG/PNG w miejscu; zwraca True, gdy plik został zastąpiony.
+
+    Obraz jest obracany zgodnie z EXIF i zmniejszany do max_edge px na
+    dłuższej krawędzi (JPEG dekodowany od razu w zmniejszonej skali przez
+    Image.draft). Duże PNG RGB/RGBA są kwantyzowane do 256 kolorów.
+    Wynik zastępuje oryginał tylko wtedy, gdy jest od niego mniejszy.
+    """
     ext = os.path.splitext(filepath)[1].lower()
-    if ext in ('.jpg', '.jpeg', '.png'):
-        try:
-            img = Image.open(filepath)
-            img.save(filepath,
-                     optimize=True,
-                     quality=70)
-        except Exception as e:
-            print("Image compress error:", e)
+    if ext not in ('.jpg', '.jpeg', '.png'):
+        return False
+    tmp = None
+    try:
+        original_size = os.path.getsize(filepath)
+        with Image.open(filepath) as img:
+            fmt = img.format
+            if fmt == 'JPEG':
+                img.draft('RGB', (max_edge, max_edge))
+            img = ImageOps.exif_transpose(img)
+        if max(img.size) > max_edge:
+            img.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+
+        fd, tmp = tempfile.mkstemp(suffix=ext, dir=os.path.dirname(filepath))
+        with os.fdopen(fd, 'wb') as out:
+            if fmt == 'JPEG':
+                if img.mode not in ('RGB', 'L'):
+                    img = img.convert('RGB')
+                img.save(out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+            else:
+                if img.mode in ('RGB', 'RGBA') and original_size > PNG_QUANTIZE_MIN:
+                    img = img.quantize(256, method=Image.Quantize.FASTOCTREE)
+                img.save(out, 'PNG', optimize=True)
+
+        if os.path.getsize(tmp) >= original_size:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, filepath)
+        return True
+    except Exception:
+        if tmp and os.path.exists(tmp):
+            os.remove(tmp)
+        # Działa w procesie puli bez kontekstu aplikacji - zwykły logger modułu
+        logger.exception("Nie udało się zoptymalizować obrazu %s", filepath)
+        return False
 
 def get_or_404(model, ident):
     obj = db.session.get(model, ident)
@@ -0,0 +1,45 @@
+"""Czas rozmieszczania wsadu żądań przez app.auto_scheduler.solve.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_auto_scheduler [liczba_żądań] [liczba_nauczycieli]
+"""
+import random
+import sys
+import time
+
+from app.auto_scheduler import PlacementRequest, solve
+
+
+def make_requests(n, teachers, seed=0):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        first_day = rnd.randint(0, 4)
+        earliest = rnd.choice([8, 12, 14, 16]) * 60
+        out.append(PlacementRequest(
+            student_id=i // 2,
+            teacher_id=rnd.randrange(teachers),
+            duration=rnd.choice([45, 60, 90]),
+            days=tuple(sorted({first_day, rnd.randint(0, 4)})),
+            earliest=earliest,
+            latest=min(earliest + rnd.choice([3, 4, 6]) * 60, 21 * 60)
+        ))
+    return out
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+    teachers = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    requests = make_requests(n, teachers)
+
+    t0 = time.perf_counter()
+    placements, unplaced = solve(requests)
+    elapsed = time.perf_counter() - t0
+
+    print(f"żądania: {n}, nauczyciele: {teachers}")
+    print(f"rozmieszczone: {len(placements)}, nierozmieszczone: {len(unplaced)}")
+    print(f"czas: {elapsed * 1000:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
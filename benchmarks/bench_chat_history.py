@@ -0,0 +1,114 @@
+"""Czas wczytania historii czatu dla długiej rozmowy (domyślnie 100 000 wiadomości).
+
+Porównuje dawne wczytywanie całej rozmowy (filtr OR po nadawcy i odbiorcy,
+sortowanie po czasie) ze stroną najnowszych wiadomości i stroną głęboko w
+historii, czytanymi kursorem po indeksie (conversation_id, id). W bazie są
+też wiadomości innych par, żeby indeks miał co pomijać.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_chat_history [liczba_wiadomości] [rozmiar_strony]
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from app import create_app, db
+from app.chat import conversation_page
+from app.config import TestConfig
+from app.models import Message
+
+STUDENT_ID, TEACHER_ID = 1, 1
+OTHER_PAIRS = 50
+REPEAT = 5
+
+
+def rows(count, student_id, teacher_id, start):
+    for i in range(count):
+        from_student = i % 2 == 0
+        yield {
+            'sender_id': student_id if from_student else teacher_id,
+            'receiver_id': teacher_id if from_student else student_id,
+            'sender_role': 'student' if from_student else 'teacher',
+            'receiver_role': 'teacher' if from_student else 'student',
+            'content': f"Wiadomość numer {i} w rozmowie o zadaniach domowych",
+            'timestamp': start + timedelta(seconds=i),
+        }
+
+
+def fill(count):
+    start = datetime(2024, 1, 1)
+    for student_id in range(2, OTHER_PAIRS + 2):
+        db.session.execute(db.insert(Message), list(rows(count // OTHER_PAIRS // 2, student_id, TEACHER_ID, start)))
+    batch = []
+    for row in rows(count, STUDENT_ID, TEACHER_ID, start):
+        batch.append(row)
+        if len(batch) == 10000:
+            db.session.execute(db.insert(Message), batch)
+            batch = []
+    if batch:
+        db.session.execute(db.insert(Message), batch)
+    db.session.commit()
+
+
+def full_history():
+    """Zapytanie sprzed stronicowania: cała rozmowa pary."""
+    return Message.query.filter(
+        db.or_(
+            db.and_(Message.sender_id == STUDENT_ID, Message.sender_role == 'student',
+                    Message.receiver_id == TEACHER_ID, Message.receiver_role == 'teacher'),
+            db.and_(Message.sender_id == TEACHER_ID, Message.sender_role == 'teacher',
+                    Message.receiver_id == STUDENT_ID, Message.receiver_role == 'student')
+        )
+    ).order_by(Message.timestamp.asc()).all()
+
+
+def median_ms(fn):
+    samples = []
+    for _ in range(REPEAT):
+        db.session.expunge_all()
+        t0 = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), result
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    with tempfile.TemporaryDirectory() as tmp:
+        class BenchConfig(TestConfig):
+            SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(tmp, 'bench.db')
+
+        app = create_app(BenchConfig)
+        with app.app_context():
+            db.create_all()
+            t0 = time.perf_counter()
+            fill(count)
+            print(f"wiadomości w rozmowie: {count}, innych par: {OTHER_PAIRS}, "
+                  f"zapis: {time.perf_counter() - t0:.1f} s")
+
+            ms, messages = median_ms(full_history)
+            print(f"cała historia (filtr OR): {ms:.1f} ms, {len(messages)} wiadomości")
+
+            ms, (page, before) = median_ms(lambda: conversation_page(STUDENT_ID, TEACHER_ID, limit=page_size))
+            print(f"najnowsza strona ({page_size}): {ms:.2f} ms")
+
+            middle = page[0].id - count // 2
+            ms, (page, _) = median_ms(
+                lambda: conversation_page(STUDENT_ID, TEACHER_ID, before=middle, limit=page_size))
+            print(f"strona w połowie historii (before={middle}): {ms:.2f} ms, {len(page)} wiadomości")
+
+            plan = db.session.execute(db.text(
+                "EXPLAIN QUERY PLAN SELECT id FROM messages "
+                "WHERE conversation_id = :c AND id < :b ORDER BY id DESC LIMIT :n"
+            ), {'c': f"{STUDENT_ID}-{TEACHER_ID}", 'b': middle, 'n': page_size + 1}).all()
+            print("plan zapytania strony:", "; ".join(row[-1] for row in plan))
+            db.session.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Oszczędność bajtów i czas optymalizacji obrazów przez app.utils.compress_file.
+
+Porównuje obecny optymalizator z poprzednim (ponowny zapis z quality=70)
+na korpusie obrazów. Bez argumentu generowany jest korpus syntetyczny
+(zdjęcia z telefonu w JPEG i PNG, zrzuty ekranu, zdjęcia obrócone w EXIF).
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_images [katalog_z_obrazami]
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from PIL import Image
+
+from app.utils import compress_file
+
+
+def photo(size, seed):
+    gradient = Image.linear_gradient('L').resize(size)
+    noise = Image.effect_noise(size, 24 + seed % 16)
+    return Image.merge('RGB', (gradient, noise, gradient.transpose(Image.Transpose.ROTATE_180)))
+
+
+def screenshot(size):
+    img = Image.new('RGB', size, 'white')
+    stripe = Image.new('RGB', (size[0], 24), (40, 90, 160))
+    for y in range(0, size[1], 96):
+        img.paste(stripe, (0, y))
+    return img
+
+
+def make_corpus(path):
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    for i in range(6):
+        photo((4032, 3024), i).save(os.path.join(path, f"telefon_{i}.jpg"), 'JPEG', quality=92)
+    for i in range(2):
+        photo((3024, 4032), i).save(os.path.join(path, f"obrocone_{i}.jpg"), 'JPEG', quality=92, exif=exif)
+    for i in range(3):
+        photo((1600, 1200), i).save(os.path.join(path, f"skan_{i}.png"), 'PNG')
+    for i in range(3):
+        screenshot((1920, 1080)).save(os.path.join(path, f"zrzut_{i}.png"), 'PNG')
+
+
+def legacy_compress(filepath):
+    img = Image.open(filepath)
+    img.save(filepath, optimize=True, quality=70)
+
+
+def run(optimizer, corpus, work):
+    before = after = 0
+    elapsed = 0.0
+    names = sorted(n for n in os.listdir(corpus) if n.lower().endswith(('.jpg', '.jpeg', '.png')))
+    for name in names:
+        path = os.path.join(work, name)
+        shutil.copyfile(os.path.join(corpus, name), path)
+        before += os.path.getsize(path)
+        t0 = time.perf_counter()
+        optimizer(path)
+        elapsed += time.perf_counter() - t0
+        after += os.path.getsize(path)
+        os.remove(path)
+    return len(names), before, after, elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        corpus = sys.argv[1] if len(sys.argv) > 1 else os.path.join(tmp, 'korpus')
+        work = os.path.join(tmp, 'praca')
+        os.makedirs(work)
+        if len(sys.argv) <= 1:
+            os.makedirs(corpus)
+            make_corpus(corpus)
+
+        for label, optimizer in (('quality=70 (poprzednio)', legacy_compress), ('compress_file', compress_file)):
+            count, before, after, elapsed = run(optimizer, corpus, work)
+            saved = before - after
+            print(f"{label}: obrazy: {count}, przed: {before / 1e6:.1f} MB, po: {after / 1e6:.1f} MB, "
+                  f"oszczędność: {saved / 1e6:.1f} MB ({100 * saved / before:.0f}%), "
+                  f"{elapsed * 1000 / count:.0f} ms/obraz")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+"""Przepustowość logowań (sprawdzeń hasła bcrypt) przy różnych rozmiarach puli procesów.
+
+Symuluje falę logowań: wątki (jak wątki serwera) wywołują
+PasswordHasher.check na skrótach o koszcie wyznaczonym przez kalibrację
+(albo podanym jako argument). Pula 0 to sprawdzanie w wątku żądania,
+tak jak przed wprowadzeniem puli. Oprócz logowań/s mierzony jest czas
+odpowiedzi "lekkiego" żądania wykonywanego w trakcie fali.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_passwords [koszt] [liczba_logowań]
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.passwords import PasswordHasher, calibrate_rounds, hash_password
+
+THREADS = 16
+
+
+def light_request_ms(stop):
+    """Średni czas pracy niewymagającej haszowania, mierzony w trakcie fali logowań."""
+    samples = []
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        sum(i * i for i in range(2000))
+        samples.append((time.perf_counter() - t0) * 1000)
+        time.sleep(0.005)
+    return sum(samples) / len(samples) if samples else 0.0
+
+
+def run(workers, pw_hash, rounds, logins):
+    hasher = PasswordHasher(workers=workers, max_pending=THREADS * 2, rounds=rounds)
+    if workers:
+        hasher.check(pw_hash, 'haslo123')  # rozgrzanie puli procesów
+    stop = threading.Event()
+    with ThreadPoolExecutor(THREADS + 1) as pool:
+        probe = pool.submit(light_request_ms, stop)
+        t0 = time.perf_counter()
+        results = list(pool.map(lambda _: hasher.check(pw_hash, 'haslo123'), range(logins)))
+        elapsed = time.perf_counter() - t0
+        stop.set()
+        light_ms = probe.result()
+    hasher.shutdown()
+    assert all(results)
+    return logins / elapsed, light_ms
+
+
+def main():
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else calibrate_rounds()
+    logins = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    pw_hash = hash_password('haslo123', rounds)
+    print(f"koszt bcrypt: {rounds}, logowań: {logins}, wątki serwera: {THREADS}, CPU: {os.cpu_count()}")
+
+    for workers in sorted({0, 1, 2, 4, os.cpu_count() or 1}):
+        rate, light_ms = run(workers, pw_hash, rounds, logins)
+        label = 'w wątku żądania' if workers == 0 else f'pula {workers}'
+        print(f"{label}: {rate:.1f} logowań/s, lekkie żądanie w trakcie: {light_ms:.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
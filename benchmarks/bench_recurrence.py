@@ -0,0 +1,74 @@
+"""Porównanie rozwijania serii zajęć: stara pętla dzień-po-dniu vs. app.recurrence.
+
+Uruchomienie (z katalogu głównego repozytorium):
+    python -m benchmarks.bench_recurrence [liczba_serii]
+"""
+import random
+import sys
+import time
+from collections import namedtuple
+from datetime import date, time as dtime, timedelta
+
+from app.recurrence import expand_series
+
+Series = namedtuple('Series', 'id day_of_week start_time end_time start_date end_date')
+
+
+def make_series(n, seed=0):
+    rnd = random.Random(seed)
+    term_start = date(2025, 9, 1)
+    out = []
+    for i in range(n):
+        start_date = term_start + timedelta(days=rnd.randint(0, 30))
+        out.append(Series(
+            id=i,
+            day_of_week=rnd.randint(0, 6),
+            start_time=dtime(rnd.randint(8, 19), 0),
+            end_time=dtime(rnd.randint(8, 19), 45),
+            start_date=start_date,
+            end_date=start_date + timedelta(days=rnd.randint(60, 300)),
+        ))
+    return out
+
+
+def legacy_expand(series_list, start, end):
+    # Dawna implementacja z teacher_lessons/student_lessons
+    out = []
+    for s in series_list:
+        d = max(start, s.start_date)
+        while d <= min(end, s.end_date):
+            if d.weekday() == s.day_of_week:
+                out.append((s, d))
+            d += timedelta(days=1)
+    return out
+
+
+def bench(fn, *args, repeat=3):
+    best = None
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(*args)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    series = make_series(n)
+    # Widok "list year" w FullCalendar
+    start, end = date(2025, 1, 1), date(2025, 12, 31)
+
+    t_old, old = bench(legacy_expand, series, start, end)
+    t_new, new = bench(lambda *a: list(expand_series(*a)), series, start, end)
+
+    assert sorted((s.id, d) for s, d in old) == sorted((s.id, d) for s, d in new)
+    print(f"serie: {n}, wystąpienia: {len(new)}")
+    print(f"pętla dzienna:       {t_old * 1000:8.1f} ms")
+    print(f"app.recurrence:      {t_new * 1000:8.1f} ms")
+    print(f"przyspieszenie:      {t_old / t_new:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 from app import create_app, db
-from app.models import Student, Teacher, Administrator, Task, Message, LessonSeries
+from app.models import Student, Teacher, Administrator, Task, TaskAttachment, Message, LessonSeries, LessonException
 
 app = create_app()
 
@@ -1,4 +1,4 @@
-from app import create_app
+from app import create_app, socketio
 import sass
 
 app = create_app()
@@ -9,4 +9,4 @@ if __name__ == "__main__":
         dirname=('static/scss', 'static/css'),
         output_style='compressed'
     )
-    app.run(debug=True, port=5001)
+    socketio.run(app, debug=True, port=5001)
@@ -1,5 +1,7 @@
 import pytest
 import os
+from contextlib import contextmanager
+from sqlalchemy import event
 from app import create_app, db, bcrypt
 from app.models import Student, Teacher, Administrator
 from app.config import TestConfig
@@ -45,16 +47,42 @@ def app():
         teacher.students.append(student)
         db.session.commit()
 
-    yield app
+    with app.test_request_context():
+        yield app
 
-    # Sprzątanie po testach
-    with app.app_context():
+        # Sprzątanie po testach
         db.session.remove()
         db.drop_all()
     if os.path.exists(TEST_DB_PATH):
         os.remove(TEST_DB_PATH)
 
 
+@pytest.fixture
+def count_queries(app):
+    """Zwraca kontekst zliczający instrukcje SQL: with count_queries() as statements: ..."""
+    @contextmanager
+    def counter():
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", before_cursor_execute)
+
+    return counter
+
+
+@pytest.fixture
+def uploads(app, tmp_path):
+    """Katalog UPLOAD_FOLDER w katalogu tymczasowym testu."""
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    return tmp_path
+
+
 @pytest.fixture
 def client(app):
     """Zwraca klienta testowego Flask"""
@@ -0,0 +1,85 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app import db, bcrypt
+from app.models import Account, Student, Teacher, Administrator
+from app.accounts import add_notification_mode, find_account, rebuild_accounts
+
+
+def test_directory_follows_user_changes(app):
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    assert tuple(find_account("teacher@example.com")) == ("teacher", teacher.id)
+    assert tuple(find_account("admin@example.com"))[0] == "administrator"
+
+    teacher.email = "anna.nowak@example.com"
+    db.session.commit()
+    assert find_account("teacher@example.com") is None
+    assert tuple(find_account("anna.nowak@example.com")) == ("teacher", teacher.id)
+
+    db.session.delete(teacher)
+    db.session.commit()
+    assert find_account("anna.nowak@example.com") is None
+
+
+def test_email_unique_across_roles(app):
+    db.session.add(Teacher(name="Jan", surname="Kowalski", email="student@example.com", password="x"))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+@pytest.mark.parametrize("email, created", [
+    ("nowy@example.com", True),
+    ("teacher@example.com", False),
+    ("admin@example.com", False),
+])
+def test_register_rejects_email_of_any_role(client, email, created):
+    resp = client.post("/register", data={
+        "role": "student", "name": "Adam", "surname": "Nowy", "email": email,
+        "password": "haslo123", "subject": "",
+    })
+    assert resp.status_code == (302 if created else 200)
+    assert (db.session.query(Student).filter_by(name="Adam").first() is not None) == created
+
+
+def test_login_and_check_email_use_one_lookup(client, count_queries):
+    client.get("/check_email?email=nowy@example.com")  # budowa filtra adresów
+    with count_queries() as statements:
+        assert client.get("/check_email?email=admin@example.com").get_json() == {"exists": True}
+    assert len(statements) == 1
+
+    with count_queries() as statements:
+        resp = client.post("/login", data={"email": "admin@example.com", "password": "admin123"})
+    assert resp.status_code == 302
+    # wyszukanie w katalogu kont + pobranie administratora po kluczu głównym
+    assert len(statements) == 2
+    assert "accounts" in statements[0]
+
+
+def test_rebuild_accounts_backfills_and_reports_duplicates(app):
+    db.session.query(Account).delete()
+    db.session.commit()
+    db.session.execute(Administrator.__table__.insert().values(
+        name="Stary", surname="Admin", email="student@example.com",
+        password=bcrypt.generate_password_hash("x").decode(), notification_mode="digest"))
+
+    count, duplicates = rebuild_accounts()
+
+    assert count == 3
+    assert [(role, email) for role, _, email in duplicates] == [("administrator", "student@example.com")]
+    assert tuple(find_account("student@example.com"))[0] == "student"
+
+
+def test_add_notification_mode_backfills_legacy_tables(app):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    for table in ("students", "teachers"):
+        db.session.execute(text(f"ALTER TABLE {table} DROP COLUMN notification_mode"))
+    db.session.commit()
+
+    filled = add_notification_mode()
+
+    assert filled["students"] == db.session.query(Student).count() and filled["students"] > 0
+    assert filled["administrators"] == 0
+    db.session.expire_all()
+    assert db.session.get(Student, student.id).notification_mode == 'digest'
+    assert set(add_notification_mode().values()) == {0}
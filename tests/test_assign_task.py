@@ -85,7 +85,7 @@ def test_assign_task_with_attachment(client):
     assert resp.status_code == 200
     task = db.session.query(Task).filter_by(title="Zadanie z plikiem", student_id=student.id).first()
     assert task is not None
-    assert "test.pdf" in (task.teacher_attachments or "")
+    assert [a.original_name for a in task.teacher_files] == ["test.pdf"]
 
 
 def test_assign_task_unauthorized_access(client):
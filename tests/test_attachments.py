@@ -0,0 +1,220 @@
+import hashlib
+import io
+import json
+import os
+from datetime import datetime
+from sqlalchemy import text
+from flask_login import login_user
+from app import db
+from app.models import Task, TaskAttachment, Student, Teacher
+from app.attachments import migrate_legacy_attachments
+from app.storage import blob_path
+
+
+def make_task():
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(
+        title="Zadanie z plikami",
+        due_date=datetime(2030, 1, 1),
+        max_points=10,
+        student_id=student.id,
+        teacher_id=teacher.id
+    )
+    db.session.add(task)
+    db.session.commit()
+    return task, student, teacher
+
+
+def submit(client, task, files):
+    return client.post(
+        f"/submit-task/{task.id}",
+        data={"answer": "Odpowiedź", "attachments": files},
+        content_type="multipart/form-data"
+    )
+
+
+def test_identical_uploads_are_deduplicated(client, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+
+    submit(client, task, [(io.BytesIO(b"to samo"), "a.pdf"), (io.BytesIO(b"to samo"), "b.pdf")])
+
+    files = db.session.get(Task, task.id).student_files
+    assert [a.original_name for a in files] == ["a.pdf", "b.pdf"]
+    assert files[0].sha256 == files[1].sha256
+    assert files[0].size == len(b"to samo")
+    assert files[0].mime == "application/pdf"
+
+    path = blob_path(files[0].sha256)
+    assert path.startswith(os.path.join(str(uploads), files[0].sha256[:2], files[0].sha256[2:4]))
+    with open(path, "rb") as f:
+        assert f.read() == b"to samo"
+
+
+def test_same_name_different_content_does_not_overwrite(client, uploads):
+    task, student, _ = make_task()
+    other, _, _ = make_task()
+    login_user(student)
+
+    submit(client, task, [(io.BytesIO(b"pierwszy"), "zadanie.pdf")])
+    submit(client, other, [(io.BytesIO(b"drugi"), "zadanie.pdf")])
+
+    first = db.session.get(Task, task.id).student_files[0]
+    second = db.session.get(Task, other.id).student_files[0]
+    assert first.sha256 != second.sha256
+    with open(blob_path(first.sha256), "rb") as f:
+        assert f.read() == b"pierwszy"
+
+
+def test_resubmission_replaces_student_attachments(client, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+
+    submit(client, task, [(io.BytesIO(b"v1"), "v1.pdf")])
+    submit(client, task, [(io.BytesIO(b"v2"), "v2.pdf")])
+
+    assert [a.original_name for a in db.session.get(Task, task.id).student_files] == ["v2.pdf"]
+    assert TaskAttachment.query.count() == 1
+
+
+def test_download_uses_original_name(client, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+    submit(client, task, [(io.BytesIO(b"%PDF tresc"), "moja praca.pdf")])
+    attachment = db.session.get(Task, task.id).student_files[0]
+
+    resp = client.get(f"/uploads/{attachment.sha256}")
+    assert resp.status_code == 200
+    assert resp.data == b"%PDF tresc"
+    assert resp.mimetype == "application/pdf"
+    assert "moja_praca.pdf" in resp.headers["Content-Disposition"]
+
+    assert client.get("/uploads/nieistniejacy").status_code == 404
+
+
+def test_migrate_legacy_json_columns(app, uploads):
+    task, _, _ = make_task()
+    db.session.execute(text("ALTER TABLE tasks ADD COLUMN teacher_attachments TEXT"))
+    db.session.execute(text("ALTER TABLE tasks ADD COLUMN student_attachments TEXT"))
+    db.session.execute(text("UPDATE tasks SET teacher_attachments = :t, student_attachments = :s"),
+                       {"t": json.dumps(["polecenie.pdf"]), "s": json.dumps(["odp.jpg", "brak.pdf"])})
+    db.session.commit()
+    (uploads / "polecenie.pdf").write_bytes(b"polecenie")
+    (uploads / "odp.jpg").write_bytes(b"nie-obraz")
+
+    migrated, missing = migrate_legacy_attachments()
+
+    assert migrated == 2
+    assert missing == ["brak.pdf"]
+    task = db.session.get(Task, task.id)
+    assert [a.original_name for a in task.teacher_files] == ["polecenie.pdf"]
+    assert [a.mime for a in task.student_files] == ["image/jpeg"]
+    assert not (uploads / "polecenie.pdf").exists()
+    with open(blob_path(task.teacher_files[0].sha256), "rb") as f:
+        assert f.read() == b"polecenie"
+    row = db.session.execute(text("SELECT teacher_attachments, student_attachments FROM tasks")).one()
+    assert tuple(row) == (None, None)
+
+
+def test_download_validators_range_and_cache_headers(client, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+    body = bytes(range(256)) * 64
+    submit(client, task, [(io.BytesIO(body), "skrypt.pdf")])
+    sha256 = db.session.get(Task, task.id).student_files[0].sha256
+
+    resp = client.get(f"/uploads/{sha256}")
+    assert resp.headers["ETag"] == f'"{sha256}"'
+    assert "immutable" in resp.headers["Cache-Control"]
+    assert "private" in resp.headers["Cache-Control"]
+    resp.close()
+
+    resp = client.get(f"/uploads/{sha256}", headers={"If-None-Match": f'"{sha256}"'})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+    resp = client.get(f"/uploads/{sha256}", headers={"Range": "bytes=100-199"})
+    assert resp.status_code == 206
+    assert resp.data == body[100:200]
+    assert resp.headers["Content-Range"] == f"bytes 100-199/{len(body)}"
+    resp.close()
+
+
+def test_download_requires_owning_task(client, uploads):
+    task, student, teacher = make_task()
+    login_user(student)
+    submit(client, task, [(io.BytesIO(b"cudza praca"), "praca.pdf")])
+    sha256 = db.session.get(Task, task.id).student_files[0].sha256
+
+    outsider = Student(name="Obcy", surname="Uczeń", email="obcy@example.com", password="x", approved=True)
+    db.session.add(outsider)
+    db.session.commit()
+
+    login_user(teacher)
+    resp = client.get(f"/uploads/{sha256}")
+    assert resp.status_code == 200
+    resp.close()
+
+    login_user(outsider)
+    assert client.get(f"/uploads/{sha256}").status_code == 403
+    assert client.get(f"/uploads/{sha256}/thumb/160").status_code == 403
+
+
+def test_download_offloaded_to_proxy(client, app, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+    submit(client, task, [(io.BytesIO(b"duzy plik"), "wyklad.pdf")])
+    sha256 = db.session.get(Task, task.id).student_files[0].sha256
+
+    app.config['UPLOAD_ACCEL_REDIRECT'] = '/_uploads/'
+    resp = client.get(f"/uploads/{sha256}")
+    assert resp.status_code == 200
+    assert resp.data == b""
+    assert resp.headers["X-Accel-Redirect"] == f"/_uploads/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+    assert resp.headers["Content-Disposition"] == "attachment; filename=wyklad.pdf"
+    assert resp.headers["ETag"] == f'"{sha256}"'
+    assert resp.mimetype == "application/pdf"
+
+    del app.config['UPLOAD_ACCEL_REDIRECT']
+    app.config['USE_X_SENDFILE'] = True
+    resp = client.get(f"/uploads/{sha256}")
+    assert resp.headers["X-Sendfile"] == blob_path(sha256)
+    assert resp.data == b""
+
+
+def test_upload_is_hashed_while_streaming(client, uploads):
+    task, student, _ = make_task()
+    login_user(student)
+    body = os.urandom(3 * 1024 * 1024)
+
+    submit(client, task, [(io.BytesIO(body), "skan.pdf")])
+
+    attachment = db.session.get(Task, task.id).student_files[0]
+    assert attachment.sha256 == hashlib.sha256(body).hexdigest()
+    assert attachment.size == len(body)
+    assert os.listdir(uploads / "tmp") == []
+
+
+def test_per_file_limit_rejects_upload(client, app, uploads):
+    app.config['MAX_UPLOAD_FILE_BYTES'] = 1024
+    task, student, _ = make_task()
+    login_user(student)
+
+    resp = submit(client, task, [(io.BytesIO(b"x" * 100), "maly.pdf"), (io.BytesIO(b"x" * 4096), "duzy.pdf")])
+
+    assert resp.status_code == 413
+    assert TaskAttachment.query.count() == 0
+    assert os.listdir(uploads / "tmp") == []
+    assert sorted(os.listdir(uploads)) == ["tmp"]
+
+
+def test_request_limit_rejects_upload(client, app, uploads):
+    app.config['MAX_CONTENT_LENGTH'] = 2048
+    task, student, _ = make_task()
+    login_user(student)
+
+    resp = submit(client, task, [(io.BytesIO(b"x" * 4096), "duzy.pdf")])
+
+    assert resp.status_code == 413
+    assert TaskAttachment.query.count() == 0
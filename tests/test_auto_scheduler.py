@@ -0,0 +1,135 @@
+import json
+from datetime import date, time
+from flask_login import login_user
+from app import db
+from app.models import Administrator, LessonException, LessonSeries, Student, Teacher
+from app.auto_scheduler import PlacementRequest, load_busy, solve, slot_mask
+from app.commands import schedule_batch_command
+
+
+def no_overlaps(placements):
+    for i, a in enumerate(placements):
+        for b in placements[i + 1:]:
+            shared = {a.request.teacher_id} & {b.request.teacher_id} or {a.request.student_id} & {b.request.student_id}
+            if shared and a.day_of_week == b.day_of_week:
+                if a.start_minute < b.end_minute and b.start_minute < a.end_minute:
+                    return False
+    return True
+
+
+def test_solve_places_requests_without_conflicts():
+    requests = [
+        PlacementRequest(student_id=s, teacher_id=1, duration=60, days=(0,), earliest=16 * 60, latest=19 * 60)
+        for s in range(3)
+    ]
+    placements, unplaced = solve(requests)
+    assert unplaced == []
+    assert sorted(p.start_minute for p in placements) == [16 * 60, 17 * 60, 18 * 60]
+    assert no_overlaps(placements)
+
+
+def test_solve_reports_unplaceable_requests():
+    requests = [
+        PlacementRequest(student_id=s, teacher_id=1, duration=60, days=(0,), earliest=16 * 60, latest=17 * 60)
+        for s in range(2)
+    ]
+    placements, unplaced = solve(requests)
+    assert len(placements) == 1
+    assert len(unplaced) == 1
+
+
+def test_solve_respects_existing_schedule():
+    busy = {('student', 1): slot_mask(2, 16 * 60, 17 * 60)}
+    requests = [PlacementRequest(student_id=1, teacher_id=1, duration=60, days=(2,), earliest=16 * 60, latest=18 * 60)]
+    placements, unplaced = solve(requests, busy)
+    assert unplaced == []
+    assert placements[0].start_minute == 17 * 60
+
+
+def test_load_busy_includes_moved_occurrences(app):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    series = LessonSeries(
+        teacher_id=teacher.id, student_id=student.id, day_of_week=0,
+        start_time=time(16, 0), end_time=time(17, 0),
+        start_date=date(2025, 6, 2), end_date=date(2025, 6, 30)
+    )
+    db.session.add(series)
+    db.session.flush()
+    db.session.add(LessonException(series_id=series.id, date=date(2025, 6, 30), moved_date=date(2025, 9, 3)))
+    db.session.commit()
+    request = PlacementRequest(student_id=student.id, teacher_id=teacher.id, duration=60, days=(2,),
+                               earliest=16 * 60, latest=18 * 60)
+
+    busy = load_busy([request], date(2025, 9, 1), date(2026, 1, 31))
+
+    assert busy == {('teacher', teacher.id): slot_mask(2, 16 * 60, 17 * 60),
+                    ('student', student.id): slot_mask(2, 16 * 60, 17 * 60)}
+
+
+def test_auto_schedule_endpoint_writes_series(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    db.session.add(LessonSeries(
+        teacher_id=teacher.id, student_id=student.id, day_of_week=0,
+        start_time=time(16, 0), end_time=time(17, 0),
+        start_date=date(2025, 9, 1), end_date=date(2026, 6, 30)
+    ))
+    db.session.commit()
+
+    login_user(Administrator.query.filter_by(email="admin@example.com").first())
+    resp = client.post("/lesson/auto-schedule", json={
+        "start_date": "2025-09-01",
+        "end_date": "2026-01-31",
+        "requests": [
+            {"student_id": student.id, "teacher_id": teacher.id, "duration": 60,
+             "days": [0], "earliest": "16:00", "latest": "18:00"},
+            {"student_id": student.id, "teacher_id": teacher.id, "duration": 45,
+             "days": [0], "earliest": "16:00", "latest": "18:00"}
+        ]
+    })
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["unplaced"] == [1]
+    assert data["placed"] == [{
+        "student_id": student.id, "teacher_id": teacher.id,
+        "day_of_week": 0, "start_time": "17:00", "end_time": "18:00"
+    }]
+    assert LessonSeries.query.count() == 2
+
+
+def test_auto_schedule_endpoint_validates_input(client):
+    login_user(Administrator.query.filter_by(email="admin@example.com").first())
+    resp = client.post("/lesson/auto-schedule", json={
+        "start_date": "2025-09-01",
+        "end_date": "2026-01-31",
+        "requests": [{"student_id": 1, "teacher_id": 1, "duration": 50}]
+    })
+    assert resp.status_code == 400
+
+
+def test_auto_schedule_endpoint_rejects_non_object_body(client):
+    login_user(Administrator.query.filter_by(email="admin@example.com").first())
+    for body in ([{"start_date": "2025-09-01"}], "2025-09-01", 7):
+        resp = client.post("/lesson/auto-schedule", json=body)
+        assert resp.status_code == 400
+        assert "error" in resp.get_json()
+
+
+def test_schedule_batch_cli(app, tmp_path):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    requests_file = tmp_path / "requests.json"
+    requests_file.write_text(json.dumps([
+        {"student_id": student.id, "teacher_id": teacher.id, "duration": 90, "days": [3]}
+    ]))
+
+    result = app.test_cli_runner().invoke(schedule_batch_command, [
+        str(requests_file), "--start-date", "2025-09-01", "--end-date", "2026-01-31"
+    ])
+    assert result.exit_code == 0, result.output
+    assert "Rozmieszczono: 1" in result.output
+    series = LessonSeries.query.one()
+    assert series.day_of_week == 3
+    assert series.start_time == time(7, 0)
+    assert series.end_time == time(8, 30)
@@ -1,5 +1,8 @@
 import pytest
-from app.models import Message, Student, Teacher
+from sqlalchemy import text
+from app import db, socketio
+from app.chat import conversation_page, index_conversations
+from app.models import Administrator, Message, Student, Teacher
 from flask_login import login_user
 
 
@@ -98,4 +101,174 @@ def test_chat_send_message(client):
     assert msg.sender_role == "student"
 
     html = resp.get_data(as_text=True)
-    assert "Nowa wiadomość testowa" in html
\ No newline at end of file
+    assert "Nowa wiadomość testowa" in html
+
+# 5. Czat na żywo (Socket.IO)
+
+
+def users():
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    return student, teacher
+
+
+def connect(app, user, student, teacher):
+    login_user(user)
+    return socketio.test_client(app, namespace="/chat",
+                                auth={"student_id": student.id, "teacher_id": teacher.id})
+
+
+def test_socket_message_is_persisted_and_pushed_to_pair(app):
+    student, teacher = users()
+    student_socket = connect(app, student, student, teacher)
+    teacher_socket = connect(app, teacher, student, teacher)
+    assert student_socket.is_connected("/chat") and teacher_socket.is_connected("/chat")
+
+    ack = student_socket.emit("send", {"content": " Dzień dobry "}, namespace="/chat", callback=True)
+
+    msg = db.session.query(Message).one()
+    assert ack == {"id": msg.id}
+    assert (msg.content, msg.sender_role, msg.receiver_id) == ("Dzień dobry", "student", teacher.id)
+    for sock in (student_socket, teacher_socket):
+        received = sock.get_received("/chat")
+        assert [(r["name"], r["args"][0]["content"]) for r in received] == [("new_message", "Dzień dobry")]
+
+
+def test_socket_rejects_non_participants(app):
+    student, teacher = users()
+    other = Student(name="Ola", surname="Inna", email="inna@example.com", password="x", approved=True)
+    db.session.add(other)
+    db.session.commit()
+
+    assert not connect(app, other, student, teacher).is_connected("/chat")
+    assert not connect(app, db.session.query(Administrator).first(), student, teacher).is_connected("/chat")
+    # uczeń bez przypisania do nauczyciela
+    assert not connect(app, other, other, teacher).is_connected("/chat")
+    login_user(student)
+    assert not socketio.test_client(app, namespace="/chat", auth={"student_id": "x"}).is_connected("/chat")
+
+
+def test_socket_rejects_invalid_message(app):
+    student, teacher = users()
+    sock = connect(app, student, student, teacher)
+
+    ack = sock.emit("send", {"content": "x" * 501}, namespace="/chat", callback=True)
+
+    assert "error" in ack
+    assert db.session.query(Message).count() == 0
+    assert sock.get_received("/chat") == []
+
+
+def test_form_post_is_pushed_to_connected_participant(client, app):
+    student, teacher = users()
+    teacher_socket = connect(app, teacher, student, teacher)
+    login_user(student)
+
+    client.post(f"/chat/{student.id}/{teacher.id}/student", data={"message": "Z formularza"})
+
+    received = teacher_socket.get_received("/chat")
+    assert [r["args"][0]["content"] for r in received] == ["Z formularza"]
+
+
+def test_chat_page_forbidden_for_other_users(client):
+    student, teacher = users()
+    login_user(student)
+
+    assert client.get(f"/chat/{student.id}/{teacher.id}/teacher").status_code == 403
+    login_user(teacher)
+    assert client.get(f"/chat/{student.id}/{teacher.id}/teacher").status_code == 200
+
+
+# 6. Historia stronicowana kursorem
+
+
+def add_messages(student, teacher, count):
+    db.session.add_all(Message(
+        sender_id=student.id if i % 2 else teacher.id,
+        receiver_id=teacher.id if i % 2 else student.id,
+        sender_role="student" if i % 2 else "teacher",
+        receiver_role="teacher" if i % 2 else "student",
+        content=f"wiadomość {i}"
+    ) for i in range(count))
+    db.session.commit()
+
+
+def test_messages_share_conversation_key_in_both_directions(app):
+    student, teacher = users()
+    add_messages(student, teacher, 2)
+    add_messages(Student(id=99), teacher, 1)
+
+    keys = [m.conversation_id for m in db.session.query(Message).order_by(Message.id)]
+    assert keys == [f"{student.id}-{teacher.id}"] * 2 + [f"99-{teacher.id}"]
+
+
+def test_chat_page_renders_latest_page_and_older_pages_load_by_cursor(client, app):
+    app.config["CHAT_PAGE_SIZE"] = 20
+    student, teacher = users()
+    add_messages(student, teacher, 45)
+    login_user(student)
+
+    html = client.get(f"/chat/{student.id}/{teacher.id}/student").get_data(as_text=True)
+    assert html.count('class="chat__message ') == 20
+    assert "wiadomość 44" in html and "wiadomość 25" in html and "wiadomość 24" not in html
+
+    seen, before = [], None
+    while True:
+        query = f"?before={before}" if before else ""
+        page = client.get(f"/chat/{student.id}/{teacher.id}/messages{query}").get_json()
+        seen[:0] = [m["content"] for m in page["messages"]]
+        before = page["before"]
+        if before is None:
+            break
+    assert seen == [f"wiadomość {i}" for i in range(45)]
+
+    limited = client.get(f"/chat/{student.id}/{teacher.id}/messages?limit=1000").get_json()
+    assert len(limited["messages"]) == 45 and limited["before"] is None
+
+
+def test_conversation_page_cursor_is_exact(app):
+    student, teacher = users()
+    add_messages(student, teacher, 10)
+
+    first, before = conversation_page(student.id, teacher.id, limit=5)
+    second, last = conversation_page(student.id, teacher.id, before=before, limit=5)
+
+    assert [m.content for m in first] == [f"wiadomość {i}" for i in range(5, 10)]
+    assert [m.content for m in second] == [f"wiadomość {i}" for i in range(5)]
+    assert last is None
+
+
+def test_history_endpoint_forbidden_outside_pair(client):
+    student, teacher = users()
+    login_user(db.session.query(Administrator).first())
+
+    assert client.get(f"/chat/{student.id}/{teacher.id}/messages").status_code == 403
+
+
+def test_history_query_uses_conversation_index(app):
+    plan = db.session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT * FROM messages WHERE conversation_id = '1-1' AND id < 10 ORDER BY id DESC LIMIT 51"
+    )).all()
+
+    detail = " ".join(row[-1] for row in plan)
+    assert "ix_messages_conversation" in detail and "TEMP B-TREE" not in detail
+
+
+def test_index_conversations_backfills_legacy_table(app):
+    student, teacher = users()
+    db.session.execute(text("DROP TABLE messages"))
+    db.session.execute(text(
+        "CREATE TABLE messages (id INTEGER PRIMARY KEY, sender_id INTEGER NOT NULL, receiver_id INTEGER NOT NULL, "
+        "sender_role VARCHAR(20) NOT NULL, receiver_role VARCHAR(20) NOT NULL, content TEXT NOT NULL, timestamp DATETIME)"
+    ))
+    for i in range(5):
+        db.session.execute(text(
+            "INSERT INTO messages (sender_id, receiver_id, sender_role, receiver_role, content) VALUES (:s, :r, :sr, :rr, :c)"
+        ), {"s": student.id if i % 2 else teacher.id, "r": teacher.id if i % 2 else student.id,
+            "sr": "student" if i % 2 else "teacher", "rr": "teacher" if i % 2 else "student", "c": f"stara {i}"})
+    db.session.commit()
+
+    assert index_conversations(batch_size=2) == 5
+    assert index_conversations() == 0
+    messages, before = conversation_page(student.id, teacher.id)
+    assert [m.content for m in messages] == [f"stara {i}" for i in range(5)] and before is None
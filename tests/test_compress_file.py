@@ -0,0 +1,69 @@
+import os
+from PIL import Image
+from app.utils import compress_file
+
+
+def noise(size):
+    return Image.effect_noise(size, 48).convert('RGB')
+
+
+def test_large_jpeg_is_downscaled(tmp_path):
+    path = str(tmp_path / "zdjecie.jpg")
+    noise((1600, 1200)).save(path, 'JPEG', quality=95)
+    before = os.path.getsize(path)
+
+    assert compress_file(path, max_edge=800)
+
+    with Image.open(path) as img:
+        assert img.size == (800, 600)
+    assert os.path.getsize(path) < before
+
+
+def test_exif_orientation_is_applied(tmp_path):
+    path = str(tmp_path / "obrocone.jpg")
+    exif = Image.Exif()
+    exif[0x0112] = 6  # obrót o 90° w prawo
+    noise((400, 200)).save(path, 'JPEG', quality=100, exif=exif)
+
+    assert compress_file(path)
+
+    with Image.open(path) as img:
+        assert img.size == (200, 400)
+        assert img.getexif().get(0x0112) is None
+
+
+def test_large_png_photo_is_quantized(tmp_path):
+    path = str(tmp_path / "skan.png")
+    noise((600, 600)).save(path, 'PNG')
+    before = os.path.getsize(path)
+
+    assert compress_file(path)
+
+    with Image.open(path) as img:
+        assert img.mode == 'P'
+    assert os.path.getsize(path) < before
+
+
+def test_original_kept_when_not_smaller(tmp_path):
+    path = str(tmp_path / "ikona.png")
+    Image.new('P', (16, 16)).save(path, 'PNG', optimize=True)
+    with open(path, 'rb') as f:
+        original = f.read()
+
+    assert not compress_file(path)
+
+    with open(path, 'rb') as f:
+        assert f.read() == original
+    assert os.listdir(tmp_path) == ["ikona.png"]
+
+
+def test_non_images_and_broken_files_are_left_alone(tmp_path, caplog):
+    pdf = tmp_path / "praca.pdf"
+    pdf.write_bytes(b"%PDF")
+    broken = tmp_path / "zepsuty.jpg"
+    broken.write_bytes(b"to nie jest obraz")
+
+    assert not compress_file(str(pdf))
+    assert not compress_file(str(broken))
+    assert broken.read_bytes() == b"to nie jest obraz"
+    assert "zepsuty.jpg" in caplog.text
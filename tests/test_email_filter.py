@@ -0,0 +1,107 @@
+import threading
+import time
+from app import db
+from app.models import Account, Student
+from app.email_filter import BloomFilter, TokenBucket, get_email_lookup
+import app.email_filter as email_filter
+
+
+def check(client, email):
+    return client.get(f"/check_email?email={email}")
+
+
+def test_bloom_filter_has_no_false_negatives():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    members = [f"uczen{i}@example.com" for i in range(1000)]
+    for email in members:
+        bloom.add(email)
+
+    assert all(email in bloom for email in members)
+    false_positives = sum(f"obcy{i}@example.com" in bloom for i in range(10000))
+    assert false_positives < 300
+
+
+def test_unknown_email_answered_without_query(client, count_queries):
+    assert check(client, "student@example.com").get_json() == {"exists": True}
+
+    with count_queries() as statements:
+        assert check(client, "nowy@example.com").get_json() == {"exists": False}
+    assert statements == []
+    assert get_email_lookup().stats()['negative'] == 1
+
+
+def test_filter_follows_register_and_delete(client):
+    assert check(client, "nowy@example.com").get_json() == {"exists": False}
+    client.post("/register", data={"role": "student", "name": "Adam", "surname": "Nowy",
+                                   "email": "nowy@example.com", "password": "haslo123", "subject": ""})
+    assert check(client, "nowy@example.com").get_json() == {"exists": True}
+
+    db.session.delete(db.session.query(Student).filter_by(email="nowy@example.com").one())
+    db.session.commit()
+
+    assert check(client, "nowy@example.com").get_json() == {"exists": False}
+    stats = get_email_lookup().stats()
+    assert (stats['stale'], stats['false_positives']) == (1, 1)
+
+
+def test_filter_picks_up_accounts_added_by_other_workers(app, count_queries):
+    lookup = get_email_lookup()
+    lookup.refresh_interval = 60
+    assert not lookup.exists("z-innego-procesu@example.com")
+
+    # wiersz zapisany z pominięciem zdarzeń ORM, jak przez inny proces serwera
+    db.session.execute(Account.__table__.insert().values(email="z-innego-procesu@example.com",
+                                                         role="student", user_id=999))
+    db.session.commit()
+    with count_queries() as statements:
+        assert not lookup.exists("z-innego-procesu@example.com")
+    assert statements == []  # przed upływem refresh_interval filtr nie pyta bazy
+
+    lookup._checked -= 60
+    assert lookup.exists("z-innego-procesu@example.com")
+    stats = lookup.stats()
+    assert (stats['synced'], stats['rebuilds']) == (1, 1)
+
+    lookup._built -= lookup.max_age
+    lookup.exists("nowy@example.com")
+    assert lookup.stats()['rebuilds'] == 2
+
+
+def test_rate_limit_per_client(client, app):
+    get_email_lookup().limiter = TokenBucket(rate=0.5, burst=2)
+
+    assert check(client, "a@example.com").status_code == 200
+    assert check(client, "b@example.com").status_code == 200
+    resp = check(client, "c@example.com")
+
+    assert resp.status_code == 429
+    assert resp.headers["Retry-After"] == "2"
+    other = client.get("/check_email?email=c@example.com", environ_base={"REMOTE_ADDR": "10.0.0.2"})
+    assert other.status_code == 200
+
+
+def test_identical_lookups_are_coalesced(app, monkeypatch):
+    lookup = get_email_lookup()
+    lookup.exists("rozgrzewka@example.com")  # budowa filtra w wątku testu
+    release, calls, results = threading.Event(), [], []
+
+    def slow_email_taken(email):
+        calls.append(email)
+        release.wait(5)
+        return True
+
+    monkeypatch.setattr(email_filter, "email_taken", slow_email_taken)
+    threads = [threading.Thread(target=lambda: results.append(lookup.exists("student@example.com")))
+               for _ in range(5)]
+    for t in threads:
+        t.start()
+    deadline = time.monotonic() + 5
+    while lookup.stats()['coalesced'] < 4 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert calls == ["student@example.com"]
+    assert results == [True] * 5
+    assert lookup.stats()['coalesced'] == 4
@@ -0,0 +1,98 @@
+from datetime import date, time
+from flask_login import login_user
+from app import db
+from app.models import LessonException, LessonSeries, Student, Teacher
+from app.ical import fold
+
+
+def make_series(day_of_week, start_date=None, end_date=None):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    series = LessonSeries(
+        teacher_id=teacher.id,
+        student_id=student.id,
+        day_of_week=day_of_week,
+        start_time=time(16, 0),
+        end_time=time(17, 30),
+        start_date=start_date,
+        end_date=end_date
+    )
+    db.session.add(series)
+    db.session.commit()
+    return series
+
+
+def unfold(body):
+    return body.replace("\r\n ", "").split("\r\n")
+
+
+def test_teacher_ics_feed_one_event_per_series(client):
+    s = make_series(2, date(2025, 9, 1), date(2026, 1, 31))
+    resp = client.get(f"/teacher/{s.teacher_id}/lessons.ics")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/calendar"
+
+    lines = unfold(resp.get_data(as_text=True))
+    assert lines[0] == "BEGIN:VCALENDAR"
+    assert lines.count("BEGIN:VEVENT") == 1
+    assert f"UID:series-{s.id}@localhost" in lines
+    assert "SUMMARY:Jan Kowalski" in lines
+    assert "DTSTART:20250903T160000" in lines
+    assert "DTEND:20250903T173000" in lines
+    assert "RRULE:FREQ=WEEKLY;BYDAY=WE;UNTIL=20260131T235959" in lines
+
+
+def test_ics_feed_contains_exceptions(client):
+    s = make_series(0, date(2025, 9, 1))
+    login_user(db.session.get(Teacher, s.teacher_id))
+    client.delete(f"/lesson/delete/series-{s.id}-2025-09-08")
+    client.post(f"/lesson/move/series-{s.id}-2025-09-15", json={"date": "2025-09-16", "start_time": "10:00"})
+
+    lines = unfold(client.get(f"/student/{s.student_id}/lessons.ics").get_data(as_text=True))
+    assert "RRULE:FREQ=WEEKLY;BYDAY=MO" in lines
+    assert "EXDATE:20250908T160000" in lines
+    assert lines.count("BEGIN:VEVENT") == 2
+    assert "RECURRENCE-ID:20250915T160000" in lines
+    assert "DTSTART:20250916T100000" in lines
+    assert "DTEND:20250916T173000" in lines
+
+
+def test_ics_conditional_get_needs_only_fingerprint_query(client, count_queries):
+    s = make_series(4)
+    url = f"/student/{s.student_id}/lessons.ics"
+    first = client.get(url)
+    assert first.status_code == 200
+
+    with count_queries() as statements:
+        second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert len(statements) == 1
+
+    login_user(db.session.get(Student, s.student_id))
+    client.delete(f"/lesson/delete/series-{s.id}?scope=series")
+    third = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert third.status_code == 200
+    assert "BEGIN:VEVENT" not in third.get_data(as_text=True)
+
+
+def test_ics_etag_follows_database_not_process_state(client):
+    s = make_series(0, date(2025, 9, 1))
+    url = f"/teacher/{s.teacher_id}/lessons.ics"
+    first = client.get(url)
+
+    # zmiana zapisana bez lessons_changed(), jak z innego procesu serwera
+    db.session.add(LessonException(series_id=s.id, date=date(2025, 9, 8), cancelled=True))
+    db.session.commit()
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert "EXDATE:20250908T160000" in unfold(second.get_data(as_text=True))
+    assert client.get(url, headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+
+def test_fold_long_lines():
+    line = "SUMMARY:" + "Zażółć gęślą jaźń " * 10
+    folded = fold(line)
+    physical = folded.rstrip("\r\n").split("\r\n")
+    assert all(len(p.encode("utf-8")) <= 75 for p in physical)
+    assert folded.replace("\r\n ", "").rstrip("\r\n") == line
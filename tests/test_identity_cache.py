@@ -0,0 +1,78 @@
+from flask import g
+from flask_login import login_user
+from app import db
+from app.models import Student, Administrator
+from app.identity_cache import IdentityCache, get_identity_cache
+from app.accounts import cached_account_user
+
+
+def test_cached_lookup_skips_user_query(app, count_queries):
+    student_id = db.session.query(Student).filter_by(email="student@example.com").one().id
+    assert cached_account_user('student', str(student_id)).email == "student@example.com"
+    db.session.remove()  # kolejne żądanie = nowa sesja
+
+    with count_queries() as statements:
+        student = cached_account_user('student', str(student_id))
+
+    assert student.email == "student@example.com"
+    assert statements == []
+    assert student in db.session
+    assert [t.email for t in student.teachers] == ["teacher@example.com"]
+    assert get_identity_cache().stats()['hits'] == 1
+
+
+def test_cached_user_serves_dashboard(client):
+    resp = client.post("/login", data={"email": "student@example.com", "password": "haslo123"})
+    assert resp.status_code == 302
+
+    for _ in range(2):
+        g.pop('_login_user', None)  # klient testowy dzieli g z kontekstem fixture'a
+        resp = client.get("/dashboard")
+        assert resp.status_code == 200
+        assert b"Anna Nowak" in resp.data
+
+    stats = get_identity_cache().stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+
+def test_admin_delete_invalidates_cached_student(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").one()
+    student_id = student.id
+    cached_account_user('student', student_id)
+    login_user(db.session.query(Administrator).one())
+
+    client.post("/admin/dashboard", data={"action": "delete_student", "student_id": student_id})
+
+    assert cached_account_user('student', student_id) is None
+    assert get_identity_cache().stats()['invalidations'] == 1
+
+
+def test_hit_ratio_in_admin_stats(client):
+    admin = db.session.query(Administrator).one()
+    for _ in range(4):
+        cached_account_user('administrator', admin.id)
+    login_user(admin)
+
+    stats = client.get("/admin/stats").get_json()['identity_cache']
+
+    assert (stats['hits'], stats['misses'], stats['hit_ratio']) == (3, 1, 0.75)
+
+
+def test_lru_eviction_and_ttl(app):
+    admin = db.session.query(Administrator).one()
+    students = [Student(name=f"Uczen{i}", surname="Test", email=f"u{i}@example.com", password="x")
+                for i in range(3)]
+    db.session.add_all(students)
+    db.session.commit()
+
+    cache = IdentityCache(max_entries=2, ttl=60)
+    for s in students:
+        cache.put('student', s)
+    assert cache.get('student', students[0].id) is None
+    assert cache.get('student', students[2].id).email == "u2@example.com"
+    assert cache.stats()['evictions'] == 1
+
+    expiring = IdentityCache(ttl=0)
+    expiring.put('administrator', admin)
+    assert expiring.get('administrator', admin.id) is None
+    assert expiring.stats()['expired'] == 1
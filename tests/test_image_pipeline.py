@@ -0,0 +1,111 @@
+import io
+import os
+import pytest
+from datetime import datetime
+from PIL import Image
+from flask_login import login_user
+from app import db
+from app.models import Task, Student, Teacher
+from app.storage import blob_path
+from app.image_pipeline import ImageOptimizer
+
+
+@pytest.fixture
+def optimizer(app):
+    def install(**kwargs):
+        instance = ImageOptimizer(app, **kwargs)
+        app.extensions['image_optimizer'] = instance
+        created.append(instance)
+        return instance
+
+    created = []
+    yield install
+    for instance in created:
+        instance.shutdown()
+
+
+def photo():
+    buf = io.BytesIO()
+    Image.effect_noise((256, 256), 64).convert('RGB').save(buf, 'JPEG', quality=100)
+    buf.seek(0)
+    return buf
+
+
+def submit_photo(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="Zdjęcie", due_date=datetime(2030, 1, 1), max_points=5,
+                student_id=student.id, teacher_id=teacher.id)
+    db.session.add(task)
+    db.session.commit()
+    login_user(student)
+
+    original = photo().getvalue()
+    resp = client.post(
+        f"/submit-task/{task.id}",
+        data={"answer": "Zdjęcie rozwiązania", "attachments": [(io.BytesIO(original), "kartka.jpg")]},
+        content_type="multipart/form-data"
+    )
+    assert resp.status_code == 302
+    return task.id, len(original)
+
+
+def test_inline_optimizer_replaces_blob(client, uploads, optimizer):
+    opt = optimizer(workers=0)
+    task_id, original_size = submit_photo(client)
+
+    attachment = db.session.get(Task, task_id).student_files[0]
+    assert attachment.status == 'ready'
+    assert attachment.size < original_size
+    assert os.path.getsize(blob_path(attachment.sha256)) == attachment.size
+    assert opt.stats()['completed'] == 1
+
+
+def test_pool_optimizes_in_background(client, uploads, optimizer):
+    opt = optimizer(workers=1, max_pending=4)
+    task_id, original_size = submit_photo(client)
+
+    assert opt.wait(timeout=30)
+    db.session.expire_all()
+    attachment = db.session.get(Task, task_id).student_files[0]
+    assert attachment.status == 'ready'
+    assert attachment.size < original_size
+
+    stats = opt.stats()
+    assert stats['submitted'] == 1
+    assert stats['completed'] == 1
+    assert stats['queue_depth'] == 0
+    assert stats['max_depth'] == 1
+
+
+def test_full_queue_keeps_original(client, uploads, optimizer):
+    opt = optimizer(workers=1, max_pending=1, submit_timeout=0)
+    opt._slots.acquire()
+    try:
+        task_id, original_size = submit_photo(client)
+    finally:
+        opt._slots.release()
+
+    attachment = db.session.get(Task, task_id).student_files[0]
+    assert attachment.status == 'ready'
+    assert attachment.size == original_size
+    assert opt.stats()['rejected'] == 1
+    assert opt.stats()['submitted'] == 0
+
+
+def test_non_images_skip_pipeline(client, uploads, optimizer):
+    opt = optimizer(workers=0)
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="PDF", due_date=datetime(2030, 1, 1), max_points=5,
+                student_id=student.id, teacher_id=teacher.id)
+    db.session.add(task)
+    db.session.commit()
+    login_user(student)
+
+    client.post(f"/submit-task/{task.id}",
+                data={"answer": "PDF", "attachments": [(io.BytesIO(b"%PDF"), "praca.pdf")]},
+                content_type="multipart/form-data")
+
+    assert db.session.get(Task, task.id).student_files[0].status == 'ready'
+    assert opt.stats()['submitted'] == 0
@@ -0,0 +1,313 @@
+from datetime import date, time
+from flask_login import login_user
+from app import db
+from app.models import LessonSeries, LessonException, Student, Teacher
+from app.recurrence import occurrence_dates, expand_series, occurrences
+
+
+def make_series(day_of_week, start_date=None, end_date=None):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    series = LessonSeries(
+        teacher_id=teacher.id,
+        student_id=student.id,
+        day_of_week=day_of_week,
+        start_time=time(16, 0),
+        end_time=time(17, 0),
+        start_date=start_date,
+        end_date=end_date
+    )
+    db.session.add(series)
+    db.session.commit()
+    return series
+
+
+def test_occurrences_step_by_week(client):
+    # 2025-09-01 to poniedziałek, seria w środy
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    dates = list(occurrence_dates(s, date(2025, 9, 1), date(2025, 9, 30)))
+    assert dates == [date(2025, 9, 3), date(2025, 9, 10), date(2025, 9, 17), date(2025, 9, 24)]
+
+
+def test_occurrences_clamped_to_series_dates(client):
+    s = make_series(0, date(2025, 9, 8), date(2025, 9, 22))
+    dates = list(occurrence_dates(s, date(2025, 9, 1), date(2025, 12, 31)))
+    assert dates == [date(2025, 9, 8), date(2025, 9, 15), date(2025, 9, 22)]
+
+
+def test_occurrences_with_null_dates(client):
+    """Seria bez dat początku/końca obowiązuje w całym zakresie zapytania."""
+    s = make_series(4)
+    dates = list(occurrence_dates(s, date(2025, 9, 1), date(2025, 9, 14)))
+    assert dates == [date(2025, 9, 5), date(2025, 9, 12)]
+
+
+def test_expand_series_matches_daily_loop(client):
+    series = [make_series(d, date(2025, 9, 1), date(2025, 11, 30)) for d in range(7)]
+    start, end = date(2025, 8, 15), date(2025, 10, 15)
+
+    expected = []
+    for s in series:
+        d = max(start, s.start_date)
+        while d <= min(end, s.end_date):
+            if d.weekday() == s.day_of_week:
+                expected.append((s.id, d))
+            d = date.fromordinal(d.toordinal() + 1)
+
+    got = [(s.id, d) for s, d in expand_series(series, start, end)]
+    assert sorted(got) == sorted(expected)
+
+
+def test_occurrences_apply_exceptions(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    cancelled = LessonException(series_id=s.id, date=date(2025, 9, 10), cancelled=True)
+    moved = LessonException(series_id=s.id, date=date(2025, 9, 17), moved_date=date(2025, 9, 18),
+                            moved_start_time=time(8, 0), moved_end_time=time(9, 0))
+    exceptions = {e.date: e for e in (cancelled, moved)}
+
+    got = list(occurrences(s, date(2025, 9, 1), date(2025, 9, 30), exceptions))
+    assert got == [
+        (date(2025, 9, 3), date(2025, 9, 3), time(16, 0), time(17, 0)),
+        (date(2025, 9, 24), date(2025, 9, 24), time(16, 0), time(17, 0)),
+        (date(2025, 9, 17), date(2025, 9, 18), time(8, 0), time(9, 0)),
+    ]
+
+
+def test_teacher_lessons_endpoint(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    resp = client.get(f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-14")
+    assert resp.status_code == 200
+    events = resp.get_json()
+    assert [e["id"] for e in events] == [f"series-{s.id}-2025-09-03", f"series-{s.id}-2025-09-10"]
+    assert events[0]["title"] == "Jan Kowalski"
+    assert events[0]["start"] == "2025-09-03T16:00:00"
+
+
+def test_student_lessons_endpoint_without_dates(client):
+    s = make_series(1)
+    resp = client.get(f"/student/{s.student_id}/lessons?start=2025-09-01&end=2025-09-07")
+    assert resp.status_code == 200
+    events = resp.get_json()
+    assert len(events) == 1
+    assert events[0]["id"] == f"series-{s.id}-2025-09-02"
+    assert "Matematyka" in events[0]["title"]
+
+
+def test_lessons_endpoints_query_count_independent_of_range(client, count_queries):
+    """Liczba zapytań SQL nie zależy od liczby serii ani szerokości zakresu."""
+    series = [make_series(d % 7, date(2025, 1, 1), date(2025, 12, 31)) for d in range(10)]
+    teacher_id, student_id = series[0].teacher_id, series[0].student_id
+    db.session.expire_all()
+
+    counts = []
+    for url in (f"/teacher/{teacher_id}/lessons", f"/student/{student_id}/lessons"):
+        for start, end in (("2025-09-01", "2025-09-07"), ("2025-01-01", "2025-12-31")):
+            with count_queries() as statements:
+                resp = client.get(f"{url}?start={start}&end={end}")
+            assert resp.status_code == 200
+            assert len(resp.get_json()) > 0
+            counts.append(len(statements))
+
+    # skrót planu (ETag) + serie z osobą + wyjątki serii
+    assert counts == [3, 3, 3, 3]
+
+
+def test_lessons_etag_not_modified(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-30"
+
+    first = client.get(url)
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert "Last-Modified" not in first.headers
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 304
+    assert client.get(url).get_data() == first.get_data()
+
+    # 304 nie sięga do cache, trzecie zapytanie to trafienie
+    cache = client.application.extensions["calendar_cache"]
+    assert cache.hits == 1
+    assert cache.misses == 1
+
+
+def test_cached_calendar_follows_changes_from_other_processes(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-30"
+    first = client.get(url)
+    assert len(first.get_json()) == 4
+
+    # seria zapisana bez lessons_changed(), jak z innego procesu serwera
+    db.session.add(LessonSeries(teacher_id=s.teacher_id, student_id=s.student_id, day_of_week=4,
+                                start_time=time(10, 0), end_time=time(11, 0),
+                                start_date=date(2025, 9, 1), end_date=date(2025, 9, 30)))
+    db.session.commit()
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert len(second.get_json()) == 8
+    assert client.get(url, headers={"If-None-Match": second.headers["ETag"]}).status_code == 304
+
+
+def test_assign_lesson_invalidates_calendar(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/student/{s.student_id}/lessons?start=2025-09-01&end=2025-09-30"
+    first = client.get(url)
+    assert len(first.get_json()) == 4
+
+    resp = client.post(f"/lesson/assign/{s.student_id}/{s.teacher_id}", data={
+        "day_of_week": 4,
+        "start_time": "10:00",
+        "end_time": "11:00",
+        "start_date": "2025-09-01",
+        "end_date": "2025-09-30"
+    })
+    assert resp.status_code == 302
+
+    second = client.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert len(second.get_json()) == 8
+
+
+def test_delete_lesson_cancels_single_occurrence(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-30"
+    assert len(client.get(url).get_json()) == 4
+    login_user(db.session.get(Teacher, s.teacher_id))
+
+    resp = client.delete(f"/lesson/delete/series-{s.id}-2025-09-10")
+    assert resp.status_code == 204
+    assert db.session.get(LessonSeries, s.id) is not None
+    ids = [e["id"] for e in client.get(url).get_json()]
+    assert ids == [f"series-{s.id}-2025-09-03", f"series-{s.id}-2025-09-17", f"series-{s.id}-2025-09-24"]
+
+
+def test_delete_lesson_rejects_date_outside_series(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    login_user(db.session.get(Teacher, s.teacher_id))
+    assert client.delete(f"/lesson/delete/series-{s.id}-2025-09-11").status_code == 400
+    assert client.delete(f"/lesson/delete/series-{s.id}-2025-10-01").status_code == 400
+
+
+def test_delete_whole_series(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-30"
+    assert len(client.get(url).get_json()) == 4
+    login_user(db.session.get(Student, s.student_id))
+    client.delete(f"/lesson/delete/series-{s.id}-2025-09-10")
+
+    resp = client.delete(f"/lesson/delete/series-{s.id}-2025-09-03?scope=series")
+    assert resp.status_code == 204
+    assert client.get(url).get_json() == []
+    assert LessonException.query.count() == 0
+
+
+def test_delete_lesson_requires_owner(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/lesson/delete/series-{s.id}?scope=series"
+
+    assert client.delete(url).status_code == 302
+    other = Teacher(name="Ewa", surname="Nowa", email="ewa@example.com", password="x", subject="Fizyka", approved=True)
+    db.session.add(other)
+    db.session.commit()
+    login_user(other)
+    assert client.delete(url).status_code == 403
+    assert client.delete(f"/lesson/delete/series-{s.id}-2025-09-10").status_code == 403
+    assert db.session.get(LessonSeries, s.id) is not None
+    assert LessonException.query.count() == 0
+
+    login_user(db.session.get(Teacher, s.teacher_id))
+    assert client.delete(url).status_code == 204
+
+
+def test_move_lesson_occurrence(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    login_user(db.session.get(Student, s.student_id))
+
+    resp = client.post(f"/lesson/move/series-{s.id}-2025-09-10", json={
+        "date": "2025-10-02",
+        "start_time": "18:00",
+        "end_time": "19:00"
+    })
+    assert resp.status_code == 204
+
+    september = client.get(f"/student/{s.student_id}/lessons?start=2025-09-01&end=2025-09-30").get_json()
+    assert f"series-{s.id}-2025-09-10" not in [e["id"] for e in september]
+
+    # przeniesione wystąpienie pojawia się w zakresie, w którym nie ma już zwykłych wystąpień serii
+    october = client.get(f"/student/{s.student_id}/lessons?start=2025-10-01&end=2025-10-31").get_json()
+    assert october == [{
+        "id": f"series-{s.id}-2025-09-10",
+        "title": " Matematyka",
+        "start": "2025-10-02T18:00:00",
+        "end": "2025-10-02T19:00:00"
+    }]
+
+
+def test_move_lesson_requires_owner(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/lesson/move/series-{s.id}-2025-09-10"
+    body = {"date": "2025-09-11"}
+
+    assert client.post(url, json=body).status_code == 302
+    other = Teacher(name="Ewa", surname="Nowa", email="ewa@example.com", password="x", subject="Fizyka", approved=True)
+    db.session.add(other)
+    db.session.commit()
+    login_user(other)
+    assert client.post(url, json=body).status_code == 403
+    assert LessonException.query.count() == 0
+
+    login_user(db.session.get(Teacher, s.teacher_id))
+    assert client.post(url, json=body).status_code == 204
+
+
+def test_move_lesson_rejects_occupied_slot(client):
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    other = make_series(3, date(2025, 9, 1), date(2025, 9, 30))
+    login_user(db.session.get(Teacher, s.teacher_id))
+
+    resp = client.post(f"/lesson/move/series-{s.id}-2025-09-10", json={"date": "2025-09-11", "start_time": "16:30",
+                                                                         "end_time": "17:30"})
+    assert resp.status_code == 409
+    assert resp.get_json()["conflicts"] == {"teacher": [other.id], "student": [other.id]}
+    # ten sam dzień, inna godzina - kolizja tylko z samym sobą, więc dozwolone
+    assert client.post(f"/lesson/move/series-{s.id}-2025-09-10", json={"date": "2025-09-10", "start_time": "16:30",
+                                                                         "end_time": "17:30"}).status_code == 204
+    # odwołane wystąpienie zwalnia termin
+    client.delete(f"/lesson/delete/series-{other.id}-2025-09-18")
+    assert client.post(f"/lesson/move/series-{s.id}-2025-09-17", json={"date": "2025-09-18"}).status_code == 204
+
+
+def test_free_slots_and_conflicts_follow_exceptions(client):
+    s = make_series(0, date(2025, 9, 1), date(2025, 9, 30))
+    login_user(db.session.get(Teacher, s.teacher_id))
+    client.post(f"/lesson/move/series-{s.id}-2025-09-08", json={"date": "2025-09-09", "start_time": "09:00",
+                                                                  "end_time": "10:00"})
+    slots = client.get(f"/lesson/free-slots/{s.student_id}/{s.teacher_id}?week=2025-09-08").get_json()
+
+    by_date = lambda d: [(x["start"], x["end"]) for x in slots if x["date"] == d]
+    assert by_date("2025-09-08") == [("07:00", "22:00")]
+    assert by_date("2025-09-09") == [("07:00", "09:00"), ("10:00", "22:00")]
+
+    resp = client.post(f"/lesson/assign/{s.student_id}/{s.teacher_id}", data={
+        "day_of_week": 1, "start_time": "09:30", "end_time": "10:30",
+        "start_date": "2025-09-01", "end_date": "2025-12-31"
+    })
+    assert "Nauczyciel ma już zajęcia" in resp.get_data(as_text=True)
+
+
+def test_admin_stats_reports_calendar_cache(client):
+    from flask_login import login_user
+    from app.models import Administrator
+
+    s = make_series(2, date(2025, 9, 1), date(2025, 9, 30))
+    url = f"/teacher/{s.teacher_id}/lessons?start=2025-09-01&end=2025-09-30"
+    client.get(url)
+    client.get(url)
+
+    admin = Administrator.query.filter_by(email="admin@example.com").first()
+    login_user(admin)
+    stats = client.get("/admin/stats").get_json()["calendar_cache"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["hit_ratio"] == 0.5
@@ -0,0 +1,357 @@
+import smtplib
+import socket
+from email import message_from_string, policy
+import pytest
+from datetime import datetime, timedelta
+from flask_login import login_user
+from app import db
+from app.models import OutboxMessage, Student, Teacher, Task
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from app import outbox
+from app.outbox import MailSender, add_digest_key, queue_digest, queue_mail, _utcnow
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_config(app):
+    app.config.update(MAIL_SERVER="127.0.0.1", MAIL_PORT=free_port(), MAIL_USE_SSL=False,
+                      MAIL_USE_TLS=False, MAIL_USERNAME=None, MAIL_DEFAULT_SENDER="szkola@example.com")
+    return app.config
+
+
+@pytest.fixture
+def smtp_server(smtp_config):
+    """Lokalny serwer SMTP (aiosmtpd) zbierający odebrane wiadomości."""
+    controller_module = pytest.importorskip("aiosmtpd.controller")
+
+    class Collect:
+        def __init__(self):
+            self.messages = []
+
+        async def handle_DATA(self, server, session, envelope):
+            self.messages.append((envelope.rcpt_tos, envelope.content.decode()))
+            return "250 OK"
+
+    handler = Collect()
+    controller = controller_module.Controller(handler, hostname="127.0.0.1", port=smtp_config["MAIL_PORT"])
+    controller.start()
+    yield handler
+    controller.stop()
+
+
+def test_assign_task_queues_mail_and_returns_immediately(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    student.notification_mode = 'immediate'
+    db.session.commit()
+    login_user(teacher)
+
+    resp = client.post(f"/assign-task/{student.id}", data={
+        "title": "Zadanie z outboxem", "description": "Opis", "due_date": "2030-01-01", "max_points": 10,
+    })
+
+    assert resp.status_code == 302
+    assert resp.headers["Location"].endswith("/dashboard")
+    message = db.session.query(OutboxMessage).one()
+    assert (message.recipient, message.status) == ("student@example.com", "pending")
+    assert message.subject == "Nowe zadanie do wykonania"
+    assert message.body.endswith("Zadanie: Zadanie z outboxem")
+
+
+def test_grade_task_queues_mail_for_student(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="Do oceny", due_date=datetime(2030, 1, 1), max_points=10, submitted=True,
+                student_id=student.id, teacher_id=teacher.id)
+    db.session.add(task)
+    db.session.commit()
+    login_user(teacher)
+
+    client.post(f"/grade-task/{task.id}", data={"earned_points": 7})
+
+    assert [m.recipient for m in db.session.query(OutboxMessage)] == ["student@example.com"]
+
+
+def test_drain_sends_batches_over_one_connection(app, smtp_server):
+    for i in range(5):
+        queue_mail(f"uczen{i}@example.com", "grade_task")
+    db.session.commit()
+    sender = MailSender(app, batch_size=2)
+
+    assert sender.drain() == 5
+    sender.close()
+
+    assert sorted(rcpt[0] for rcpt, _ in smtp_server.messages) == [f"uczen{i}@example.com" for i in range(5)]
+    received = message_from_string(smtp_server.messages[0][1], policy=policy.default)
+    assert received["Subject"] == "Zadanie zostało ocenione"
+    assert received["From"] == "szkola@example.com"
+    stats = sender.stats()
+    assert (stats['sent'], stats['batches'], stats['connections']) == (5, 3, 1)
+    assert stats['queued'] == {'sent': 5}
+    assert all(m.sent_at is not None for m in db.session.query(OutboxMessage))
+
+
+def test_unreachable_server_defers_batch_with_exponential_backoff(app, smtp_config):
+    queue_mail("student@example.com", "assign_task")
+    queue_mail("teacher@example.com", "submit_task")
+    db.session.commit()
+    sender = MailSender(app, base_delay=10, max_attempts=3)
+
+    delays = []
+    for _ in range(3):
+        before = _utcnow()
+        assert sender.drain() == 2
+        messages = db.session.query(OutboxMessage).order_by(OutboxMessage.id).all()
+        assert {m.status for m in messages} == {'pending'}
+        delays.append(round((messages[0].next_attempt_at - before).total_seconds()))
+        assert sender.drain() == 0  # kolejna próba dopiero po opóźnieniu
+        for m in messages:
+            m.next_attempt_at = _utcnow() - timedelta(seconds=1)
+        db.session.commit()
+
+    assert delays == [10, 20, 40]
+    # brak połączenia nie jest próbą wysyłki - wiadomości nie wyczerpują max_attempts
+    messages = db.session.query(OutboxMessage).all()
+    assert {(m.status, m.attempts) for m in messages} == {('pending', 0)}
+    assert messages[0].last_error
+    stats = sender.stats()
+    assert (stats['connections'], stats['deferred'], stats['failed']) == (0, 6, 0)
+
+
+class RejectingAuthSMTP:
+    """Atrapa smtplib.SMTP: serwer przyjmuje połączenie, ale odrzuca AUTH."""
+
+    instances = []
+
+    def __init__(self, host, port, timeout=None):
+        self.logins = 0
+        self.closed = False
+        RejectingAuthSMTP.instances.append(self)
+
+    def login(self, user, password):
+        self.logins += 1
+        raise smtplib.SMTPAuthenticationError(535, b"5.7.8 Authentication credentials invalid")
+
+    def send_message(self, email):
+        raise AssertionError("wysyłka bez zalogowania")
+
+    def close(self):
+        self.closed = True
+
+
+def test_rejected_login_defers_batch_without_failing_messages(app, smtp_config, monkeypatch):
+    RejectingAuthSMTP.instances = []
+    monkeypatch.setattr(smtplib, "SMTP", RejectingAuthSMTP)
+    smtp_config.update(MAIL_USERNAME="szkola", MAIL_PASSWORD="zle-haslo")
+    for i in range(3):
+        queue_mail(f"uczen{i}@example.com", "grade_task")
+    db.session.commit()
+    sender = MailSender(app, base_delay=10, max_attempts=1)
+
+    assert sender.drain() == 3
+
+    # jedna próba logowania na całą partię, a nie po jednej na wiadomość
+    assert [(s.logins, s.closed) for s in RejectingAuthSMTP.instances] == [(1, True)]
+    messages = db.session.query(OutboxMessage).all()
+    assert {(m.status, m.attempts) for m in messages} == {('pending', 0)}
+    assert all(m.next_attempt_at > _utcnow() for m in messages)
+    assert "SMTPAuthenticationError" in messages[0].last_error
+    assert sender.stats()['failed'] == 0
+
+
+class TimingOutSMTP:
+    """Atrapa smtplib.SMTP: połączenie działa, ale wysyłka kończy się przekroczeniem czasu."""
+
+    sends = 0
+
+    def __init__(self, host, port, timeout=None):
+        pass
+
+    def send_message(self, email):
+        TimingOutSMTP.sends += 1
+        raise TimeoutError("timed out")
+
+    def quit(self):
+        pass
+
+
+def test_send_error_counts_only_the_attempted_message(app, smtp_config, monkeypatch):
+    TimingOutSMTP.sends = 0
+    monkeypatch.setattr(smtplib, "SMTP", TimingOutSMTP)
+    for i in range(3):
+        queue_mail(f"uczen{i}@example.com", "grade_task")
+    db.session.commit()
+    sender = MailSender(app, base_delay=10, max_attempts=1)
+
+    assert sender.drain() == 3
+
+    assert TimingOutSMTP.sends == 1
+    messages = db.session.query(OutboxMessage).order_by(OutboxMessage.id).all()
+    assert [(m.status, m.attempts) for m in messages] == [('failed', 1), ('pending', 0), ('pending', 0)]
+    assert all(m.next_attempt_at > _utcnow() for m in messages[1:])
+    assert sender.stats()['deferred'] == 2
+
+
+def test_claim_skips_leased_rows_and_reclaims_expired_leases(app, smtp_config):
+    leased = queue_mail("a@example.com", "assign_task")
+    expired = queue_mail("b@example.com", "assign_task")
+    db.session.flush()
+    leased.status, leased.next_attempt_at = 'sending', _utcnow() + timedelta(minutes=5)
+    expired.status, expired.next_attempt_at = 'sending', _utcnow() - timedelta(minutes=1)
+    db.session.commit()
+
+    claimed = MailSender(app)._claim()
+
+    assert [m.recipient for m in claimed] == ["b@example.com"]
+    assert claimed[0].next_attempt_at > _utcnow()
+
+
+def assign(client, student, title):
+    return client.post(f"/assign-task/{student.id}", data={
+        "title": title, "description": "Opis", "due_date": "2030-01-01", "max_points": 10,
+    })
+
+
+def test_digest_coalesces_events_within_window(client, app):
+    app.config['NOTIFICATION_DIGEST_WINDOW'] = 600
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    login_user(db.session.query(Teacher).filter_by(email="teacher@example.com").first())
+
+    for title in ("Ułamki", "Potęgi", "Pierwiastki"):
+        assert assign(client, student, title).status_code == 302
+
+    digest = db.session.query(OutboxMessage).one()
+    assert digest.items == ["Ułamki", "Potęgi", "Pierwiastki"]
+    assert digest.subject == "Nowe zadania do wykonania (3)"
+    assert "- Potęgi\n" in digest.body
+    assert 590 < (digest.next_attempt_at - _utcnow()).total_seconds() <= 600
+    assert MailSender(app).drain() == 0
+
+    # Po upływie okna kolejne zdarzenie otwiera nowy zbiorczy e-mail
+    digest.next_attempt_at = _utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assign(client, student, "Logarytmy")
+    assert [m.items for m in db.session.query(OutboxMessage).order_by(OutboxMessage.id)] == \
+        [["Ułamki", "Potęgi", "Pierwiastki"], ["Logarytmy"]]
+
+
+def test_digest_is_per_recipient_and_purpose(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    login_user(teacher)
+    assign(client, student, "Ułamki")
+    task = db.session.query(Task).filter_by(title="Ułamki").one()
+    task.submitted = True
+    db.session.commit()
+
+    client.post(f"/grade-task/{task.id}", data={"earned_points": 5})
+
+    rows = db.session.query(OutboxMessage).order_by(OutboxMessage.id).all()
+    assert [(m.recipient, m.purpose, m.items) for m in rows] == [
+        ("student@example.com", "assign_task", ["Ułamki"]),
+        ("student@example.com", "grade_task", ["Ułamki"]),
+    ]
+
+
+def stale_reads(monkeypatch, results):
+    """Pierwsze odczyty otwartego e-maila zwracają results (stan sprzed zapisu innego żądania)."""
+    pending = list(results)
+    real = outbox._open_digest
+
+    def read(key):
+        return pending.pop(0) if pending else real(key)
+    monkeypatch.setattr(outbox, "_open_digest", read)
+
+
+def test_digest_race_with_concurrent_first_event_appends_to_its_row(app, monkeypatch):
+    queue_digest("student@example.com", "grade_task", "Ułamki", 600)
+    db.session.commit()
+    # pierwszy odczyt nie widzi jeszcze wiersza otwartego przez równoległe żądanie
+    stale_reads(monkeypatch, [None])
+
+    queue_digest("student@example.com", "grade_task", "Potęgi", 600)
+    db.session.commit()
+
+    digest = db.session.query(OutboxMessage).one()
+    assert digest.items == ["Ułamki", "Potęgi"]
+    assert digest.subject == "Ocenione zadania (2)"
+
+
+def test_digest_append_retries_after_concurrent_append(app, monkeypatch):
+    queue_digest("student@example.com", "grade_task", "Ułamki", 600)
+    db.session.commit()
+    stale = outbox._open_digest("grade_task:student@example.com")
+    queue_digest("student@example.com", "grade_task", "Potęgi", 600)
+    db.session.commit()
+    # odczyt sprzed dopisania "Potęgi" przez inne żądanie - warunkowy UPDATE go odrzuca
+    stale_reads(monkeypatch, [stale])
+
+    queue_digest("student@example.com", "grade_task", "Pierwiastki", 600)
+    db.session.commit()
+
+    assert db.session.query(OutboxMessage).one().items == ["Ułamki", "Potęgi", "Pierwiastki"]
+
+
+def test_claimed_digest_is_closed_for_appends(app, smtp_config):
+    first = queue_digest("student@example.com", "grade_task", "Ułamki", 600)
+    first.next_attempt_at = _utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert [m.id for m in MailSender(app)._claim()] == [first.id]
+
+    queue_digest("student@example.com", "grade_task", "Potęgi", 600)
+    db.session.commit()
+
+    rows = db.session.query(OutboxMessage).order_by(OutboxMessage.id).all()
+    assert [(m.status, m.items, m.digest_key) for m in rows] == [
+        ('sending', ["Ułamki"], None),
+        ('pending', ["Potęgi"], "grade_task:student@example.com"),
+    ]
+
+
+def test_immediate_preference_sends_one_mail_per_event(client):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    login_user(student)
+    assert client.post("/notifications/preference", data={"mode": "immediate"}).status_code == 302
+    assert client.post("/notifications/preference", data={"mode": "co-godzine"}).status_code == 302
+    assert db.session.get(Student, student.id).notification_mode == 'immediate'
+
+    login_user(db.session.query(Teacher).filter_by(email="teacher@example.com").first())
+    for title in ("Ułamki", "Potęgi"):
+        assign(client, student, title)
+
+    rows = db.session.query(OutboxMessage).all()
+    assert len(rows) == 2
+    assert all(m.items is None and m.subject == "Nowe zadanie do wykonania" for m in rows)
+
+
+def test_dashboard_shows_notification_preference(client):
+    login_user(db.session.query(Student).filter_by(email="student@example.com").first())
+    resp = client.get("/dashboard")
+    assert b'action="/notifications/preference"' in resp.data
+    assert b'<option selected value="digest">' in resp.data
+
+
+def test_add_digest_key_to_legacy_outbox(app):
+    db.session.execute(text("DROP TABLE outbox"))
+    db.session.execute(text(
+        "CREATE TABLE outbox (id INTEGER PRIMARY KEY, recipient VARCHAR(120) NOT NULL, subject VARCHAR(200) NOT NULL, "
+        "body TEXT NOT NULL, purpose VARCHAR(20), items JSON, status VARCHAR(10) NOT NULL, attempts INTEGER NOT NULL, "
+        "next_attempt_at DATETIME NOT NULL, last_error TEXT, created_at DATETIME, sent_at DATETIME)"
+    ))
+    db.session.commit()
+
+    assert add_digest_key()
+    assert not add_digest_key()
+    queue_digest("student@example.com", "grade_task", "Ułamki", 600)
+    db.session.commit()
+    with pytest.raises(IntegrityError):
+        db.session.add(OutboxMessage(recipient="x@example.com", subject="-", body="-",
+                                     digest_key="grade_task:student@example.com"))
+        db.session.commit()
+    db.session.rollback()
@@ -0,0 +1,89 @@
+import bcrypt as pybcrypt
+import pytest
+from app import db, bcrypt
+from app.models import Student
+from app.passwords import (DEFAULT_ROUNDS, PasswordHasher, HashingBusy, calibrate_rounds, check_password, rounds_of,
+                           get_password_hasher)
+
+
+def test_hash_helpers_accept_flask_bcrypt_hashes(app):
+    stored = bcrypt.generate_password_hash("haslo123")  # bytes, jak w istniejących kontach
+
+    assert check_password(stored, "haslo123")
+    assert check_password(stored.decode(), "haslo123")
+    assert not check_password(stored, "zle")
+    assert not check_password("nie-bcrypt", "haslo123")
+    assert rounds_of(stored) == 4
+    assert rounds_of("$2b$12$" + "a" * 53) == 12
+    assert rounds_of("nie-bcrypt") is None
+
+
+def test_calibration_stays_within_bounds():
+    assert calibrate_rounds(target_ms=0, min_rounds=4) == 4
+    assert calibrate_rounds(target_ms=10 ** 9, min_rounds=4, max_rounds=7) == 7
+
+
+def test_process_pool_hashes_and_checks():
+    hasher = PasswordHasher(workers=2, rounds=4)
+    try:
+        pw_hash = hasher.hash("tajne")
+        assert rounds_of(pw_hash) == 4
+        assert hasher.check(pw_hash, "tajne")
+        assert not hasher.check(pw_hash, "inne")
+    finally:
+        hasher.shutdown()
+    assert hasher.stats()['completed'] == 3
+
+
+def test_full_queue_rejects_with_503(client, app):
+    hasher = PasswordHasher(workers=0, max_pending=1, submit_timeout=0.01, rounds=4)
+    hasher._slots.acquire()  # jedyne miejsce w kolejce zajęte
+    app.extensions['password_hasher'] = hasher
+
+    with pytest.raises(HashingBusy):
+        hasher.hash("tajne")
+    resp = client.post("/login", data={"email": "student@example.com", "password": "haslo123"})
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
+    assert hasher.stats()['rejected'] == 2
+
+
+def test_login_rehashes_only_weaker_hashes(client, app):
+    app.extensions['password_hasher'] = PasswordHasher(workers=0, rounds=5)
+    student = db.session.query(Student).filter_by(email="student@example.com").one()
+    student.password = pybcrypt.hashpw(b"haslo123", pybcrypt.gensalt(4)).decode()
+    db.session.commit()
+
+    resp = client.post("/login", data={"email": "student@example.com", "password": "haslo123"})
+
+    assert resp.status_code == 302
+    stored = db.session.get(Student, student.id).password
+    assert rounds_of(stored) == 5 and check_password(stored, "haslo123")
+    assert get_password_hasher().stats()['rehashed'] == 1
+
+    client.post("/login", data={"email": "student@example.com", "password": "haslo123"})
+    assert get_password_hasher().stats()['rehashed'] == 1
+
+    # skrót z wyższym kosztem (np. z szybszego serwera) nie jest osłabiany
+    stronger = pybcrypt.hashpw(b"haslo123", pybcrypt.gensalt(6)).decode()
+    db.session.get(Student, student.id).password = stronger
+    db.session.commit()
+    client.post("/login", data={"email": "student@example.com", "password": "haslo123"})
+    assert db.session.get(Student, student.id).password == stronger
+    assert get_password_hasher().stats()['rehashed'] == 1
+
+
+def test_default_cost_is_fixed_not_calibrated():
+    hasher = PasswordHasher(workers=0)
+    assert hasher.rounds == DEFAULT_ROUNDS == hasher.stats()['rounds']
+    assert not hasher.needs_rehash("$2b$13$" + "a" * 53)
+    assert hasher.needs_rehash("$2b$11$" + "a" * 53) and hasher.needs_rehash("nie-bcrypt")
+
+
+def test_register_uses_configured_cost(client):
+    client.post("/register", data={"role": "student", "name": "Adam", "surname": "Nowy",
+                                   "email": "nowy@example.com", "password": "haslo123", "subject": ""})
+
+    student = db.session.query(Student).filter_by(email="nowy@example.com").one()
+    assert rounds_of(student.password) == 4
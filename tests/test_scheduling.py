@@ -0,0 +1,131 @@
+from datetime import date, time
+from app import db
+from app.models import LessonSeries, Student, Teacher
+from app.scheduling import WeeklyIntervalIndex
+
+
+def add_series(teacher, student, day_of_week, start, end, start_date=date(2025, 9, 1), end_date=date(2026, 6, 30)):
+    series = LessonSeries(
+        teacher_id=teacher.id,
+        student_id=student.id,
+        day_of_week=day_of_week,
+        start_time=start,
+        end_time=end,
+        start_date=start_date,
+        end_date=end_date
+    )
+    db.session.add(series)
+    db.session.commit()
+    return series
+
+
+def get_people():
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    return teacher, student
+
+
+def test_interval_index_overlapping(client):
+    teacher, student = get_people()
+    a = add_series(teacher, student, 0, time(16, 0), time(17, 0))
+    b = add_series(teacher, student, 0, time(18, 0), time(19, 30))
+    c = add_series(teacher, student, 2, time(16, 0), time(17, 0))
+    index = WeeklyIntervalIndex([a, b, c])
+
+    assert index.overlapping(0, time(16, 30), time(18, 15)) == [a.id, b.id]
+    assert index.overlapping(0, time(17, 0), time(18, 0)) == []
+    assert index.overlapping(2, time(15, 0), time(16, 1)) == [c.id]
+    assert index.overlapping(1, time(16, 0), time(17, 0)) == []
+
+
+def test_interval_index_respects_date_ranges(client):
+    teacher, student = get_people()
+    winter = add_series(teacher, student, 0, time(16, 0), time(17, 0), date(2025, 9, 1), date(2026, 1, 31))
+    index = WeeklyIntervalIndex([winter])
+
+    assert index.overlapping(0, time(16, 0), time(17, 0), date(2026, 2, 1), date(2026, 6, 30)) == []
+    assert index.overlapping(0, time(16, 0), time(17, 0), date(2026, 1, 1), None) == [winter.id]
+
+
+def test_assign_lesson_detects_student_conflict(client):
+    teacher, student = get_people()
+    other = Teacher(
+        name="Ewa",
+        surname="Nowa",
+        email="ewa@example.com",
+        password="hashed",
+        subject="Fizyka",
+        approved=True
+    )
+    db.session.add(other)
+    db.session.commit()
+    add_series(other, student, 3, time(16, 0), time(17, 0))
+
+    resp = client.post(f"/lesson/assign/{student.id}/{teacher.id}", data={
+        "day_of_week": 3,
+        "start_time": "16:30",
+        "end_time": "17:30",
+        "start_date": "2025-10-01",
+        "end_date": "2025-12-31"
+    })
+    assert resp.status_code == 200
+    assert "Uczeń ma już zajęcia" in resp.get_data(as_text=True)
+    assert LessonSeries.query.filter_by(teacher_id=teacher.id).count() == 0
+
+
+def test_assign_lesson_sees_series_added_through_form(client):
+    teacher, student = get_people()
+    form = {
+        "day_of_week": 1,
+        "start_time": "10:00",
+        "end_time": "11:00",
+        "start_date": "2025-10-01",
+        "end_date": "2025-12-31"
+    }
+    assert client.post(f"/lesson/assign/{student.id}/{teacher.id}", data=form).status_code == 302
+
+    resp = client.post(f"/lesson/assign/{student.id}/{teacher.id}", data=form)
+    assert "Nauczyciel ma już zajęcia" in resp.get_data(as_text=True)
+
+
+def test_free_slots_endpoint(client):
+    teacher, student = get_people()
+    add_series(teacher, student, 0, time(9, 0), time(10, 0))
+    add_series(teacher, student, 0, time(12, 0), time(13, 0))
+
+    # 2025-09-10 to środa, tydzień zaczyna się w poniedziałek 2025-09-08
+    resp = client.get(f"/lesson/free-slots/{student.id}/{teacher.id}?week=2025-09-10&duration=60")
+    assert resp.status_code == 200
+    slots = resp.get_json()
+
+    monday = [(s["start"], s["end"]) for s in slots if s["date"] == "2025-09-08"]
+    assert monday == [("07:00", "09:00"), ("10:00", "12:00"), ("13:00", "22:00")]
+    tuesday = [(s["start"], s["end"]) for s in slots if s["date"] == "2025-09-09"]
+    assert tuesday == [("07:00", "22:00")]
+    assert len({s["date"] for s in slots}) == 7
+
+
+def test_assign_lesson_sees_series_saved_by_another_process(client):
+    teacher, student = get_people()
+    form = {
+        "day_of_week": 4,
+        "start_time": "15:00",
+        "end_time": "16:00",
+        "start_date": "2025-10-01",
+        "end_date": "2025-12-31"
+    }
+    client.get(f"/lesson/free-slots/{student.id}/{teacher.id}?week=2025-10-06")
+    # zapis bez lessons_changed(), jak z innego procesu serwera
+    add_series(teacher, student, 4, time(15, 30), time(16, 30))
+
+    resp = client.post(f"/lesson/assign/{student.id}/{teacher.id}", data=form)
+    assert "Nauczyciel ma już zajęcia" in resp.get_data(as_text=True)
+    assert LessonSeries.query.count() == 1
+
+
+def test_free_slots_rejects_malformed_week(client):
+    teacher, student = get_people()
+
+    resp = client.get(f"/lesson/free-slots/{student.id}/{teacher.id}?week=10.09.2025")
+    assert resp.status_code == 400
+    assert "error" in resp.get_json()
@@ -0,0 +1,155 @@
+import errno
+import hashlib
+import io
+import os
+import time
+import pytest
+from datetime import datetime
+from flask_login import login_user
+from app import db
+from app.models import Task, TaskAttachment, Student, Teacher
+from app.attachments import ingest_file
+from app.storage import LocalStorage, S3Storage, make_storage
+
+BUCKET = "akademia-test"
+
+
+@pytest.fixture(scope="module")
+def s3_endpoint():
+    """Lokalny serwer zgodny z S3 (moto); testy S3 są pomijane bez boto3/moto."""
+    pytest.importorskip("boto3")
+    server_module = pytest.importorskip("moto.server")
+    server = server_module.ThreadedMotoServer(port=0)
+    server.start()
+    host, port = server.get_host_and_port()
+    yield f"http://{host}:{port}"
+    server.stop()
+
+
+@pytest.fixture(params=["local", "s3"])
+def storage(request, app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    if request.param == "local":
+        backend = LocalStorage()
+    else:
+        endpoint = request.getfixturevalue("s3_endpoint")
+        backend = S3Storage(BUCKET, endpoint_url=endpoint, region="us-east-1", access_key="test",
+                            secret_key="test", prefix=f"{request.node.name}/",
+                            multipart_threshold=5 * 1024 * 1024)
+        try:
+            backend.client.create_bucket(Bucket=BUCKET)
+        except backend.client.exceptions.BucketAlreadyOwnedByYou:
+            pass
+    app.extensions['storage'] = backend
+    return backend
+
+
+def write_tmp(tmp_path, content, name="wejscie"):
+    path = tmp_path / "tmp" / name
+    path.parent.mkdir(exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_put_get_delete_roundtrip(storage, tmp_path):
+    sha256, size = ingest_file(write_tmp(tmp_path, b"tresc zalacznika"))
+
+    assert storage.exists(sha256)
+    assert storage.size(sha256) == size == len(b"tresc zalacznika")
+    with storage.open(sha256) as f:
+        assert f.read() == b"tresc zalacznika"
+    assert b"".join(storage.stream(sha256, 4)) == b"tresc zalacznika"
+    assert [b[:2] for b in storage.iter_blobs()] == [(sha256, size)]
+    assert os.listdir(tmp_path / "tmp") == []
+
+    storage.delete(sha256)
+    assert not storage.exists(sha256)
+    assert list(storage.iter_blobs()) == []
+
+
+def test_duplicate_put_refreshes_timestamp(storage, tmp_path):
+    sha256, _ = ingest_file(write_tmp(tmp_path, b"to samo"))
+    first = next(storage.iter_blobs())[2]
+    time.sleep(1.1)
+
+    assert ingest_file(write_tmp(tmp_path, b"to samo"))[0] == sha256
+    assert next(storage.iter_blobs())[2] > first
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_duplicate_put_restores_blob_deleted_by_gc(storage, tmp_path, monkeypatch):
+    sha256, _ = ingest_file(write_tmp(tmp_path, b"to samo"))
+    exists = storage.exists
+
+    def exists_then_collected(key):
+        # GC usuwa blob między sprawdzeniem istnienia a odświeżeniem
+        found = exists(key)
+        storage.delete(key)
+        return found
+    monkeypatch.setattr(storage, "exists", exists_then_collected)
+
+    assert ingest_file(write_tmp(tmp_path, b"to samo"))[0] == sha256
+    assert b"".join(storage.stream(sha256)) == b"to samo"
+    assert os.listdir(tmp_path / "tmp") == []
+
+
+def test_local_put_across_filesystems_stages_in_storage_root(app, tmp_path, monkeypatch):
+    storage = LocalStorage(str(tmp_path / "magazyn"))
+    source = write_tmp(tmp_path, b"z innego wolumenu")
+    sha256 = hashlib.sha256(b"z innego wolumenu").hexdigest()
+    replace = os.replace
+
+    def cross_device(src, dst):
+        # rename między wolumenami: dozwolony tylko w obrębie magazynu
+        if not str(src).startswith(storage.root):
+            raise OSError(errno.EXDEV, "Invalid cross-device link")
+        replace(src, dst)
+    monkeypatch.setattr(os, "replace", cross_device)
+
+    storage.put_file(sha256, source)
+
+    with storage.open(sha256) as f:
+        assert f.read() == b"z innego wolumenu"
+    assert not os.path.exists(source)
+    assert os.listdir(storage.scratch_dir()) == []
+
+
+def test_large_file_roundtrip(storage, tmp_path):
+    body = os.urandom(11 * 1024 * 1024)
+
+    sha256, size = ingest_file(write_tmp(tmp_path, body))
+
+    assert sha256 == hashlib.sha256(body).hexdigest()
+    assert storage.size(sha256) == len(body)
+    digest = hashlib.sha256()
+    for chunk in storage.stream(sha256):
+        digest.update(chunk)
+    assert digest.hexdigest() == sha256
+
+
+def test_download_redirects_to_presigned_url_for_object_store(client, storage, tmp_path):
+    if isinstance(storage, LocalStorage):
+        pytest.skip("magazyn lokalny wysyła plik bezpośrednio")
+    sha256, size = ingest_file(write_tmp(tmp_path, b"%PDF z kubelka"))
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="S3", due_date=datetime(2030, 1, 1), max_points=5, student=student, teacher=teacher)
+    db.session.add(TaskAttachment(task=task, side='teacher', sha256=sha256, size=size,
+                                  mime="application/pdf", original_name="polecenie.pdf"))
+    db.session.commit()
+    login_user(student)
+
+    resp = client.get(f"/uploads/{sha256}")
+
+    assert resp.status_code == 302
+    assert storage.key(sha256) in resp.headers["Location"]
+    assert "no-store" in resp.headers["Cache-Control"]
+
+
+def test_make_storage_selects_backend(tmp_path):
+    assert isinstance(make_storage({}), LocalStorage)
+    s3 = make_storage({'STORAGE_BACKEND': 's3', 'S3_BUCKET': 'b', 'S3_PREFIX': 'p/'})
+    assert isinstance(s3, S3Storage)
+    assert s3.key("ab" * 32) == "p/ab/ab/" + "ab" * 32
+    with pytest.raises(ValueError):
+        make_storage({'STORAGE_BACKEND': 'ftp'})
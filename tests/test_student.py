@@ -64,3 +64,32 @@ def test_student_dashboard_without_tasks(client):
 
     # Sprawdzenie komunikatu o braku zadań
     assert 'Nie masz jeszcze żadnych zadań.' in html
+
+
+def test_student_dashboard_query_count(client, count_queries):
+    """Nauczyciele zadań ładowani są razem z zadaniami, bez zapytania na zadanie."""
+    student = Student.query.filter_by(email='student@example.com').first()
+    teacher = Teacher.query.filter_by(email='teacher@example.com').first()
+    other = Teacher(name='Ewa', surname='Nowa', email='ewa@example.com',
+                    password='hashed', subject='Fizyka', approved=True)
+    db.session.add(other)
+    student.teachers.append(other)
+    for n in range(20):
+        db.session.add(Task(
+            title=f'Zadanie {n}',
+            due_date=datetime.now(timezone.utc) + timedelta(days=7),
+            student_id=student.id,
+            teacher_id=(teacher, other)[n % 2].id,
+            max_points=10
+        ))
+    db.session.commit()
+    db.session.expire_all()
+
+    login_student(client, student)
+    with count_queries() as statements:
+        response = client.get('/dashboard')
+
+    assert response.status_code == 200
+    assert 'Ewa Nowa' in response.data.decode()
+    # zadania z nauczycielami + lista nauczycieli ucznia
+    assert len(statements) == 2, statements
@@ -0,0 +1,100 @@
+import io
+import os
+import zipfile
+import pytest
+from datetime import datetime
+from flask_login import login_user
+from app import db
+from app.models import Task, TaskAttachment, Student, Teacher
+from app.attachments import ingest_file, CHUNK_SIZE
+from app.submission_zip import zip_stream
+from app.storage import LocalStorage
+
+
+def attach(root, task, name, content, mime):
+    path = os.path.join(root, "wejscie")
+    with open(path, "wb") as f:
+        f.write(content)
+    sha256, size = ingest_file(path)
+    db.session.add(TaskAttachment(task=task, side='student', sha256=sha256, size=size,
+                                  mime=mime, original_name=name))
+
+
+@pytest.fixture
+def submissions(uploads):
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    jan = db.session.query(Student).filter_by(email="student@example.com").first()
+    ola = Student(name="Ola", surname="Zielińska", email="ola@example.com", password="x", approved=True)
+    db.session.add(ola)
+
+    def task(student, title, due):
+        t = Task(title=title, due_date=due, max_points=10, submitted=True, student=student, teacher=teacher)
+        db.session.add(t)
+        return t
+
+    algebra_jan = task(jan, "Algebra", datetime(2030, 3, 1, 23, 59))
+    algebra_ola = task(ola, "Algebra", datetime(2030, 3, 1, 8, 0))
+    geometria_jan = task(jan, "Geometria", datetime(2030, 3, 8, 12, 0))
+    attach(uploads, algebra_jan, "rozwiazanie.pdf", b"%PDF jan", "application/pdf")
+    attach(uploads, algebra_jan, "notatki.txt", b"a" * 5000, "text/plain")
+    attach(uploads, algebra_ola, "rozwiazanie.pdf", b"%PDF ola", "application/pdf")
+    attach(uploads, geometria_jan, "zdjecie.jpg", b"\xff\xd8jpeg", "image/jpeg")
+    db.session.commit()
+    return teacher
+
+
+def open_zip(resp):
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(resp.data))
+    assert archive.testzip() is None
+    return archive
+
+
+def test_zip_contains_student_folders(client, submissions):
+    login_user(submissions)
+    archive = open_zip(client.get("/teacher/submissions.zip"))
+
+    assert archive.namelist() == [
+        "Kowalski Jan/Algebra/rozwiazanie.pdf",
+        "Kowalski Jan/Algebra/notatki.txt",
+        "Kowalski Jan/Geometria/zdjecie.jpg",
+        "Zielińska Ola/Algebra/rozwiazanie.pdf",
+    ]
+    assert archive.read("Zielińska Ola/Algebra/rozwiazanie.pdf") == b"%PDF ola"
+    types = {i.filename: i.compress_type for i in archive.infolist()}
+    assert types["Kowalski Jan/Algebra/rozwiazanie.pdf"] == zipfile.ZIP_STORED
+    assert types["Kowalski Jan/Geometria/zdjecie.jpg"] == zipfile.ZIP_STORED
+    assert types["Kowalski Jan/Algebra/notatki.txt"] == zipfile.ZIP_DEFLATED
+
+
+def test_zip_filters_by_title_and_due_date(client, submissions):
+    login_user(submissions)
+
+    by_title = open_zip(client.get("/teacher/submissions.zip?title=Geometria"))
+    assert by_title.namelist() == ["Kowalski Jan/Geometria/zdjecie.jpg"]
+
+    by_due = open_zip(client.get("/teacher/submissions.zip?due=2030-03-01"))
+    assert len(by_due.namelist()) == 3
+
+    assert client.get("/teacher/submissions.zip?title=Brak").status_code == 404
+    assert client.get("/teacher/submissions.zip?due=jutro").status_code == 400
+
+
+def test_zip_only_for_teachers(client, submissions):
+    login_user(db.session.query(Student).filter_by(email="student@example.com").first())
+    assert client.get("/teacher/submissions.zip").status_code == 403
+
+
+def test_zip_stream_chunks_stay_small(app, uploads):
+    body = os.urandom(2 * 1024 * 1024)
+    (uploads / "duzy.pdf").write_bytes(body)
+    sha256, size = ingest_file(str(uploads / "duzy.pdf"))
+    modified = datetime(2030, 1, 1)
+
+    chunks = list(zip_stream([("duzy.pdf", sha256, size, modified, True),
+                              ("kopia.pdf", sha256, size, modified, True)], LocalStorage(str(uploads))))
+
+    assert max(len(c) for c in chunks) <= CHUNK_SIZE + 1024
+    archive = zipfile.ZipFile(io.BytesIO(b"".join(chunks)))
+    assert archive.read("kopia.pdf") == body
@@ -90,4 +90,4 @@ def test_submit_task_with_attachment(client, tmp_path):
 
     assert resp.status_code == 200
     updated_task = db.session.get(Task, task.id)
-    assert "answer.pdf" in (updated_task.student_attachments or "")
+    assert [a.original_name for a in updated_task.student_files] == ["answer.pdf"]
@@ -51,3 +51,47 @@ def test_teacher_dashboard_with_students_and_tasks(client):
     assert url_for('main.assign_task', student_id=student.id) in html
     # Sprawdzamy link do czatu
     assert url_for('main.chat', student_id=student.id, teacher_id=teacher.id, role='teacher') in html
+
+
+def test_teacher_dashboard_query_count(client, count_queries):
+    """Dashboard nauczyciela z 200 uczniami x 50 zadań to stała liczba zapytań SQL."""
+    from sqlalchemy import insert
+    from app.models import student_teacher
+
+    teacher = Teacher.query.filter_by(email='teacher@example.com').first()
+    # uczeń z conftest jest już przypisany do nauczyciela
+    assigned = Student.query.filter_by(email='student@example.com').first().id
+    other = Teacher(name='Ewa', surname='Nowa', email='ewa@example.com',
+                    password='hashed', subject='Fizyka', approved=True)
+    db.session.add(other)
+    db.session.commit()
+
+    db.session.execute(insert(Student), [
+        {'name': f'Uczen{i}', 'surname': 'Testowy', 'email': f'uczen{i}@example.com',
+         'password': 'hashed', 'approved': True}
+        for i in range(199)
+    ])
+    student_ids = [s.id for s in Student.query.all()]
+    db.session.execute(insert(student_teacher), [
+        {'student_id': sid, 'teacher_id': tid}
+        for sid in student_ids for tid in (teacher.id, other.id)
+        if not (sid == assigned and tid == teacher.id)
+    ])
+    due = datetime.now(timezone.utc) + timedelta(days=7)
+    db.session.execute(insert(Task), [
+        {'title': f'Zadanie {n}', 'due_date': due, 'max_points': 10, 'student_id': sid,
+         'teacher_id': tid, 'submitted': False}
+        for sid in student_ids for n in range(50) for tid in (teacher.id, other.id)
+    ])
+    db.session.commit()
+    db.session.expire_all()
+
+    login_teacher(client, teacher)
+    with count_queries() as statements:
+        response = client.get('/dashboard')
+
+    assert response.status_code == 200
+    html = response.data.decode()
+    assert html.count('teacher-dashboard__task-item') == 200 * 50
+    # uczniowie nauczyciela + jego zadania
+    assert len(statements) == 2, statements
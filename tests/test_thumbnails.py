@@ -0,0 +1,104 @@
+import io
+import os
+import pytest
+from datetime import datetime
+from PIL import Image
+from flask_login import login_user
+from app import db
+from app.models import Task, TaskAttachment, Student, Teacher
+from app.attachments import ingest_file
+from app.thumbnails import ThumbnailCache
+
+
+@pytest.fixture
+def uploads(uploads, app):
+    """Wspólny katalog uploads z conftest i świeży cache miniatur."""
+    app.extensions['thumbnail_cache'] = ThumbnailCache()
+    return uploads
+
+
+def store_image(root, size=(1200, 900), color=(200, 30, 30), fmt='JPEG', name='zdjecie.jpg'):
+    path = os.path.join(root, name)
+    Image.new('RGB', size, color).save(path, fmt)
+    return ingest_file(path)
+
+
+def make_task_with(sha256, size, name="zdjecie.jpg", mime="image/jpeg"):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="Zdjęcia", due_date=datetime(2030, 1, 1), max_points=5, submitted=True,
+                student_id=student.id, teacher_id=teacher.id)
+    db.session.add(task)
+    db.session.add(TaskAttachment(task=task, side='student', sha256=sha256, size=size,
+                                  mime=mime, original_name=name))
+    db.session.commit()
+    return student, teacher
+
+
+def test_thumbnail_is_small_webp_and_cached(client, app, uploads):
+    sha256, size = store_image(uploads)
+    _, teacher = make_task_with(sha256, size)
+    login_user(teacher)
+
+    resp = client.get(f"/uploads/{sha256}/thumb/160")
+    assert resp.status_code == 200
+    assert resp.mimetype == "image/webp"
+    assert "immutable" in resp.headers["Cache-Control"]
+    with Image.open(io.BytesIO(resp.data)) as img:
+        assert img.format == "WEBP"
+        assert img.size == (160, 120)
+    resp.close()
+
+    client.get(f"/uploads/{sha256}/thumb/160").close()
+    stats = app.extensions['thumbnail_cache'].stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+
+
+def test_thumbnail_rejects_unknown_size_and_non_images(client, uploads):
+    sha256, size = store_image(uploads)
+    _, teacher = make_task_with(sha256, size, name="praca.pdf", mime="application/pdf")
+    login_user(teacher)
+
+    assert client.get(f"/uploads/{sha256}/thumb/160").status_code == 404
+    assert client.get(f"/uploads/{sha256}/thumb/5000").status_code == 404
+    assert client.get("/uploads/nieistniejacy/thumb/160").status_code == 404
+
+
+def test_lru_eviction_keeps_recently_used(app, uploads):
+    blobs = [store_image(uploads, color=(i * 60, 0, 0), name=f"{i}.jpg")[0] for i in range(3)]
+    root = str(uploads / "thumbs")
+    probe = ThumbnailCache()
+    one = os.path.getsize(probe.get(blobs[0], 160, root))
+
+    cache = ThumbnailCache(max_bytes=2 * one + one // 2)
+    cache.get(blobs[0], 160, root)
+    cache.get(blobs[1], 160, root)
+    cache.get(blobs[0], 160, root)
+    cache.get(blobs[2], 160, root)
+
+    assert sorted(os.listdir(root)) == sorted(f"{b}-160.webp" for b in (blobs[0], blobs[2]))
+    assert cache.stats()['evictions'] == 1
+
+
+def test_dashboard_shows_inline_previews(client, uploads):
+    sha256, size = store_image(uploads)
+    _, teacher = make_task_with(sha256, size)
+    login_user(teacher)
+
+    resp = client.get("/dashboard")
+    assert f"/uploads/{sha256}/thumb/160".encode() in resp.data
+
+
+def test_thumbnail_of_unreadable_or_huge_image_is_415(client, uploads, monkeypatch):
+    broken = os.path.join(uploads, "zepsute.jpg")
+    with open(broken, "wb") as f:
+        f.write(b"to nie jest obraz")
+    sha256, size = ingest_file(broken)
+    _, teacher = make_task_with(sha256, size, name="zepsute.jpg")
+    login_user(teacher)
+    assert client.get(f"/uploads/{sha256}/thumb/160").status_code == 415
+
+    sha256, size = store_image(uploads, name="duze.jpg")
+    make_task_with(sha256, size, name="duze.jpg")
+    monkeypatch.setattr(Image, "MAX_IMAGE_PIXELS", 100_000)
+    assert client.get(f"/uploads/{sha256}/thumb/160").status_code == 415
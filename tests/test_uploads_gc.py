@@ -0,0 +1,117 @@
+import io
+import os
+import time
+from datetime import datetime
+from flask_login import login_user
+from app import db
+from app.models import Task, Student, Teacher
+from app.attachments import ingest_file
+from app.uploads_gc import collect_garbage
+from app.storage import blob_path, get_storage
+from app.commands import uploads_gc_command
+
+DAY = 24 * 3600
+
+
+def make_blob(root, content, age=0):
+    path = os.path.join(root, "wejscie")
+    with open(path, "wb") as f:
+        f.write(content)
+    sha256, _ = ingest_file(path)
+    if age:
+        past = time.time() - age
+        os.utime(blob_path(sha256, str(root)), (past, past))
+    return sha256
+
+
+def age_file(path, age):
+    past = time.time() - age
+    os.utime(path, (past, past))
+
+
+def resubmit(client, uploads):
+    student = db.session.query(Student).filter_by(email="student@example.com").first()
+    teacher = db.session.query(Teacher).filter_by(email="teacher@example.com").first()
+    task = Task(title="Praca", due_date=datetime(2030, 1, 1), max_points=10,
+                student_id=student.id, teacher_id=teacher.id)
+    db.session.add(task)
+    db.session.commit()
+    login_user(student)
+    for content in (b"pierwsza wersja", b"druga wersja"):
+        client.post(f"/submit-task/{task.id}",
+                    data={"answer": "Odpowiedź", "attachments": [(io.BytesIO(content), "praca.pdf")]},
+                    content_type="multipart/form-data")
+    return db.session.get(Task, task.id).student_files[0].sha256
+
+
+def test_sweeps_only_old_unreferenced_files(client, uploads):
+    current = resubmit(client, uploads)
+    for dirpath, _, files in os.walk(uploads):
+        for name in files:
+            age_file(os.path.join(dirpath, name), 2 * DAY)
+    orphan_size = len(b"pierwsza wersja")
+    fresh = make_blob(uploads, b"wlasnie przeslany")
+    (uploads / "thumbs").mkdir()
+    old_thumb = uploads / "thumbs" / f"{'0' * 64}-160.webp"
+    old_thumb.write_bytes(b"webp")
+    age_file(old_thumb, 2 * DAY)
+    (uploads / "tmp" / "porzucony.pdf").write_bytes(b"niedokonczony")
+    age_file(uploads / "tmp" / "porzucony.pdf", 2 * DAY)
+
+    stats = collect_garbage(grace_seconds=DAY)
+
+    assert stats['marked'] == 1
+    assert stats['scanned'] == 3
+    assert stats['removed'] == 3
+    assert stats['kept_recent'] == 1
+    assert stats['reclaimed_bytes'] == orphan_size + len(b"webp") + len(b"niedokonczony")
+    assert os.path.exists(blob_path(current))
+    assert os.path.exists(blob_path(fresh))
+    assert not old_thumb.exists()
+    assert os.listdir(uploads / "tmp") == []
+
+
+def test_dry_run_removes_nothing(app, uploads):
+    orphan = make_blob(uploads, b"sierota", age=2 * DAY)
+
+    stats = collect_garbage(grace_seconds=DAY, dry_run=True)
+
+    assert stats['removed'] == 1
+    assert os.path.exists(blob_path(orphan))
+
+
+def test_reupload_of_orphan_refreshes_it(app, uploads):
+    sha256 = make_blob(uploads, b"ta sama tresc", age=2 * DAY)
+    make_blob(uploads, b"ta sama tresc")
+
+    collect_garbage(grace_seconds=DAY)
+
+    assert os.path.exists(blob_path(sha256))
+
+
+def test_reupload_during_scan_keeps_blob(app, uploads, monkeypatch):
+    sha256 = make_blob(uploads, b"ta sama tresc", age=2 * DAY)
+    storage = get_storage()
+    scan = storage.iter_blobs
+
+    def scan_then_reupload():
+        # duplikat przesłany po odczycie mtime przez GC, a przed usunięciem
+        for blob in scan():
+            make_blob(uploads, b"ta sama tresc")
+            yield blob
+    monkeypatch.setattr(storage, "iter_blobs", scan_then_reupload)
+
+    stats = collect_garbage(grace_seconds=DAY)
+
+    assert (stats['removed'], stats['kept_recent']) == (0, 1)
+    assert os.path.exists(blob_path(sha256))
+
+
+def test_cli_reports_reclaimed_bytes(app, uploads):
+    make_blob(uploads, b"x" * 2048, age=2 * DAY)
+
+    result = app.test_cli_runner().invoke(uploads_gc_command, ["--grace-hours", "1"])
+
+    assert result.exit_code == 0
+    assert "Usunięto plików: 1, odzyskane bajty: 2048" in result.output
+    assert not any(files for _, _, files in os.walk(uploads))